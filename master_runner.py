@@ -2,6 +2,8 @@
 import json
 import os
 import sys
+import argparse
+import time
 import subprocess
 import logging
 from datetime import datetime, timezone
@@ -20,6 +22,8 @@ VENV_PYTHON = os.path.join(PROJECT_ROOT, '.venv', 'bin', 'python3')
 from lbot.utils.trade_manager import babysit_open_position
 from lbot.utils.exchange import Exchange
 from lbot.strategy.run import get_state, set_state
+from lbot.utils.profiling import span, add_profile_arguments, profile_run
+from lbot.utils.metrics import export_metrics, STRATEGY_RUNS, STRATEGY_RUN_RESULTS
 
 # --- Setup für einfaches Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -50,6 +54,13 @@ def load_strategy_config(symbol, timeframe):
     return load_json(config_path)
 
 def main():
+    parser = argparse.ArgumentParser(description="L-Bot Master Runner")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with profile_run('master_runner', args.profile, args.profile_dir):
+        run_master(args)
+
+def run_master(args):
     print(f"\n--- L-Bot Master Runner gestartet um {datetime.now().isoformat()} ---")
 
     settings = load_json(SETTINGS_FILE)
@@ -66,12 +77,14 @@ def main():
     # === DER BABYSITTER-CHECK (LÄUFT IMMER ZUERST) ===
     print("--- Starte Babysitter-Überwachung für alle aktiven Strategien ---")
     try:
-        exchange = Exchange(account_config)
+        with span('exchange_init'):
+            exchange = Exchange(account_config)
         for strategy in active_strategies:
             try:
                 params = load_strategy_config(strategy['symbol'], strategy['timeframe'])
                 if params:
-                    babysit_open_position(exchange, params, get_state, set_state, telegram_config, log)
+                    with span('babysit'):
+                        babysit_open_position(exchange, params, get_state, set_state, telegram_config, log)
             except Exception as e:
                 # VERBESSERUNG: Fehler wird pro Strategie abgefangen, nicht für den ganzen Prozess
                 strategy_id = f"{strategy.get('symbol', 'N/A')}_{strategy.get('timeframe', 'N/A')}"
@@ -107,14 +120,27 @@ def main():
 
         if run_it:
             command = [VENV_PYTHON, BOT_RUNNER_SCRIPT, '--symbol', symbol, '--timeframe', timeframe]
-            result = subprocess.run(command, capture_output=True, text=True)
+            # Die Strategie-Läufe profilieren sich selbst und geben ihre Aufschlüsselung im eigenen Log aus
+            if args.profile:
+                command.append('--profile')
+            if args.profile_dir:
+                command += ['--profile-dir', args.profile_dir]
+            start = time.perf_counter()
+            with span('strategy_run'):
+                result = subprocess.run(command, capture_output=True, text=True)
+            STRATEGY_RUNS.observe(time.perf_counter() - start, strategy=strategy_id)
+            STRATEGY_RUN_RESULTS.inc(strategy=strategy_id, result='ok' if result.returncode == 0 else 'failed')
             print(result.stdout)
             if result.stderr:
                 print("--- FEHLER IM SUBPROZESS ---")
                 print(result.stderr)
             timestamps[strategy_id] = now_utc.isoformat()
 
-    save_timestamps(timestamps)
+    with span('save_timestamps'):
+        save_timestamps(timestamps)
+    metrics_file = export_metrics(settings, 'master_runner')
+    if metrics_file:
+        print(f"Metriken geschrieben: {metrics_file}")
     print("--- L-Bot Master Runner beendet ---")
 
 if __name__ == "__main__":
@@ -13,8 +13,7 @@ NC='\033[0m'
 SCRIPT_DIR=$(cd -- "$(dirname -- "${BASH_SOURCE[0]}")" &> /dev/null && pwd)
 VENV_PATH="$SCRIPT_DIR/.venv/bin/activate"
 SETTINGS_FILE="$SCRIPT_DIR/settings.json"
-TRAINER="src/lbot/analysis/trainer.py"
-OPTIMIZER="src/lbot/analysis/optimizer.py"
+PIPELINE="src/lbot/analysis/pipeline.py"
 VENV_PYTHON="$SCRIPT_DIR/.venv/bin/python3"
 
 # --- Umgebung aktivieren ---
@@ -128,15 +127,9 @@ read -p "Soll der Prozess gestartet werden? (j/n): " confirm && [[ $confirm == [
 
 
 # --- Pipeline starten ---
-echo -e "\n${BLUE}>>> STUFE 1/2: Starte L-Bot LSTM-Modelltraining... <<<${NC}"
-"$VENV_PYTHON" "$TRAINER" --symbols "$SYMBOLS" --timeframes "$TIMEFRAMES" --start_date "$START_DATE"
-if [ $? -ne 0 ]; then
-    echo -e "\n${RED}Fehler im Trainer-Skript. Pipeline wird abgebrochen.${NC}"
-    deactivate
-    exit 1
-fi
-
-echo -e "\n${BLUE}>>> STUFE 2/2: Starte Handelsparameter-Optimierung... <<<${NC}"
+# Training und Optimierung laufen in einem Prozess: Daten, Features und Modell werden
+# zwischen den Stufen geteilt, unveränderte Stufen kommen aus artifacts/cache/pipeline.
+echo -e "\n${BLUE}>>> Starte L-Bot Pipeline (Download -> Features -> Training -> Vorhersage -> Optimierung)... <<<${NC}"
 if [[ "$JOBS" -ne 1 ]]; then
     display_jobs=$JOBS
     if [[ "$JOBS" -eq -1 ]]; then
@@ -146,9 +139,9 @@ if [[ "$JOBS" -ne 1 ]]; then
 fi
 
 export JOBLIB_START_METHOD=spawn
-"$VENV_PYTHON" "$OPTIMIZER" --symbols "$SYMBOLS" --timeframes "$TIMEFRAMES" --start_date "$START_DATE" --trials "$TRIALS" --jobs "$JOBS" --mode "$OPTIM_MODE"
+"$VENV_PYTHON" "$PIPELINE" --symbols "$SYMBOLS" --timeframes "$TIMEFRAMES" --start_date "$START_DATE" --trials "$TRIALS" --jobs "$JOBS" --mode "$OPTIM_MODE"
 if [ $? -ne 0 ]; then
-    echo -e "\n${RED}Fehler im Optimizer-Skript. Pipeline wird abgebrochen.${NC}"
+    echo -e "\n${RED}Fehler in der Pipeline. Abbruch.${NC}"
     deactivate
     exit 1
 fi
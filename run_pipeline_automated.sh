@@ -4,8 +4,7 @@
 SCRIPT_DIR=$(cd -- "$(dirname -- "${BASH_SOURCE[0]}")" &> /dev/null && pwd)
 VENV_PATH="$SCRIPT_DIR/.venv/bin/activate"
 SETTINGS_FILE="$SCRIPT_DIR/settings.json"
-TRAINER="src/lbot/analysis/trainer.py"
-OPTIMIZER="src/lbot/analysis/optimizer.py"
+PIPELINE="src/lbot/analysis/pipeline.py"
 CACHE_DIR="$SCRIPT_DIR/data/cache"
 TIMESTAMP_FILE="$CACHE_DIR/.last_cleaned"
 
@@ -28,6 +27,7 @@ if [[ "$CACHE_DAYS" -gt 0 ]]; then
     if [ -n "$(find "$TIMESTAMP_FILE" -mtime +$((CACHE_DAYS - 1)))" ]; then
         echo "Cache ist älter als $CACHE_DAYS Tage. Leere den Cache..."
         rm -rf "$CACHE_DIR"/*
+        rm -rf "$SCRIPT_DIR/artifacts/cache/pipeline"
         touch "$TIMESTAMP_FILE"
     else
         echo "Cache ist aktuell. Keine Reinigung notwendig."
@@ -55,20 +55,8 @@ N_JOBS=$(get_setting "['optimization_settings']['cpu_cores']")
 echo "Optimierung ist aktiviert. Starte Prozesse..."
 echo "Verwende Daten der letzten $LOOKBACK_DAYS Tage (Start: $START_DATE)."
 
-echo ">>> STUFE 1/2: Starte L-Bot LSTM-Modelltraining... <<<"
-python3 "$TRAINER" \
-    --symbols "$SYMBOLS" \
-    --timeframes "$TIMEFRAMES" \
-    --start_date "$START_DATE"
-
-if [ $? -ne 0 ]; then
-    echo "Fehler im Trainer-Skript. Pipeline wird abgebrochen."
-    deactivate
-    exit 1
-fi
-
-echo ">>> STUFE 2/2: Starte Handelsparameter-Optimierung... <<<"
-python3 "$OPTIMIZER" \
+echo ">>> Starte L-Bot Pipeline (Training & Optimierung in einem Prozess)... <<<"
+python3 "$PIPELINE" \
     --symbols "$SYMBOLS" \
     --timeframes "$TIMEFRAMES" \
     --start_date "$START_DATE" \
@@ -76,7 +64,7 @@ python3 "$OPTIMIZER" \
     --jobs "$N_JOBS"
 
 if [ $? -ne 0 ]; then
-    echo "Fehler im Optimizer-Skript. Pipeline wird abgebrochen."
+    echo "Fehler in der Pipeline. Abbruch."
     deactivate
     exit 1
 fi
@@ -0,0 +1,292 @@
+# scripts/benchmark.py
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+import sys
+import gc
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+from datetime import datetime, timezone
+
+# Füge das Hauptverzeichnis zum Pfad hinzu, um lbot-Module zu finden
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from lbot.utils.exchange_simulator import synthetic_candles
+
+BASELINE_FILE = os.path.join(PROJECT_ROOT, 'artifacts', 'benchmarks', 'baseline.json')
+SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+SEQUENCE_LENGTH = 24
+# Zeitdifferenzen darunter gelten als Messrauschen und lösen das Gate nie aus
+MIN_DELTA_SECONDS = 0.005
+SETTINGS = {
+    'model_settings': {'sequence_length': SEQUENCE_LENGTH, 'future_steps': 5},
+    'backtest_settings': {'fee_rate_pct': 0.06, 'slippage_pct': 0.02},
+    'strategy_filters': {'use_trend_filter': True, 'use_volatility_filter': True},
+}
+PARAMS = {
+    'strategy': {'entry_threshold_pct': 0.05, 'min_natr': 0.0, 'max_natr': 999},
+    'risk': {'leverage': 5, 'risk_per_trade_pct': 1.0, 'risk_reward_ratio': 2.0},
+    'behavior': {'use_longs': True},
+}
+
+_candles, _features, _model = {}, {}, {}
+
+
+def candles(n):
+    """ Deterministische Kerzen, pro Größe nur einmal erzeugt. """
+    if n not in _candles:
+        _candles[n] = synthetic_candles(n, '1h', start='2015-01-01', seed=7)
+    return _candles[n]
+
+
+def features(n):
+    from lbot.utils.lstm_model import create_ann_features
+    if n not in _features:
+        # 300 Kerzen Vorlauf, damit nach dem Indikator-Warmup genau n Zeilen übrig bleiben
+        _features[n] = create_ann_features(synthetic_candles(n + 300, '1h', start='2015-01-01', seed=7)).iloc[-n:]
+    return _features[n]
+
+
+def model_and_scaler():
+    """ Ungelerntes Modell mit Zufallsgewichten (gleiche Architektur wie im Live-Betrieb), kein Download nötig. """
+    if not _model:
+        import tensorflow as tf
+        from sklearn.preprocessing import StandardScaler
+        from lbot.utils.lstm_model import create_lstm_model, MODEL_FEATURE_COLUMNS
+        tf.keras.utils.set_random_seed(7)
+        _model['model'] = create_lstm_model(SEQUENCE_LENGTH, len(MODEL_FEATURE_COLUMNS))
+        _model['scaler'] = StandardScaler().fit(features(1_000)[MODEL_FEATURE_COLUMNS])
+    return _model['model'], _model['scaler']
+
+
+# --- Hot Paths: setup(n) liefert den Zustand, run(state) ist die gemessene Arbeit ---
+
+def setup_features(n):
+    return candles(n)
+
+def run_features(df):
+    from lbot.utils.lstm_model import create_ann_features
+    create_ann_features(df)
+
+
+def setup_sequences(n):
+    from lbot.utils.lstm_model import MODEL_FEATURE_COLUMNS
+    model, scaler = model_and_scaler()
+    df = features(n).copy()
+    df[MODEL_FEATURE_COLUMNS] = scaler.transform(df[MODEL_FEATURE_COLUMNS])
+    return df
+
+def run_sequences(df):
+    from lbot.utils.lstm_model import create_sequences
+    create_sequences(df, SEQUENCE_LENGTH, SETTINGS['model_settings']['future_steps'])
+
+
+def setup_batch_predict(n):
+    model, scaler = model_and_scaler()
+    return features(n), model, scaler
+
+def run_batch_predict(state):
+    from lbot.analysis.backtester import batch_predict
+    data, model, scaler = state
+    batch_predict(data, model, scaler, SEQUENCE_LENGTH)
+
+
+def setup_backtest(n):
+    # Vorhersagen wie in Pipeline/Optimizer vorab berechnet; gemessen wird die Kerzen-Schleife
+    predictions = np.random.default_rng(7).normal(0, 0.002, n)
+    return features(n), predictions
+
+def run_backtest(state):
+    from lbot.analysis.backtester import Backtester
+    data, predictions = state
+    Backtester(data, None, None, PARAMS, SETTINGS, 1000, predictions=predictions).run()
+
+
+def setup_mc_prediction(n):
+    from lbot.utils.lstm_model import MODEL_FEATURE_COLUMNS
+    model, scaler = model_and_scaler()
+    sequence = scaler.transform(features(1_000)[MODEL_FEATURE_COLUMNS].iloc[-SEQUENCE_LENGTH:])
+    return model, np.expand_dims(sequence, axis=0), n
+
+def run_mc_prediction(state):
+    from lbot.utils.mc_dropout_predictor import make_mc_prediction
+    model, sequence, n_samples = state
+    make_mc_prediction(model, sequence, n_samples=n_samples)
+
+
+def setup_history_store(n):
+    return candles(n)
+
+def run_history_store(df):
+    from lbot.utils.history_store import HistoryStore
+    base_dir = tempfile.mkdtemp(prefix='lbot_bench_')
+    try:
+        store = HistoryStore('BENCH/USDT', '1h', base_dir=base_dir)
+        store.append(df)
+        store.read()
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def setup_state_db(n):
+    from lbot.strategy import run as run_module
+    root = tempfile.mkdtemp(prefix='lbot_bench_')
+    # Die Status-Datenbank landet unter PROJECT_ROOT/artifacts/db -> für die Messung in ein Temp-Verzeichnis
+    original_root, run_module.PROJECT_ROOT = run_module.PROJECT_ROOT, root
+    run_module.setup_database('bench', 'BENCH/USDT:USDT', '1h')
+    return run_module, n, root, original_root
+
+def run_state_db(state):
+    run_module, n = state[:2]
+    for i in range(n):
+        run_module.set_state('bench', 'BENCH/USDT:USDT', '1h', 'last_signal', i)
+        run_module.get_state('bench', 'BENCH/USDT:USDT', '1h', 'last_signal')
+
+def teardown_state_db(state):
+    run_module, _, root, original_root = state
+    run_module.PROJECT_ROOT = original_root
+    shutil.rmtree(root, ignore_errors=True)
+
+
+def setup_import(module):
+    return module
+
+def run_import(module):
+    # Frischer Interpreter: gemessen wird der Kaltstart inklusive aller transitiven Importe
+    code = f"import sys; sys.path[:0] = [{os.path.join(PROJECT_ROOT, 'src')!r}, {PROJECT_ROOT!r}]; import {module}"
+    subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, cwd=PROJECT_ROOT)
+
+
+# Name -> (setup, run, Größen); Größen ohne Schlüssel aus SIZES sind feste Arbeitsmengen
+BENCHMARKS = {
+    'create_ann_features': (setup_features, run_features, ['1k', '10k', '100k', '1m']),
+    # 1m entfällt: das Ergebnis allein wären 1m x 24 x 6 float32-Werte (~580 MB)
+    'create_sequences': (setup_sequences, run_sequences, ['1k', '10k', '100k']),
+    'batch_predict': (setup_batch_predict, run_batch_predict, ['1k', '10k', '100k']),
+    'backtester_run': (setup_backtest, run_backtest, ['1k', '10k', '100k', '1m']),
+    'make_mc_prediction': (setup_mc_prediction, run_mc_prediction, {'30 samples': 30}),
+    'history_store': (setup_history_store, run_history_store, ['1k', '10k', '100k', '1m']),
+    'state_db': (setup_state_db, run_state_db, {'200 get/set': 200}),
+    # Startzeit der Einstiegspunkte, die kein Modell brauchen (TensorFlow darf hier nicht geladen werden)
+    'import_time': (setup_import, run_import, {'master_runner': 'master_runner', 'run': 'lbot.strategy.run',
+                                              'result_selector': 'lbot.analysis.result_selector',
+                                              'download_data': 'scripts.download_data'}),
+}
+# Aufräumen nach der Messung (Temp-Verzeichnisse, umgebogene Modul-Variablen), falls setup etwas anlegt
+TEARDOWNS = {'state_db': teardown_state_db}
+
+
+def measure(run, state, repeat, warmup=True):
+    """ Beste Laufzeit aus repeat Durchläufen, danach ein separater Lauf mit tracemalloc für den Speicher-Peak. """
+    if warmup:
+        run(state)  # Aufwärmen (Importe, TensorFlow-Graph, Caches)
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak / 1024 ** 2
+
+
+def run_benchmarks(names, sizes, repeat):
+    results = {}
+    for name in names:
+        setup, run, bench_sizes = BENCHMARKS[name]
+        if isinstance(bench_sizes, dict):
+            cases = bench_sizes.items()
+        else:
+            cases = [(label, SIZES[label]) for label in bench_sizes if label in sizes]
+        for label, n in cases:
+            state = setup(n)
+            # Große Fälle einmal messen; aufgewärmt ist der Pfad dann schon durch die kleineren
+            large = isinstance(n, int) and n >= SIZES['100k']
+            try:
+                seconds, peak_mb = measure(run, state, 1 if large else repeat, warmup=not large)
+            finally:
+                if name in TEARDOWNS:
+                    TEARDOWNS[name](state)
+            results[f"{name}@{label}"] = {'seconds': seconds, 'peak_mb': peak_mb}
+            print(f"  {name:<22} {label:<16} {seconds * 1000:>10.1f} ms  {peak_mb:>8.1f} MB")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """ Gibt die Fälle zurück, die langsamer als baseline * (1 + tolerance) sind. """
+    regressions = []
+    print(f"\n--- Vergleich mit Baseline vom {baseline.get('created', '?')} (Toleranz {tolerance:.0%}) ---")
+    for case, result in results.items():
+        reference = baseline['results'].get(case)
+        if reference is None:
+            print(f"  {case:<35} neu (keine Baseline)")
+            continue
+        ratio = result['seconds'] / reference['seconds'] if reference['seconds'] > 0 else 1.0
+        slower = ratio > 1 + tolerance and result['seconds'] - reference['seconds'] > MIN_DELTA_SECONDS
+        print(f"  {case:<35} {ratio:>6.2f}x  Speicher {result['peak_mb']:.1f} MB (Baseline {reference['peak_mb']:.1f} MB)"
+              + ("  <-- LANGSAMER" if slower else ""))
+        if slower:
+            regressions.append(case)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="L-Bot Benchmarks der Hot Paths (offline, synthetische Daten)")
+    parser.add_argument('--only', type=str, default='', help=f"Nur diese Benchmarks (Auswahl: {' '.join(BENCHMARKS)})")
+    parser.add_argument('--sizes', type=str, default='1k 10k 100k', help="Datengrößen: 1k 10k 100k 1m (1m nur auf Anfrage, dauert Minuten)")
+    parser.add_argument('--repeat', type=int, default=3, help="Wiederholungen pro Fall (die beste zählt)")
+    parser.add_argument('--baseline', type=str, default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help="Ergebnisse als neue Baseline speichern")
+    parser.add_argument('--check', action='store_true', help="Mit Exit-Code 1 abbrechen, wenn ein Fall langsamer als die Baseline ist")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Erlaubte Verlangsamung (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    names = args.only.split() or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unbekannte Benchmarks: {' '.join(unknown)}")
+
+    print(f"--- L-Bot Benchmarks ({platform.python_version()}, {platform.machine()}, {os.cpu_count()} Kerne) ---")
+    results = run_benchmarks(names, args.sizes.split(), args.repeat)
+
+    exit_code = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} Regression(en): {', '.join(regressions)}")
+            exit_code = 1 if args.check else 0
+    elif args.check:
+        # Ohne Baseline kann das Gate nichts prüfen -> nicht als bestanden melden
+        print(f"\nKeine Baseline unter {args.baseline} gefunden, erst mit --save-baseline anlegen.")
+        exit_code = 1
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        baseline = {'created': datetime.now(timezone.utc).isoformat(), 'python': platform.python_version(),
+                    'machine': platform.machine(), 'cpu_count': os.cpu_count(), 'results': results}
+        if os.path.exists(args.baseline):
+            # Nur gemessene Fälle ersetzen, damit Teil-Läufe (--only/--sizes) die übrige Baseline behalten
+            with open(args.baseline, 'r') as f:
+                baseline['results'] = dict(json.load(f).get('results', {}), **results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=4)
+        print(f"\nBaseline gespeichert: {args.baseline}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,92 +2,95 @@
 import os
 import sys
 import argparse
-import pandas as pd
-import ccxt
 from datetime import datetime, timezone
-from tqdm import tqdm
-import time # HIER IST DIE KORREKTUR
 
 # Füge das Hauptverzeichnis zum Pfad hinzu, um lbot-Module zu finden
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
 
-# Pfad-Logik aus data_handler importieren
-HISTORY_DIR = os.path.join(PROJECT_ROOT, 'data', 'history')
-def get_cache_filepath(symbol, timeframe):
-    safe_symbol = symbol.replace('/', '_').replace(':', '')
-    return os.path.join(HISTORY_DIR, f"{safe_symbol}_{timeframe}.parquet")
+from lbot.utils.downloader import HistoryDownloader, DEFAULT_WORKERS, ohlcv_to_dataframe
+from lbot.utils.history_store import HistoryStore
+from lbot.utils.resampler import get_base_timeframe, is_derivable, update_derived_store, verify_parity
 
-def download_all_data(symbol, timeframe, start_date_str='2020-01-01'):
+def _since_for(store, start_date_str):
+    """ Zeitstempel, ab dem nachgeladen werden muss. """
+    since = int(datetime.strptime(start_date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+    last_ts = store.last_timestamp()
+    if last_ts is not None:
+        print(f"Bestehende Historie für {store.symbol} ({store.timeframe}) gefunden. Lade nur neue Daten...")
+        since = int(last_ts.timestamp() * 1000) + 1
+    return since
+
+def download_all_data(symbols, timeframes, start_date_str='2020-01-01', workers=DEFAULT_WORKERS, requests_per_second=None, base_timeframe=None):
     """
-    Lädt historische OHLCV-Daten von Binance in Blöcken und speichert sie.
-    Aktualisiert vorhandene Dateien, anstatt alles neu zu laden.
+    Lädt historische OHLCV-Daten von Binance für alle Symbol/Timeframe-Paare parallel
+    (gemeinsames Rate-Limit) und aktualisiert vorhandene Dateien, anstatt alles neu zu laden.
+    Mit base_timeframe wird nur dieser Timeframe geladen, alle höheren werden lokal abgeleitet.
     """
-    exchange = ccxt.binance()
-    since = int(datetime.strptime(start_date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
-    
-    binance_symbol = symbol.split(':')[0]
-    filepath = get_cache_filepath(binance_symbol, timeframe)
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    
-    df_existing = None
-    if os.path.exists(filepath):
-        print(f"Bestehende Datei für {binance_symbol} ({timeframe}) gefunden. Lade nur neue Daten...")
-        df_existing = pd.read_parquet(filepath)
-        if not df_existing.empty:
-            since = int(df_existing.index[-1].timestamp() * 1000) + 1
+    binance_symbols = [symbol.split(':')[0] for symbol in symbols]
+    derived_timeframes = [tf for tf in timeframes if is_derivable(base_timeframe, tf)]
+    native_timeframes = [tf for tf in timeframes if tf not in derived_timeframes]
+    if derived_timeframes and base_timeframe not in native_timeframes:
+        native_timeframes.append(base_timeframe)
 
-    all_data = []
-    
-    pbar = tqdm(desc=f"Download {binance_symbol} ({timeframe})")
-    
-    while True:
-        try:
-            ohlcv = exchange.fetch_ohlcv(binance_symbol, timeframe, since=since, limit=1000)
-            if not ohlcv:
-                break
-            
-            first_ts = pd.to_datetime(ohlcv[0][0], unit='ms', utc=True)
-            last_ts = pd.to_datetime(ohlcv[-1][0], unit='ms', utc=True)
-            
-            pbar.set_postfix_str(f"Lade Block: {first_ts.date()} -> {last_ts.date()}")
-            
-            all_data.extend(ohlcv)
-            since = ohlcv[-1][0] + 1
-            pbar.update(len(ohlcv))
-            
-            time.sleep(exchange.rateLimit / 1000)
+    stores, jobs = {}, []
+    for symbol in binance_symbols:
+        for timeframe in native_timeframes:
+            store = HistoryStore(symbol, timeframe)
+            stores[(symbol, timeframe)] = store
+            jobs.append((symbol, timeframe, _since_for(store, start_date_str)))
 
-        except ccxt.NetworkError as e:
-            print(f" Netzwerkfehler: {e}. Warte 30 Sekunden...")
-            time.sleep(30)
-        except Exception as e:
-            print(f" Ein Fehler ist aufgetreten: {e}")
-            break
-            
-    pbar.close()
+    downloader = HistoryDownloader(max_workers=workers, requests_per_second=requests_per_second)
+    results = downloader.download_many(jobs)
 
-    if not all_data:
-        print("Keine neuen Daten zum Herunterladen gefunden.")
-        # Wenn bereits eine Datei existiert, stellen wir sicher, dass sie nicht leer ist
-        if df_existing is not None and not df_existing.empty:
-            df_existing.to_parquet(filepath)
-        return
+    for (symbol, timeframe), df_new in results.items():
+        if df_new is None:
+            print(f"Download für {symbol} ({timeframe}) unvollständig. Erneut starten, um am Checkpoint fortzusetzen.")
+            continue
+        if df_new.empty:
+            print(f"Keine neuen Daten für {symbol} ({timeframe}) gefunden.")
+            continue
+        store = stores[(symbol, timeframe)]
+        store.append(df_new)
+        print(f"Erfolgreich! {store.num_rows()} Kerzen für {symbol} ({timeframe}) gespeichert in {store.dir}")
 
-    df_new = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df_new['timestamp'] = pd.to_datetime(df_new['timestamp'], unit='ms', utc=True)
-    df_new.set_index('timestamp', inplace=True)
+    for symbol in binance_symbols:
+        for timeframe in derived_timeframes:
+            store = update_derived_store(symbol, base_timeframe, timeframe)
+            print(f"{store.num_rows()} Kerzen für {symbol} ({timeframe}) lokal aus {base_timeframe} abgeleitet.")
 
-    if df_existing is not None and not df_existing.empty:
-        df_combined = pd.concat([df_existing, df_new])
-    else:
-        df_combined = df_new
+def report_and_repair_gaps(symbols, timeframes, repair=False):
+    """ Zeigt die Lücken laut Gap-Index und lädt mit repair=True gezielt nur diese Bereiche nach. """
+    from lbot.utils.data_handler import get_history_store, repair_gaps
+    for symbol in [s.split(':')[0] for s in symbols]:
+        for timeframe in timeframes:
+            store = get_history_store(symbol, timeframe)
+            if not store.exists():
+                continue
+            gaps = store.gap_index()
+            missing, duplicates = gaps.get('missing', []), gaps.get('duplicates', [])
+            print(f"Gap-Index {symbol} ({timeframe}): {len(missing)} Lücken ({gaps.get('missing_candles', 0)} Kerzen), "
+                  f"{len(duplicates)} Bereiche mit Duplikaten, {len(gaps.get('unfillable', []))} nicht lieferbar.")
+            if repair and missing:
+                repaired = repair_gaps(symbol, timeframe)
+                print(f"  -> {repaired} Kerzen nachgeladen, verbleibend: {store.reload().get('gaps', {}).get('missing_candles', 0)} Kerzen.")
 
-    df_combined = df_combined[~df_combined.index.duplicated(keep='last')]
-    df_combined.sort_index(inplace=True)
-    df_combined.to_parquet(filepath)
-    
-    print(f"Erfolgreich! {len(df_combined)} Kerzen für {binance_symbol} ({timeframe}) gespeichert in {filepath}")
+def check_resampling_parity(symbols, timeframes, base_timeframe, limit=500):
+    """ Vergleicht die letzten `limit` abgeleiteten Kerzen mit den nativen Kerzen von Binance. """
+    import ccxt
+    exchange = ccxt.binance()
+    all_ok = True
+    for symbol in [s.split(':')[0] for s in symbols]:
+        for timeframe in [tf for tf in timeframes if is_derivable(base_timeframe, tf)]:
+            native = ohlcv_to_dataframe(exchange.fetch_ohlcv(symbol, timeframe, limit=limit))
+            compared, mismatches = verify_parity(symbol, base_timeframe, timeframe, native)
+            status = "OK" if mismatches.empty else f"{len(mismatches)} Abweichungen"
+            print(f"Parität {symbol} ({timeframe} aus {base_timeframe}): {compared} Kerzen verglichen -> {status}")
+            if not mismatches.empty:
+                all_ok = False
+                print(mismatches.head(10).to_string())
+    return all_ok
 
 
 if __name__ == "__main__":
@@ -95,11 +98,22 @@ if __name__ == "__main__":
     parser.add_argument('--symbols', required=True, type=str, help="Symbole, getrennt durch Leerzeichen (z.B. 'BTC ETH')")
     parser.add_argument('--timeframes', required=True, type=str, help="Timeframes, getrennt durch Leerzeichen (z.B. '1h 4h')")
     parser.add_argument('--start_date', type=str, default='2020-01-01', help="Startdatum im Format JJJJ-MM-TT")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Anzahl paralleler Download-Threads")
+    parser.add_argument('--rps', type=float, default=None, help="Max. Requests pro Sekunde (Standard: Rate-Limit der Börse)")
+    parser.add_argument('--base_timeframe', type=str, default=get_base_timeframe(), help="Nur diesen Timeframe laden (z.B. '1m') und höhere lokal ableiten")
+    parser.add_argument('--verify_parity', action='store_true', help="Abgeleitete Kerzen gegen die nativen Kerzen der Börse prüfen")
+    parser.add_argument('--repair', action='store_true', help="Nur die Lücken laut Gap-Index nachladen (kein regulärer Download)")
     args = parser.parse_args()
 
     symbols_to_download = [s.upper() + "/USDT" for s in args.symbols.split()]
     timeframes_to_download = args.timeframes.split()
 
-    for symbol in symbols_to_download:
-        for timeframe in timeframes_to_download:
-            download_all_data(symbol, timeframe, args.start_date)
+    if args.repair:
+        report_and_repair_gaps(symbols_to_download, timeframes_to_download, repair=True)
+        sys.exit(0)
+
+    download_all_data(symbols_to_download, timeframes_to_download, args.start_date, args.workers, args.rps, args.base_timeframe)
+    report_and_repair_gaps(symbols_to_download, timeframes_to_download)
+    if args.verify_parity and args.base_timeframe:
+        if not check_resampling_parity(symbols_to_download, timeframes_to_download, args.base_timeframe):
+            sys.exit(1)
@@ -0,0 +1,192 @@
+# scripts/load_test.py
+import os
+import sys
+import io
+import json
+import time
+import logging
+import argparse
+import contextlib
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# Füge das Hauptverzeichnis zum Pfad hinzu, um lbot-Module zu finden
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from sklearn.preprocessing import StandardScaler
+from lbot.utils.exchange import Exchange
+from lbot.utils.exchange_simulator import SimulatedMarket, SimulatedExchange, synthetic_candles
+from lbot.utils.lstm_model import create_ann_features, create_lstm_model, MODEL_FEATURE_COLUMNS
+from lbot.utils.trade_manager import full_trade_cycle, babysit_open_position
+
+
+class CountingHandler(logging.Handler):
+    """ Zählt Fehler-Logs der Strategien, ohne sie auszugeben. """
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+        self.first = None
+        self.lock = threading.Lock()
+
+    def emit(self, record):
+        with self.lock:
+            self.count += 1
+            if self.first is None:
+                self.first = record.getMessage()
+
+
+class MemoryState:
+    """ In-Memory-Ersatz für die SQLite-Statusfunktionen aus run.py. """
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, account_name, symbol, timeframe, key, default='0'):
+        with self.lock:
+            return self.values.get((account_name, symbol, timeframe, key), default)
+
+    def set(self, account_name, symbol, timeframe, key, value):
+        with self.lock:
+            self.values[(account_name, symbol, timeframe, key)] = str(value)
+
+
+def build_market(args):
+    if args.symbols:
+        symbols = [f"{s.upper()}/USDT:USDT" for s in args.symbols.split()]
+        return SimulatedMarket.from_history_store(symbols, args.timeframe, start=args.start_date, start_bar=args.warmup_bars)
+    candles = {}
+    for i in range(args.strategies):
+        candles[f"SIM{i:03d}/USDT:USDT"] = synthetic_candles(args.warmup_bars + args.bars + 1, args.timeframe,
+                                                             start_price=100.0 + i, seed=args.seed + i)
+    return SimulatedMarket(candles, args.timeframe, start_bar=args.warmup_bars)
+
+
+def build_model_and_scaler(market, sequence_length):
+    """ Ungelerntes Modell mit Zufallsgewichten: gemessen wird der Live-Pfad, nicht die Prognosegüte. """
+    candles = next(iter(market.candles.values()))
+    features = create_ann_features(candles)[MODEL_FEATURE_COLUMNS]
+    scaler = StandardScaler().fit(features)
+    model = create_lstm_model(sequence_length, len(MODEL_FEATURE_COLUMNS))
+    return model, scaler
+
+
+def build_strategies(market, args):
+    strategies = []
+    symbols = market.symbols
+    for i in range(args.strategies):
+        strategies.append({
+            'market': {'symbol': symbols[i % len(symbols)], 'timeframe': args.timeframe},
+            # Schwellen so gesetzt, dass jedes Signal handelt -> maximale Last auf dem Order-Pfad
+            'strategy': {'entry_threshold_pct': -1e9, 'uncertainty_threshold': 1e9},
+            'risk': {'leverage': 5, 'risk_per_trade_pct': 1.0, 'risk_reward_ratio': 1.5, 'margin_mode': 'isolated'},
+            'behavior': {'use_longs': True},
+        })
+    return strategies
+
+
+def percentiles(values):
+    if not values:
+        return "n/a"
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50={p50:.1f}ms p95={p95:.1f}ms p99={p99:.1f}ms max={max(values):.1f}ms"
+
+
+def run_load_test(args):
+    with open(os.path.join(PROJECT_ROOT, 'settings.json'), 'r') as f:
+        settings = json.load(f)
+    settings['strategy_filters'] = dict(settings.get('strategy_filters', {}), use_trend_filter=False, use_volatility_filter=False)
+    settings['model_settings'] = dict(settings.get('model_settings', {}), mc_dropout_samples=args.mc_samples)
+    settings['live_trading_settings'] = dict(settings.get('live_trading_settings', {}),
+                                             order_execution={'attach_sl_tp_to_entry': not args.separate_sl_tp,
+                                                              'fill_timeout_seconds': 5, 'fill_poll_interval_seconds': 0.01})
+
+    market = build_market(args)
+    model, scaler = build_model_and_scaler(market, settings['model_settings'].get('sequence_length', 24))
+    strategies = build_strategies(market, args)
+
+    # Pro Strategie ein eigenes Konto, wie im Live-Betrieb pro Subprozess ein eigener Client
+    exchanges = []
+    for i, _ in enumerate(strategies):
+        client = SimulatedExchange(market, start_balance=args.balance, latency_ms=args.latency_ms,
+                                   latency_jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                                   supports_attached_sl_tp=not args.separate_sl_tp, seed=args.seed + i)
+        exchanges.append(Exchange({'name': f'sim{i:03d}'}, client=client))
+
+    state = MemoryState()
+    counter = CountingHandler()
+    logger = logging.getLogger('load_test')
+    logger.propagate = False
+    logger.handlers = [counter]
+    logger.setLevel(logging.INFO)
+
+    latencies = {'babysit': [], 'trade_cycle': []}
+    lat_lock = threading.Lock()
+
+    def timed(stage, func, *func_args):
+        start = time.perf_counter()
+        try:
+            func(*func_args)
+        except Exception as e:
+            logger.error(f"{stage}: {type(e).__name__}: {e}")
+        with lat_lock:
+            latencies[stage].append((time.perf_counter() - start) * 1000)
+
+    def run_strategy(i):
+        exchange, params = exchanges[i], strategies[i]
+        timed('babysit', babysit_open_position, exchange, params, state.get, state.set, {}, logger)
+        balance = exchange.fetch_balance_usdt()
+        timed('trade_cycle', full_trade_cycle, exchange, model, scaler, params, settings, balance,
+              state.get, state.set, {}, logger)
+
+    bars_done = 0
+    wall_start = time.perf_counter()
+    # Telegram-Ausgaben ohne Token würden sonst die Konsole fluten
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for _ in range(args.bars):
+            list(pool.map(run_strategy, range(len(strategies))))
+            bars_done += 1
+            if not market.advance():
+                break
+    wall = time.perf_counter() - wall_start
+
+    cycles = bars_done * len(strategies)
+    call_counts = {}
+    for exchange in exchanges:
+        for method, count in exchange.exchange.call_counts.items():
+            call_counts[method] = call_counts.get(method, 0) + count
+    trades_closed = sum(e.exchange.trades_closed for e in exchanges)
+    open_positions = sum(len(e.exchange.positions) for e in exchanges)
+
+    print(f"\n--- Lasttest: {len(strategies)} Strategien x {bars_done} Kerzen ({args.timeframe}) ---")
+    print(f"Laufzeit: {wall:.2f}s, Durchsatz: {cycles / wall:.1f} Zyklen/s")
+    for stage, values in latencies.items():
+        print(f"  {stage:<12} {percentiles(values)}")
+    print(f"Trades geschlossen: {trades_closed}, offene Positionen: {open_positions}")
+    print(f"Fehler: {counter.count}" + (f" (erster: {counter.first})" if counter.first else ""))
+    print("Börsen-Aufrufe: " + ", ".join(f"{m}={c}" for m, c in sorted(call_counts.items())))
+    return counter.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="L-Bot Lasttest gegen die lokale Börsen-Simulation")
+    parser.add_argument('--strategies', type=int, default=100, help="Anzahl gleichzeitiger Strategien")
+    parser.add_argument('--bars', type=int, default=20, help="Anzahl simulierter Kerzen")
+    parser.add_argument('--timeframe', type=str, default='1h')
+    parser.add_argument('--symbols', type=str, default=None, help="Kerzen aus dem lokalen Store (z.B. 'BTC ETH') statt synthetischer Daten")
+    parser.add_argument('--start_date', type=str, default=None, help="Startdatum für --symbols (JJJJ-MM-TT)")
+    parser.add_argument('--warmup_bars', type=int, default=300, help="Kerzen vor dem ersten Zyklus (für Indikatoren)")
+    parser.add_argument('--workers', type=int, default=32, help="Parallel laufende Strategien")
+    parser.add_argument('--latency_ms', type=float, default=50.0, help="Simulierte Latenz pro Börsen-Aufruf")
+    parser.add_argument('--jitter_ms', type=float, default=20.0)
+    parser.add_argument('--error_rate', type=float, default=0.0, help="Anteil fehlschlagender Börsen-Aufrufe (0-1)")
+    parser.add_argument('--mc_samples', type=int, default=5, help="MC-Dropout-Durchläufe pro Vorhersage")
+    parser.add_argument('--balance', type=float, default=10000.0)
+    parser.add_argument('--separate_sl_tp', action='store_true', help="SL/TP als eigene Trigger-Orders statt angehängt")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    errors = run_load_test(args)
+    sys.exit(1 if errors and args.error_rate == 0 else 0)
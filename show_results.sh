@@ -4,5 +4,5 @@ RESULTS_SCRIPT="src/lbot/analysis/show_results.py"
 
 # Umgebung aktivieren und Skript ausführen
 source "$VENV_PATH"
-python3 "$RESULTS_SCRIPT"
+python3 "$RESULTS_SCRIPT" "$@"
 deactivate
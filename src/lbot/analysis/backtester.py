@@ -4,96 +4,267 @@ import numpy as np
 import logging
 # Entferne den MC-Dropout-Import, da wir ihn nicht mehr verwenden
 # from ..utils.mc_dropout_predictor import make_mc_prediction 
-from ..utils.lstm_model import EMA_LONG_PERIOD, ATR_PERIOD
+from ..utils.lstm_model import EMA_LONG_PERIOD, ATR_PERIOD, MODEL_FEATURE_COLUMNS
+from ..utils.gap_index import index_to_ms, timeframe_to_ms
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def batch_predict(data, model, scaler, sequence_length, batch_size=1024):
+    """
+    Berechnet die Vorhersagen für alle Kerzen in einem einzigen model.predict-Aufruf.
+    Position i enthält die Vorhersage aus der Sequenz [i - sequence_length, i), genau wie
+    im Kerzen-für-Kerzen-Backtest; die ersten sequence_length Positionen sind NaN.
+    """
+    predictions = np.full(len(data), np.nan)
+    if len(data) <= sequence_length: return predictions
+    scaled = scaler.transform(data[MODEL_FEATURE_COLUMNS])
+    windows = np.lib.stride_tricks.sliding_window_view(scaled, sequence_length, axis=0).transpose(0, 2, 1)[:-1]
+    predictions[sequence_length:] = model.predict(windows, batch_size=batch_size, verbose=0)[:, 0]
+    return predictions
+
+def signal_inputs(data):
+    """ Schlusskurse (float64) sowie EMA- und NATR-Spalte (None, wenn nicht vorhanden) für entry_mask. """
+    ema_col = f'ema_{EMA_LONG_PERIOD}'; natr_col = f'natr_{ATR_PERIOD}'
+    return (data['close'].to_numpy(np.float64), data[ema_col].to_numpy() if ema_col in data.columns else None,
+            data[natr_col].to_numpy() if natr_col in data.columns else None)
+
+def entry_mask(predictions, close, ema, natr, params, filter_conf):
+    """
+    Kerzen, an denen ein Long-Einstieg erlaubt ist (Vorhersage über der Schwelle, Trend- und
+    Volatilitätsfilter), vektorisiert über alle Kerzen. Ob dort tatsächlich eingestiegen wird, hängt
+    nur noch davon ab, ob gerade eine Position offen ist: Maske + Risiko-Parameter bestimmen den Backtest.
+    """
+    if not params['behavior'].get('use_longs', False): return np.zeros(len(close), dtype=bool)
+    mask = np.asarray(predictions) * 100 >= params['strategy'].get('entry_threshold_pct', 1.0)
+    if filter_conf.get('use_trend_filter', False) and ema is not None: mask &= close > ema
+    if filter_conf.get('use_volatility_filter', False) and natr is not None:
+        mask &= (natr >= params['strategy'].get('min_natr', 0)) & (natr <= params['strategy'].get('max_natr', 999))
+    return mask
+
+EXIT_REASONS = ('SL', 'TP')
+
+class TradeLedger:
+    """
+    Trades als Struct-of-Arrays: eine Zeile pro Trade in vorab reservierten numpy-Spalten
+    (bei Bedarf verdoppelt) statt einer Liste von Dicts. `open_trade` zeigt auf die offene
+    Zeile (-1 = keine), die Zeilen [0, closed) sind abgeschlossen.
+    """
+    COLUMNS = {'entry_index': np.int64, 'exit_index': np.int64, 'entry_ms': np.int64, 'exit_ms': np.int64,
+               'entry_price': np.float64, 'exit_price': np.float64, 'reason': np.int8, 'equity': np.float64}
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity; self.closed = 0; self.open_trade = -1
+        for name, dtype in self.COLUMNS.items(): setattr(self, name, np.zeros(capacity, dtype=dtype))
+    def _grow(self):
+        for name in self.COLUMNS:
+            column = getattr(self, name); grown = np.zeros(self.capacity * 2, dtype=column.dtype); grown[:self.capacity] = column; setattr(self, name, grown)
+        self.capacity *= 2
+    def open(self, index, ms, price):
+        if self.closed == self.capacity: self._grow()
+        row = self.open_trade = self.closed
+        self.entry_index[row] = index; self.entry_ms[row] = ms; self.entry_price[row] = price
+        return row
+    def close(self, index, ms, price, reason, equity):
+        row = self.open_trade
+        self.exit_index[row] = index; self.exit_ms[row] = ms; self.exit_price[row] = price
+        self.reason[row] = EXIT_REASONS.index(reason); self.equity[row] = equity
+        self.open_trade = -1; self.closed += 1
+        return row
+
+class IntrabarDrilldown:
+    """
+    High/Low eines kleineren Timeframes, um Kerzen aufzulösen, in deren Spanne sowohl SL als auch TP
+    liegen. Kerze i umfasst die Sub-Kerzen [start[i], end[i]) (per searchsorted über die Zeitstempel);
+    der Index wird einmal pro Kerzenreihe berechnet und von allen Backtests darauf wiederverwendet.
+    """
+    def __init__(self, timestamps, high, low, bar_ms):
+        self.timestamps = np.asarray(timestamps, dtype=np.int64); self.high = np.asarray(high, dtype=np.float64); self.low = np.asarray(low, dtype=np.float64)
+        self.bar_ms = bar_ms; self._offsets = {}
+    def offsets(self, bar_timestamps):
+        key = (len(bar_timestamps), int(bar_timestamps[0]), int(bar_timestamps[-1])) if len(bar_timestamps) else (0,)
+        if key not in self._offsets:
+            self._offsets[key] = (np.searchsorted(self.timestamps, bar_timestamps, 'left'), np.searchsorted(self.timestamps, bar_timestamps + self.bar_ms, 'left'))
+        return self._offsets[key]
+    def first_hit(self, start, end, sl_price, tp_price):
+        """ 'SL' oder 'TP', je nachdem, was innerhalb der Sub-Kerzen zuerst erreicht wird; None ohne Sub-Kerzen/Treffer. Beide in derselben Sub-Kerze -> SL. """
+        if start >= end: return None
+        hit_sl = self.low[start:end] <= sl_price; hits = hit_sl | (self.high[start:end] >= tp_price)
+        first = int(hits.argmax())
+        if not hits[first]: return None
+        return 'SL' if hit_sl[first] else 'TP'
+
+def load_drilldown(symbol, timeframe, data, settings):
+    """
+    Lädt high/low des in backtest_settings.drilldown_timeframe gesetzten Timeframes für den Zeitraum
+    von `data` aus dem lokalen Historien-Store. None, wenn nichts konfiguriert ist, der Timeframe
+    nicht kleiner ist oder der Store (noch) keine Daten hat.
+    """
+    drilldown_timeframe = settings.get('backtest_settings', {}).get('drilldown_timeframe')
+    if not drilldown_timeframe or data is None or data.empty: return None
+    bar_ms = timeframe_to_ms(timeframe)
+    if timeframe_to_ms(drilldown_timeframe) >= bar_ms: return None
+    from ..utils.data_handler import get_history_store
+    end = data.index[-1] + pd.Timedelta(milliseconds=bar_ms - 1)
+    sub_bars = get_history_store(symbol, drilldown_timeframe).read(start=data.index[0], end=end, columns=['high', 'low'])
+    if sub_bars.empty:
+        logging.warning(f"Keine {drilldown_timeframe}-Historie für {symbol}: SL/TP in mehrdeutigen Kerzen werden konservativ als SL gewertet.")
+        return None
+    return IntrabarDrilldown(index_to_ms(sub_bars.index), sub_bars['high'].to_numpy(), sub_bars['low'].to_numpy(), bar_ms)
+
 class Backtester:
-    def __init__(self, data, model, scaler, params, settings, start_capital=1000):
-        self.data = data; self.model = model; self.scaler = scaler; self.params = params; self.settings = settings; self.start_capital = start_capital
+    def __init__(self, data, model, scaler, params, settings, start_capital=1000, predictions=None, drilldown=None, signals=None):
+        """
+        predictions: optional vorab berechnete Vorhersagen (siehe batch_predict), dann entfällt model.predict pro Kerze.
+        drilldown: optionaler IntrabarDrilldown (siehe load_drilldown) für Kerzen, in denen SL und TP liegen.
+        signals: optional bereits berechnete entry_mask zu den Vorhersagen (sonst hier einmal berechnet).
+        """
+        self.data = data; self.model = model; self.scaler = scaler; self.params = params; self.settings = settings; self.start_capital = start_capital; self.predictions = predictions; self.drilldown = drilldown; self.signals = signals
         model_conf = self.settings.get('model_settings', {}); backtest_conf = self.settings.get('backtest_settings', {}); self.filter_conf = self.settings.get('strategy_filters', {})
         self.sequence_length = model_conf.get('sequence_length', 24); self.fee_rate = backtest_conf.get('fee_rate_pct', 0.06) / 100; self.slippage = backtest_conf.get('slippage_pct', 0.02) / 100
-        self.trades = []; self.equity_curve = [start_capital]
+        # 'close': SL/TP nur gegen den Schlusskurs; 'high_low': gegen die Kerzenspanne, Ausstieg zum Level (bzw. Eröffnungskurs bei Gap)
+        self.exit_model = backtest_conf.get('exit_model', 'close'); self.ambiguous_bars = 0; self.drilldown_hits = 0
+        self.ledger = TradeLedger()
+        # Laufende Kennzahlen, bei jedem geschlossenen Trade aktualisiert: am Ende ist kein weiterer Durchlauf nötig
+        self.equity = start_capital; self.peak_equity = start_capital; self.max_drawdown = 0.0; self.wins = 0
+        self.return_sum = 0.0; self.return_sq_sum = 0.0; self.downside_sq_sum = 0.0; self.gross_profit = 0.0; self.gross_loss = 0.0
+        self.bars_in_market = 0; self.bars_simulated = 0
+    @property
+    def equity_curve(self):
+        """ Kapital vor dem ersten und nach jedem geschlossenen Trade. """
+        return np.concatenate(([self.start_capital], self.ledger.equity[:self.ledger.closed]))
+    def _prepare_arrays(self):
+        # Die Kerzen-Schleife arbeitet auf reinen Arrays: Schlusskurse in float64 (Geldrechnung), Zeit als int64-ms
+        self._close, self._ema, self._natr = signal_inputs(self.data); self._timestamps = index_to_ms(self.data.index)
+        if self.predictions is not None and self.signals is None:
+            self.signals = entry_mask(self.predictions, self._close, self._ema, self._natr, self.params, self.filter_conf)
+        self._intrabar = self.exit_model == 'high_low' and all(col in self.data.columns for col in ('open', 'high', 'low'))
+        if self._intrabar:
+            self._open = self.data['open'].to_numpy(np.float64); self._high = self.data['high'].to_numpy(np.float64); self._low = self.data['low'].to_numpy(np.float64)
+            self._sub_start, self._sub_end = self.drilldown.offsets(self._timestamps) if self.drilldown is not None else (None, None)
     def _apply_slippage(self, price, side):
         if side == 'long': return price * (1 + self.slippage)
         elif side == 'short': return price * (1 - self.slippage)
         return price
     def _is_trend_filter_ok(self, index, side):
         if not self.filter_conf.get('use_trend_filter', False): return True
-        ema_col = f'ema_{EMA_LONG_PERIOD}'; 
-        if ema_col not in self.data.columns: return True
-        current_price = self.data['close'].iloc[index]; ema_value = self.data[ema_col].iloc[index]
-        if side == 'long': return current_price > ema_value
+        if self._ema is None: return True
+        if side == 'long': return self._close[index] > self._ema[index]
         return False
     def _is_volatility_filter_ok(self, index):
         if not self.filter_conf.get('use_volatility_filter', False): return True
-        natr_col = f'natr_{ATR_PERIOD}'
-        if natr_col not in self.data.columns: return True
+        if self._natr is None: return True
         min_natr = self.params['strategy'].get('min_natr', 0); max_natr = self.params['strategy'].get('max_natr', 999)
-        current_natr = self.data[natr_col].iloc[index]
-        return min_natr <= current_natr <= max_natr
+        return min_natr <= self._natr[index] <= max_natr
 
     def run(self):
         try:
-            model_feature_columns = ['rsi', 'adx', 'stoch_k', 'price_vs_ema_short', 'price_vs_ema_medium', 'rsi_vs_ema_rsi']
-            features_to_scale = self.data[model_feature_columns]
-            scaled_feature_values = self.scaler.transform(features_to_scale)
-            scaled_features_df = pd.DataFrame(scaled_feature_values, index=features_to_scale.index, columns=features_to_scale.columns)
-            position = None; entry_price = 0
+            self._prepare_arrays()
+            if self.predictions is None:
+                features_to_scale = self.data[MODEL_FEATURE_COLUMNS]
+                scaled_feature_values = self.scaler.transform(features_to_scale)
+                scaled_features_df = pd.DataFrame(scaled_feature_values, index=features_to_scale.index, columns=features_to_scale.columns)
+            position = None; entry_price = 0; sl_price = tp_price = 0
             for i in range(self.sequence_length, len(self.data)):
-                current_data_point_index = self.data.index[i]
-                if position:
-                    current_price = self.data['close'].loc[current_data_point_index]
+                self.bars_simulated += 1
+                if position and self._intrabar:
+                    exit_signal = self._intrabar_exit(i, sl_price, tp_price)
+                    if exit_signal: self._close_position(i, *exit_signal); position = None
+                elif position:
+                    current_price = self._close[i]
                     pnl_pct = (current_price - entry_price) / entry_price
                     if position == 'long':
                         if pnl_pct <= -self.sl_pct: self._close_position(i, 'SL'); position = None
                         elif pnl_pct >= self.tp_pct: self._close_position(i, 'TP'); position = None
                 if not position:
-                    start_index = i - self.sequence_length; end_index = i
-                    sequence_indices = self.data.index[start_index:end_index]
-                    if not all(idx in scaled_features_df.index for idx in sequence_indices): continue
-                    sequence_data = scaled_features_df.loc[sequence_indices].values
-                    input_data = np.expand_dims(sequence_data, axis=0)
-                    
-                    # ZURÜCK ZUR EINFACHEN VORHERSAGE
-                    prediction = self.model.predict(input_data, verbose=0)[0][0]
-                    
-                    entry_threshold_pct = self.params['strategy'].get('entry_threshold_pct', 1.0)
-                    predicted_pct_gain = prediction * 100
+                    if self.signals is not None:
+                        # Vorhersagen liegen vor: Schwelle und Filter sind bereits in der Maske ausgewertet
+                        enter = self.signals[i]
+                    else:
+                        start_index = i - self.sequence_length; end_index = i
+                        sequence_indices = self.data.index[start_index:end_index]
+                        if not all(idx in scaled_features_df.index for idx in sequence_indices): continue
+                        sequence_data = scaled_features_df.loc[sequence_indices].values
+                        input_data = np.expand_dims(sequence_data, axis=0)
+
+                        # ZURÜCK ZUR EINFACHEN VORHERSAGE
+                        prediction = self.model.predict(input_data, verbose=0)[0][0]
                     
-                    if (predicted_pct_gain >= entry_threshold_pct and 
-                        self.params['behavior'].get('use_longs', False) and 
-                        self._is_trend_filter_ok(i, 'long') and
-                        self._is_volatility_filter_ok(i)):
-                        
+                        entry_threshold_pct = self.params['strategy'].get('entry_threshold_pct', 1.0)
+                        predicted_pct_gain = prediction * 100
+                        enter = (predicted_pct_gain >= entry_threshold_pct and
+                                 self.params['behavior'].get('use_longs', False) and
+                                 self._is_trend_filter_ok(i, 'long') and
+                                 self._is_volatility_filter_ok(i))
+
+                    if enter:
                         position = 'long'; leverage = self.params['risk']['leverage']; risk_per_trade = self.params['risk']['risk_per_trade_pct'] / 100
                         rr_ratio = self.params['risk']['risk_reward_ratio']; self.sl_pct = risk_per_trade / leverage; self.tp_pct = self.sl_pct * rr_ratio
-                        self._open_position(i, 'long'); entry_price = self.trades[-1]['entry_price']
+                        entry_price = self._open_position(i, 'long'); sl_price = entry_price * (1 - self.sl_pct); tp_price = entry_price * (1 + self.tp_pct)
         except Exception:
             return self._calculate_metrics()
         return self._calculate_metrics()
+    def _intrabar_exit(self, index, sl_price, tp_price):
+        """
+        (Grund, Ausstiegskurs vor Slippage) für eine Long-Position, wenn die Kerze SL oder TP berührt, sonst None.
+        Öffnet die Kerze bereits jenseits eines Levels, wird zum Eröffnungskurs ausgestiegen. Liegen beide
+        Levels in der Spanne, entscheidet der Drilldown; ohne (oder ohne Sub-Kerzen) gilt konservativ SL.
+        """
+        hit_sl = self._low[index] <= sl_price; hit_tp = self._high[index] >= tp_price
+        if not (hit_sl or hit_tp): return None
+        open_price = self._open[index]
+        if open_price <= sl_price: return 'SL', open_price
+        if open_price >= tp_price: return 'TP', open_price
+        if hit_sl and hit_tp:
+            self.ambiguous_bars += 1; reason = None
+            if self._sub_start is not None: reason = self.drilldown.first_hit(self._sub_start[index], self._sub_end[index], sl_price, tp_price)
+            if reason: self.drilldown_hits += 1
+            else: reason = 'SL'
+            return reason, sl_price if reason == 'SL' else tp_price
+        return ('SL', sl_price) if hit_sl else ('TP', tp_price)
     def _open_position(self, index, side):
-        raw_price = self.data['close'].iloc[index]; entry_price_with_slippage = self._apply_slippage(raw_price, side)
-        self.trades.append({'entry_index': index, 'entry_date': self.data.index[index], 'entry_price': entry_price_with_slippage, 'side': side, 'status': 'open'})
-    def _close_position(self, index, reason):
-        trade_to_close = next((t for t in reversed(self.trades) if t['status'] == 'open'), None)
-        if not trade_to_close: return
-        raw_price = self.data['close'].iloc[index]; exit_price_with_slippage = self._apply_slippage(raw_price, 'short')
-        trade_to_close.update({'status': 'closed', 'exit_index': index, 'exit_date': self.data.index[index], 'exit_price': exit_price_with_slippage, 'reason': reason})
-        entry_price = trade_to_close['entry_price']; exit_price = trade_to_close['exit_price']; pnl_pct = (exit_price - entry_price) / entry_price
-        leverage = self.params['risk']['leverage']; capital = self.equity_curve[-1]
+        entry_price_with_slippage = self._apply_slippage(float(self._close[index]), side)
+        self.ledger.open(index, self._timestamps[index], entry_price_with_slippage)
+        return entry_price_with_slippage
+    def _close_position(self, index, reason, price=None):
+        ledger = self.ledger
+        if ledger.open_trade < 0: return
+        exit_price_with_slippage = self._apply_slippage(float(self._close[index] if price is None else price), 'short')
+        entry_price = ledger.entry_price[ledger.open_trade]; pnl_pct = (exit_price_with_slippage - entry_price) / entry_price
+        leverage = self.params['risk']['leverage']; capital = self.equity
         entry_cost = capital * leverage * self.fee_rate; exit_cost = capital * leverage * (1 + pnl_pct) * self.fee_rate
         total_fees = entry_cost + exit_cost; pnl_amount = (capital * pnl_pct * leverage) - total_fees
-        self.equity_curve.append(capital + pnl_amount)
+        self.bars_in_market += index - ledger.entry_index[ledger.open_trade]
+        ledger.close(index, self._timestamps[index], exit_price_with_slippage, reason, capital + pnl_amount)
+        self._update_metrics(pnl_pct, pnl_amount, capital)
+    def _update_metrics(self, price_pnl_pct, pnl_amount, capital):
+        self.equity = capital + pnl_amount; trade_return = pnl_amount / capital if capital else 0.0
+        if price_pnl_pct > 0: self.wins += 1
+        if pnl_amount > 0: self.gross_profit += pnl_amount
+        else: self.gross_loss -= pnl_amount
+        self.peak_equity = max(self.peak_equity, self.equity)
+        self.max_drawdown = max(self.max_drawdown, (self.peak_equity - self.equity) / self.peak_equity)
+        self.return_sum += trade_return; self.return_sq_sum += trade_return ** 2
+        if trade_return < 0: self.downside_sq_sum += trade_return ** 2
+    def trade_stream(self):
+        """ Abgeschlossene Trades als JSON-fähige Spalten: Ein-/Ausstieg (ms) und Rendite auf das Kapital (netto, inkl. Hebel und Gebühren). """
+        closed = self.ledger.closed; equity = self.equity_curve
+        return {'entry': self.ledger.entry_ms[:closed].tolist(), 'exit': self.ledger.exit_ms[:closed].tolist(),
+                'return': (equity[1:] / equity[:-1] - 1).tolist()}
     def _calculate_metrics(self):
-        if not self.trades: return {'total_pnl_pct': 0, 'win_rate': 0, 'max_drawdown_pct': 0, 'num_trades': 0}
-        df_trades = pd.DataFrame(self.trades)
-        if 'status' not in df_trades.columns or df_trades[df_trades['status'] == 'closed'].empty: return {'total_pnl_pct': 0, 'win_rate': 0, 'max_drawdown_pct': 0, 'num_trades': 0}
-        closed_trades = df_trades[df_trades['status'] == 'closed'].copy()
-        pnl = (closed_trades['exit_price'] - closed_trades['entry_price']) / closed_trades['entry_price']
-        final_equity = self.equity_curve[-1]; total_pnl_pct = (final_equity / self.start_capital - 1) * 100
-        win_rate = (pnl > 0).mean() * 100 if not pnl.empty else 0
-        equity_series = pd.Series(self.equity_curve); peak = equity_series.expanding(min_periods=1).max()
-        drawdown = (equity_series - peak) / peak
-        max_drawdown_pct = abs(drawdown.min() * 100) if not drawdown.empty and not drawdown.isnull().all() else 0
-        return {'total_pnl_pct': total_pnl_pct, 'win_rate': win_rate, 'max_drawdown_pct': max_drawdown_pct, 'num_trades': len(closed_trades)}
+        """
+        Kennzahlen aus den laufenden Summen (kein weiterer Durchlauf über Trades oder Equity):
+          win_rate       Anteil der Trades mit Kursgewinn (vor Gebühren)
+          sharpe/sortino pro Trade: mittlere Rendite / Std-Abw. bzw. / Abwärts-Abweichung (nicht annualisiert)
+          profit_factor  Bruttogewinn / Bruttoverlust (None ohne Verlusttrade: nicht definiert, und inf wäre kein gültiges JSON)
+          exposure_pct   Anteil der simulierten Kerzen mit offener Position
+        """
+        n = self.ledger.closed
+        if n == 0: return {'total_pnl_pct': 0, 'win_rate': 0, 'max_drawdown_pct': 0, 'num_trades': 0, 'sharpe': 0.0, 'sortino': 0.0, 'profit_factor': 0.0, 'exposure_pct': 0.0}
+        mean = self.return_sum / n; std = np.sqrt(max(self.return_sq_sum / n - mean ** 2, 0.0)); downside = np.sqrt(self.downside_sq_sum / n)
+        bars_in_market = self.bars_in_market
+        if self.ledger.open_trade >= 0: bars_in_market += len(self.data) - 1 - self.ledger.entry_index[self.ledger.open_trade]
+        return {'total_pnl_pct': float((self.equity / self.start_capital - 1) * 100), 'win_rate': self.wins / n * 100,
+                'max_drawdown_pct': float(self.max_drawdown * 100), 'num_trades': n,
+                'sharpe': float(mean / std) if std > 0 else 0.0, 'sortino': float(mean / downside) if downside > 0 else 0.0,
+                'profit_factor': float(self.gross_profit / self.gross_loss) if self.gross_loss > 0 else (None if self.gross_profit > 0 else 0.0),
+                'exposure_pct': float(bars_in_market / self.bars_simulated * 100) if self.bars_simulated else 0.0}
@@ -2,17 +2,19 @@
 import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2' 
 
-import sys, argparse, json, pandas as pd, optuna, logging, time
+import sys, argparse, json, hashlib, threading, numpy as np, pandas as pd, optuna, logging, time
 from collections import deque
 optuna.logging.set_verbosity(optuna.logging.WARNING)
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
 
-from lbot.utils.exchange import Exchange
-from lbot.utils.lstm_model import create_ann_features, create_sequences, load_model_and_scaler
-from lbot.utils.data_handler import get_market_data
-from lbot.analysis.backtester import Backtester
+from lbot.utils.lstm_model import create_ann_features, create_sequences
+from lbot.utils.model_registry import load_model_version
+from lbot.utils.data_handler import get_market_data, create_data_exchange, is_offline_mode, MissingDataError
+from lbot.analysis.backtester import Backtester, batch_predict, load_drilldown, signal_inputs, entry_mask
+from lbot.analysis.robustness import robustness_report, trade_returns
+from lbot.utils.profiling import span, add_profile_arguments, profile_run
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -37,72 +39,155 @@ class BenchmarkCallback:
         sys.stdout.write('\r' + message.ljust(100)); sys.stdout.flush()
         if (trial.number + 1)==self.n_trials: sys.stdout.write('\n'); sys.stdout.flush()
 
-DATA = None; MODEL = None; SCALER = None; SETTINGS = None; OPTIM_MODE = "strict" 
+DATA = None; MODEL = None; SCALER = None; PREDICTIONS = None; DRILLDOWN = None; SETTINGS = None; OPTIM_MODE = "strict" 
+# Suchräume der Signal-Parameter; run_study verengt sie pro Paar auf den überhaupt erreichbaren Bereich (feasible_bounds)
+DEFAULT_BOUNDS = {"entry_threshold_pct": (0.5, 3.0), "min_natr": (0.2, 1.5), "max_natr": (1.5, 8.0)}
+BOUNDS = dict(DEFAULT_BOUNDS); SIGNAL_INPUTS = None
+# Backtest-Ergebnisse nach (Hash der Einstiegsmaske, Risiko-Parameter): gleiche Maske + gleiches Risiko = gleicher Backtest
+BACKTEST_CACHE = {}; CACHE_LOCK = threading.Lock(); CACHE_STATS = {"hits": 0, "pruned": 0}
 
 def load_settings():
     with open(os.path.join(PROJECT_ROOT, 'settings.json'), 'r') as f: return json.load(f)
 
+def min_trades_for_mode():
+    return 20 if OPTIM_MODE == "strict" else 5
+
+def feasible_bounds(predictions, close, ema, natr, min_trades):
+    """
+    Verengt die Suchräume von Schwelle und NATR-Grenzen vor der Study auf den Bereich, in dem überhaupt
+    min_trades Einstiegskandidaten möglich sind (nur aus Vorhersage- und NATR-Verteilung, ohne Backtest).
+    Jede Grenze ist eine notwendige Bedingung: es wird nur verengt, nie ein erreichbarer Wert ausgeschlossen.
+    """
+    bounds = dict(DEFAULT_BOUNDS); filter_conf = SETTINGS.get('strategy_filters', {})
+    gains = np.asarray(predictions, dtype=np.float64) * 100; candidates = np.isfinite(gains)
+    if filter_conf.get('use_trend_filter', False) and ema is not None: candidates &= close > ema
+    top_gains = np.sort(gains[candidates])
+    if len(top_gains) < min_trades: return bounds  # aussichtslos; die Trials brechen über die Maske ohne Backtest ab
+    low, high = bounds["entry_threshold_pct"]; bounds["entry_threshold_pct"] = (low, max(low, min(high, top_gains[-min_trades])))
+    if filter_conf.get('use_volatility_filter', False) and natr is not None:
+        natr_values = np.sort(natr[candidates & (gains >= low)]); natr_values = natr_values[np.isfinite(natr_values)]
+        if len(natr_values) >= min_trades:
+            low, high = bounds["min_natr"]; bounds["min_natr"] = (low, max(low, min(high, float(natr_values[-min_trades]))))
+            low, high = bounds["max_natr"]; bounds["max_natr"] = (min(high, max(low, float(natr_values[min_trades - 1]))), high)
+    return {name: (float(low), float(high)) for name, (low, high) in bounds.items()}
+
 def objective(trial):
     try:
         params = {
             "strategy": {
-                "entry_threshold_pct": trial.suggest_float("entry_threshold_pct", 0.5, 3.0),
-                "min_natr": trial.suggest_float("min_natr", 0.2, 1.5),
-                "max_natr": trial.suggest_float("max_natr", 1.5, 8.0)
+                "entry_threshold_pct": trial.suggest_float("entry_threshold_pct", *BOUNDS["entry_threshold_pct"]),
+                "min_natr": trial.suggest_float("min_natr", *BOUNDS["min_natr"]),
+                "max_natr": trial.suggest_float("max_natr", *BOUNDS["max_natr"])
             },
-            "risk": { "risk_per_trade_pct": trial.suggest_float("risk_per_trade_pct", 0.5, 3.0), "risk_reward_ratio": trial.suggest_float("risk_reward_ratio", 1.5, 5.0), "leverage": trial.suggest_int("leverage", 1, 10)},
+            # Risiko-Parameter im 0.1er-Raster, damit sich (Maske, Risiko)-Kombinationen wiederholen und aus dem Cache kommen
+            "risk": { "risk_per_trade_pct": trial.suggest_float("risk_per_trade_pct", 0.5, 3.0, step=0.1), "risk_reward_ratio": trial.suggest_float("risk_reward_ratio", 1.5, 5.0, step=0.1), "leverage": trial.suggest_int("leverage", 1, 10)},
             "behavior": { "use_longs": True, "use_shorts": False }
         }
         if params["strategy"]["max_natr"] <= params["strategy"]["min_natr"]: return -999.0
-        opti_settings = SETTINGS.get('optimization_settings', {}); backtester = Backtester(data=DATA.copy(), model=MODEL, scaler=SCALER, params=params, settings=SETTINGS, start_capital=opti_settings.get('start_capital', 1000)); metrics = backtester.run()
+        signals = entry_mask(PREDICTIONS, *SIGNAL_INPUTS, params, SETTINGS.get('strategy_filters', {}))
+        # Mehr Trades als Einstiegskandidaten sind nicht möglich: solche Trials brauchen keinen Backtest
+        if np.count_nonzero(signals[SETTINGS.get('model_settings', {}).get('sequence_length', 24):]) < min_trades_for_mode():
+            with CACHE_LOCK: CACHE_STATS["pruned"] += 1
+            return -999.0
+        risk = params["risk"]; cache_key = (hashlib.blake2b(np.packbits(signals).tobytes(), digest_size=16).hexdigest(), risk["risk_per_trade_pct"], risk["risk_reward_ratio"], risk["leverage"])
+        with CACHE_LOCK: cached = BACKTEST_CACHE.get(cache_key)
+        opti_settings = SETTINGS.get('optimization_settings', {})
+        if cached is None:
+            backtester = Backtester(data=DATA, model=MODEL, scaler=SCALER, params=params, settings=SETTINGS, start_capital=opti_settings.get('start_capital', 1000), predictions=PREDICTIONS, drilldown=DRILLDOWN, signals=signals)
+            with span('backtest'): metrics = backtester.run()
+            cached = (metrics, backtester.equity_curve)
+            with CACHE_LOCK: BACKTEST_CACHE[cache_key] = cached
+        else:
+            with CACHE_LOCK: CACHE_STATS["hits"] += 1
+        metrics, equity_curve = cached
         if OPTIM_MODE == "strict":
-            constraints = opti_settings.get('constraints', {}); min_trades = 20
+            constraints = opti_settings.get('constraints', {}); min_trades = min_trades_for_mode()
             if (metrics['max_drawdown_pct'] > constraints.get('max_drawdown_pct', 99) or metrics['win_rate'] < constraints.get('min_win_rate_pct', 0) or metrics['total_pnl_pct'] < constraints.get('min_pnl_pct', -100) or metrics['num_trades'] < min_trades): return -999.0
         else:
             if metrics['max_drawdown_pct'] > 80 or metrics['num_trades'] < 5: return -999.0
         pnl = metrics['total_pnl_pct']; drawdown = metrics['max_drawdown_pct']; win_rate = metrics.get('win_rate', 0); num_trades = metrics.get('num_trades', 0)
+        robust_conf = SETTINGS.get('robustness_settings', {})
+        if robust_conf.get('use_as_objective', False):
+            # Pessimistische Perzentile statt des einen beobachteten Pfads: eine glückliche Trade-Reihenfolge zählt nicht
+            with span('robustness'): report = robustness_report(trade_returns(equity_curve), robust_conf.get('objective_paths', 1000))
+            if report is None: return -999.0
+            pnl = report['pnl_p5']; drawdown = max(report['drawdown_p95'], report['perm_drawdown_p95'])
         trade_penalty = 1.0 if num_trades > 50 else num_trades / 50.0
         if drawdown > 0: score = (pnl * (win_rate / 100)) / drawdown * trade_penalty
         else: score = pnl * (win_rate / 100) * trade_penalty
         return score if not pd.isna(score) else -999.0
     except Exception: return -999.0
 
-def run_optimization_for_pair(symbol, timeframe, start_date, trials, jobs):
-    global DATA, MODEL, SCALER
-    logging.info(f"Starte Optimierungsprozess für {symbol} ({timeframe})..."); dummy_account = {'apiKey': 'dummy', 'secret': 'dummy'}; exchange = Exchange(dummy_account)
-    raw_data = get_market_data(exchange, symbol, timeframe, start_date)
+def run_optimization_for_pair(symbol, timeframe, start_date, trials, jobs, offline=False):
+    logging.info(f"Starte Optimierungsprozess für {symbol} ({timeframe})..."); exchange = create_data_exchange(offline)
+    try:
+        with span('data'): raw_data = get_market_data(exchange, symbol, timeframe, start_date)
+    except MissingDataError as e: logging.error(f"{e} Überspringe."); return None
     if raw_data.empty or len(raw_data) < 400: logging.warning(f"Nicht genug Rohdaten für {symbol}. Überspringe."); return None
-    DATA = create_ann_features(raw_data)
-    safe_filename = f"{symbol.replace('/', '').replace(':', '')}_{timeframe}"; model_path = os.path.join(PROJECT_ROOT, 'artifacts', 'models', f'ann_predictor_{safe_filename}.h5'); scaler_path = os.path.join(PROJECT_ROOT, 'artifacts', 'models', f'ann_scaler_{safe_filename}.joblib')
-    MODEL, SCALER = load_model_and_scaler(model_path, scaler_path)
-    if MODEL is None or SCALER is None: logging.error(f"Modell/Scaler für {symbol} nicht gefunden. Überspringe."); return None
+    with span('features'): data = create_ann_features(raw_data)
+    with span('model_load'): model, scaler, model_version, _, _ = load_model_version(symbol, timeframe)
+    if model is None or scaler is None: logging.error(f"Modell/Scaler für {symbol} nicht gefunden. Überspringe."); return None
+    with span('predict'): predictions = batch_predict(data, model, scaler, SETTINGS.get('model_settings', {}).get('sequence_length', 24))
+    with span('drilldown'): drilldown = load_drilldown(symbol, timeframe, data, SETTINGS)
+    return optimize_pair(symbol, timeframe, data, model, scaler, predictions, trials, jobs, model_version, drilldown)
+
+def run_study(data, model, scaler, predictions, trials, jobs, drilldown=None):
+    """ Optuna-Suche auf bereits geladenen Features/Modell; Vorhersagen und Drilldown-Index werden nur einmal berechnet und von allen Trials geteilt. Gibt die Study zurück. """
+    global DATA, MODEL, SCALER, PREDICTIONS, DRILLDOWN, SIGNAL_INPUTS, BOUNDS
+    DATA, MODEL, SCALER, PREDICTIONS, DRILLDOWN = data, model, scaler, predictions, drilldown
+    SIGNAL_INPUTS = signal_inputs(data); BOUNDS = feasible_bounds(predictions, *SIGNAL_INPUTS, min_trades_for_mode())
+    BACKTEST_CACHE.clear(); CACHE_STATS.update(hits=0, pruned=0)
+    if BOUNDS != DEFAULT_BOUNDS: logging.info("Erreichbare Suchräume: " + ", ".join(f"{name} {low:.2f}-{high:.2f}" for name, (low, high) in BOUNDS.items()))
     study = optuna.create_study(direction="maximize"); study.set_user_attr('start_time', time.time()); benchmark_callback = BenchmarkCallback(n_trials=trials, n_jobs=jobs)
-    study.optimize(objective, n_trials=trials, n_jobs=jobs, callbacks=[benchmark_callback], catch=(Exception,))
-    if not study.best_trial or study.best_value <= 0: logging.warning(f"Optuna fand keine profitable Lösung für {symbol} ({timeframe})."); return None
-    best_params_dict = study.best_trial.params; best_score = study.best_trial.value; logging.info(f"Beste Parameter für {symbol} ({timeframe}) gefunden. Score: {best_score:.2f}")
-    final_config = {
+    with span('study'): study.optimize(objective, n_trials=trials, n_jobs=jobs, callbacks=[benchmark_callback], catch=(Exception,))
+    logging.info(f"Trials ohne Backtest: {CACHE_STATS['hits']} aus dem Cache, {CACHE_STATS['pruned']} mit zu wenigen Einstiegskandidaten.")
+    return study
+
+def build_config(symbol, timeframe, best_params_dict, model_version=None):
+    config = {
         "market": {"symbol": symbol, "timeframe": timeframe},
         "strategy": {"entry_threshold_pct": best_params_dict['entry_threshold_pct'], "min_natr": best_params_dict['min_natr'], "max_natr": best_params_dict['max_natr']},
         "risk": { "risk_per_trade_pct": best_params_dict['risk_per_trade_pct'], "risk_reward_ratio": best_params_dict['risk_reward_ratio'], "leverage": best_params_dict['leverage']}, "behavior": {"use_longs": True, "use_shorts": False}
     }
+    # Modell-Version aus der Registry, auf der die Parameter optimiert wurden (None = alte Ablage ohne Version)
+    if model_version: config["model"] = {"version": model_version}
+    return config
+
+def optimize_pair(symbol, timeframe, data, model, scaler, predictions, trials, jobs, model_version=None, drilldown=None):
+    """ drilldown: vom Aufrufer geladener IntrabarDrilldown (Stores werden nur im Hauptprozess gelesen, siehe load_drilldown). """
+    study = run_study(data, model, scaler, predictions, trials, jobs, drilldown)
+    if not study.best_trial or study.best_value <= 0: logging.warning(f"Optuna fand keine profitable Lösung für {symbol} ({timeframe})."); return None
+    best_params_dict = study.best_trial.params; best_score = study.best_trial.value; logging.info(f"Beste Parameter für {symbol} ({timeframe}) gefunden. Score: {best_score:.2f}")
+    final_config = build_config(symbol, timeframe, best_params_dict, model_version)
+    save_config(final_config)
+    opti_settings = SETTINGS.get('optimization_settings', {}); final_backtester = Backtester(data=DATA, model=MODEL, scaler=SCALER, params=final_config, settings=SETTINGS, start_capital=opti_settings.get('start_capital', 1000), predictions=PREDICTIONS, drilldown=DRILLDOWN)
+    with span('final_backtest'): final_metrics = final_backtester.run()
+    with span('robustness'): robustness = robustness_report(trade_returns(final_backtester.equity_curve), SETTINGS.get('robustness_settings', {}).get('num_paths', 10000))
+    # Der Trade-Stream wird für die Portfolio-Simulation im result_selector mitgespeichert
+    return {"symbol": symbol, "timeframe": timeframe, "model_version": model_version, "score": best_score, "params": final_config, "metrics": final_metrics, "robustness": robustness, "trades": final_backtester.trade_stream()}
+
+def save_config(final_config):
+    symbol, timeframe = final_config['market']['symbol'], final_config['market']['timeframe']; safe_filename = f"{symbol.replace('/', '').replace(':', '')}_{timeframe}"
     config_dir = os.path.join(PROJECT_ROOT, 'src', 'lbot', 'strategy', 'configs'); os.makedirs(config_dir, exist_ok=True); config_path = os.path.join(config_dir, f'config_{safe_filename}.json')
     with open(config_path, 'w') as f: json.dump(final_config, f, indent=4)
     logging.info(f"Beste Konfiguration gespeichert in: {config_path}")
-    opti_settings = SETTINGS.get('optimization_settings', {}); final_backtester = Backtester(data=DATA.copy(), model=MODEL, scaler=SCALER, params=final_config, settings=SETTINGS, start_capital=opti_settings.get('start_capital', 1000)); final_metrics = final_backtester.run()
-    return {"symbol": symbol, "timeframe": timeframe, "score": best_score, "params": final_config, "metrics": final_metrics}
 
 def main():
     global SETTINGS, OPTIM_MODE
     SETTINGS = load_settings(); parser = argparse.ArgumentParser(description="L-Bot Parameter Optimizer"); parser.add_argument('--mode', type=str, default='strict'); parser.add_argument('--symbols', required=True, type=str); parser.add_argument('--timeframes', required=True, type=str)
-    parser.add_argument('--start_date', required=True, type=str); parser.add_argument('--trials', type=int, default=100); parser.add_argument('--jobs', type=int, default=-1); args = parser.parse_args()
-    OPTIM_MODE = args.mode; symbols = [s.upper() + "/USDT:USDT" for s in args.symbols.split()]; timeframes = args.timeframes.split()
+    parser.add_argument('--start_date', required=True, type=str); parser.add_argument('--trials', type=int, default=100); parser.add_argument('--jobs', type=int, default=-1); parser.add_argument('--offline', action='store_true'); add_profile_arguments(parser); args = parser.parse_args()
+    OPTIM_MODE = args.mode; offline = is_offline_mode(SETTINGS, args.offline); symbols = [s.upper() + "/USDT:USDT" for s in args.symbols.split()]; timeframes = args.timeframes.split()
     total_jobs = len(symbols) * len(timeframes); job_count = 0; all_results = []
-    for symbol in symbols:
-        for timeframe in timeframes:
-            job_count += 1
-            logging.info(f"--- Paket {job_count}/{total_jobs}: Start für {symbol} ({timeframe}) im '{OPTIM_MODE}'-Modus ---")
-            result = run_optimization_for_pair(symbol, timeframe, args.start_date, int(args.trials), int(args.jobs))
-            if result: all_results.append(result)
+    with profile_run('optimizer', args.profile, args.profile_dir):
+        for symbol in symbols:
+            for timeframe in timeframes:
+                job_count += 1
+                logging.info(f"--- Paket {job_count}/{total_jobs}: Start für {symbol} ({timeframe}) im '{OPTIM_MODE}'-Modus ---")
+                result = run_optimization_for_pair(symbol, timeframe, args.start_date, int(args.trials), int(args.jobs), offline)
+                if result: all_results.append(result)
+    save_results(all_results)
+
+def save_results(all_results):
     if all_results:
         results_path = os.path.join(PROJECT_ROOT, 'artifacts', 'optimization_results.json'); os.makedirs(os.path.dirname(results_path), exist_ok=True)
         with open(results_path, 'w') as f: json.dump(all_results, f, indent=4)
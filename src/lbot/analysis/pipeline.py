@@ -0,0 +1,255 @@
+# src/lbot/analysis/pipeline.py
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from lbot.utils.data_handler import get_market_data, create_data_exchange, is_offline_mode, MissingDataError
+from lbot.utils.artifact_cache import ArtifactCache, fingerprint, code_fingerprint, frame_fingerprint, array_fingerprint
+from lbot.utils.model_registry import ModelRegistry, content_version
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+STAGES = ['download', 'features', 'train', 'predict', 'optimize', 'report']
+MIN_CANDLES = 400
+
+
+class SkipPair(Exception):
+    """ Das Paar kann (z.B. mangels Daten) nicht weiter verarbeitet werden. """
+    pass
+
+
+def load_settings():
+    with open(os.path.join(PROJECT_ROOT, 'settings.json'), 'r') as f:
+        return json.load(f)
+
+
+class Stage:
+    def __init__(self, name, deps, compute, key_parts=lambda: [], save=None, load=None):
+        self.name = name
+        self.deps = deps
+        self.compute = compute
+        self.key_parts = key_parts
+        self.save = save
+        self.load = load
+
+
+class PairPipeline:
+    """
+    DAG der Stufen für ein Symbol/Timeframe-Paar: download -> features -> train -> predict -> optimize.
+    Der Key jeder Stufe ergibt sich aus den Keys ihrer Eingaben, ihren Parametern und dem
+    Quelltext der Berechnung. Liegt ein Ergebnis unter diesem Key im Cache, wird die Stufe
+    übersprungen; Eingaben werden nur geladen, wenn eine abhängige Stufe wirklich rechnen muss.
+    """
+    def __init__(self, symbol, timeframe, raw_data, settings, options, cache, drilldown=None):
+        # Schwere Importe (TensorFlow) erst hier, damit der Hauptprozess sie nur bei Bedarf lädt
+        from lbot.utils.lstm_model import create_ann_features, create_sequences, create_lstm_model, load_model_and_scaler
+        from lbot.analysis import trainer, optimizer
+        from lbot.analysis.backtester import Backtester, batch_predict, entry_mask
+        from lbot.analysis import robustness
+
+        self.symbol, self.timeframe = symbol, timeframe
+        self.settings, self.options, self.cache = settings, options, cache
+        self.registry = ModelRegistry()
+        self.values, self.keys, self.status, self.timings = {'download': raw_data}, {}, {}, {}
+        self.keys['download'] = frame_fingerprint(raw_data)
+        self.status['download'] = 'geladen'
+        # Sub-Kerzen für die SL/TP-Auflösung: im Hauptprozess geladen (siehe run_pipeline), hier nur gelesen
+        drilldown_key = array_fingerprint(drilldown.timestamps, drilldown.high, drilldown.low) if drilldown is not None else None
+        model_conf = settings.get('model_settings', {})
+        sequence_length = model_conf.get('sequence_length', 24)
+        optimizer.SETTINGS, optimizer.OPTIM_MODE = settings, options['mode']
+
+        def train(features):
+            model, scaler = trainer.train_model(features, settings)
+            if model is None:
+                raise SkipPair("Nicht genug Daten für Sequenzen.")
+            return model, scaler
+
+        def save_model(key, value):
+            model, scaler = value
+            self.cache.save_dir('train', key, lambda d: trainer.save_model(model, scaler, os.path.join(d, 'model.h5'), os.path.join(d, 'scaler.joblib')))
+
+        def load_model(key):
+            model_dir = self.cache.path('train', key, suffix='')
+            return load_model_and_scaler(os.path.join(model_dir, 'model.h5'), os.path.join(model_dir, 'scaler.joblib'))
+
+        def optimize(features, model_and_scaler, predictions):
+            model, scaler = model_and_scaler
+            # Die Konfiguration merkt sich die Modell-Version, unter der publish() das Modell registriert
+            model_version = content_version(*self.trained_model_files())
+            return optimizer.optimize_pair(symbol, timeframe, features, model, scaler, predictions, options['trials'], options['jobs'], model_version, drilldown)
+
+        self.stages = {
+            'features': Stage('features', ['download'], create_ann_features,
+                              key_parts=lambda: [code_fingerprint(create_ann_features)]),
+            'train': Stage('train', ['features'], train, save=save_model, load=load_model,
+                           key_parts=lambda: [model_conf, code_fingerprint(trainer.train_model, create_sequences, create_lstm_model)]),
+            'predict': Stage('predict', ['features', 'train'], lambda f, ms: batch_predict(f, ms[0], ms[1], sequence_length),
+                             key_parts=lambda: [sequence_length, code_fingerprint(batch_predict)]),
+            'optimize': Stage('optimize', ['features', 'train', 'predict'], optimize,
+                              key_parts=lambda: [options['trials'], options['mode'], settings.get('optimization_settings', {}),
+                                                 settings.get('backtest_settings', {}), settings.get('strategy_filters', {}),
+                                                 settings.get('robustness_settings', {}), drilldown_key,
+                                                 code_fingerprint(optimizer.objective, optimizer.feasible_bounds, optimizer.run_study, optimizer.optimize_pair, Backtester, entry_mask, robustness)]),
+        }
+
+    def trained_model_files(self):
+        model_dir = self.cache.path('train', self.key('train'), suffix='')
+        return os.path.join(model_dir, 'model.h5'), os.path.join(model_dir, 'scaler.joblib')
+
+    def key(self, name):
+        if name not in self.keys:
+            stage = self.stages[name]
+            self.keys[name] = fingerprint(name, self.symbol, self.timeframe, [self.key(dep) for dep in stage.deps], stage.key_parts())
+        return self.keys[name]
+
+    def get(self, name):
+        if name in self.values:
+            return self.values[name]
+        stage, key = self.stages[name], self.key(name)
+        start = time.perf_counter()
+        if name not in self.options['force'] and self.cache.has(name, key):
+            value = stage.load(key) if stage.load else self.cache.load(name, key)
+            self.status[name] = 'Cache'
+        else:
+            inputs = [self.get(dep) for dep in stage.deps]
+            start = time.perf_counter()
+            logging.info(f"[{self.symbol} {self.timeframe}] Stufe '{name}' wird berechnet...")
+            value = stage.compute(*inputs)
+            if stage.save:
+                stage.save(key, value)
+            else:
+                self.cache.save(name, key, value)
+            self.status[name] = 'berechnet'
+        self.timings[name] = time.perf_counter() - start
+        self.values[name] = value
+        return value
+
+    def publish(self):
+        """ Registriert Modell/Scaler als aktuelle Version und legt die beste Konfiguration dort ab, wo der Live-Handel sie erwartet. """
+        from lbot.analysis import optimizer
+        result = self.values.get('optimize')
+        if 'train' in self.keys and self.cache.has('train', self.keys['train']):
+            raw_data = self.values['download']
+            metadata = {'train_start': str(raw_data.index[0]), 'train_end': str(raw_data.index[-1]), 'rows': len(raw_data),
+                        'settings_hash': fingerprint(self.settings.get('model_settings', {})), 'pipeline_key': self.keys['train'],
+                        'metrics': result['metrics'] if result else {}}
+            version = self.registry.register(self.symbol, self.timeframe, *self.trained_model_files(), metadata)
+            if self.registry.current(self.symbol, self.timeframe) != version:
+                self.registry.promote(self.symbol, self.timeframe, version)
+                logging.info(f"[{self.symbol} {self.timeframe}] Modell-Version {version} aktiviert.")
+        # Frisch optimierte Konfigurationen hat optimize_pair bereits gespeichert
+        if result and self.status.get('optimize') == 'Cache':
+            optimizer.save_config(result['params'])
+
+    def run(self, target):
+        targets = [s for s in STAGES if s in self.stages]
+        for name in targets[:targets.index(target) + 1]:
+            # Nur der Schlüssel wird sofort bestimmt; geladen wird erst, wenn die Zielstufe es braucht
+            self.key(name)
+        self.get(target)
+        self.publish()
+        return self.values.get('optimize')
+
+
+def _run_pair(job):
+    symbol, timeframe, raw_data, settings, options, drilldown = job
+    pipeline = PairPipeline(symbol, timeframe, raw_data, settings, options, ArtifactCache(options['cache_dir']), drilldown)
+    try:
+        result = pipeline.run(options['until'])
+        error = None
+    except SkipPair as e:
+        result, error = None, str(e)
+    return {'symbol': symbol, 'timeframe': timeframe, 'result': result, 'error': error,
+            'status': pipeline.status, 'timings': pipeline.timings}
+
+
+def load_pair_data(symbol, timeframe, start_date, exchange):
+    """ Stufe 'download': ergänzt den lokalen Store inkrementell und liefert die Rohdaten. """
+    try:
+        data = get_market_data(exchange, symbol, timeframe, start_date)
+    except MissingDataError as e:
+        raise SkipPair(str(e))
+    if data.empty or len(data) < MIN_CANDLES:
+        raise SkipPair(f"Nicht genug Rohdaten ({len(data)} Kerzen).")
+    return data
+
+
+def run_pipeline(symbols, timeframes, start_date, settings, options):
+    # Downloads laufen nacheinander im Hauptprozess: so schreibt nie mehr als ein Prozess in denselben Store.
+    # Auch die Sub-Kerzen für den Drilldown werden hier gelesen, die Worker greifen auf keinen Store zu.
+    from lbot.analysis.backtester import load_drilldown
+    exchange = create_data_exchange(options['offline'])
+    jobs = []
+    for symbol in symbols:
+        for timeframe in timeframes:
+            logging.info(f"--- Stufe 'download' für {symbol} ({timeframe}) ---")
+            try:
+                raw_data = load_pair_data(symbol, timeframe, start_date, exchange)
+            except SkipPair as e:
+                logging.warning(f"{symbol} ({timeframe}): {e} Überspringe.")
+                continue
+            drilldown = load_drilldown(symbol, timeframe, raw_data, settings) if options['until'] == 'optimize' else None
+            jobs.append((symbol, timeframe, raw_data, settings, options, drilldown))
+    if options['until'] == 'download' or not jobs:
+        return []
+
+    workers = max(1, min(options['workers'], len(jobs)))
+    if workers == 1:
+        summaries = [_run_pair(job) for job in jobs]
+    else:
+        # spawn: TensorFlow verträgt kein fork nach der Initialisierung
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            summaries = list(pool.map(_run_pair, jobs))
+
+    for summary in summaries:
+        stages = ", ".join(f"{name}={status} ({summary['timings'].get(name, 0):.1f}s)" for name, status in summary['status'].items())
+        suffix = f" -> übersprungen: {summary['error']}" if summary['error'] else ""
+        logging.info(f"{summary['symbol']} ({summary['timeframe']}): {stages}{suffix}")
+    return [s['result'] for s in summaries if s['result']]
+
+
+def main():
+    settings = load_settings()
+    parser = argparse.ArgumentParser(description="L-Bot Pipeline (Download, Features, Training, Vorhersage, Optimierung, Report)")
+    parser.add_argument('--symbols', required=True, type=str)
+    parser.add_argument('--timeframes', required=True, type=str)
+    parser.add_argument('--start_date', required=True, type=str)
+    parser.add_argument('--trials', type=int, default=100)
+    parser.add_argument('--jobs', type=int, default=-1, help="CPU-Kerne für Optuna (-1 = alle, werden auf die Paare aufgeteilt)")
+    parser.add_argument('--mode', type=str, default='strict')
+    parser.add_argument('--workers', type=int, default=None, help="Parallel verarbeitete Paare (Standard: alle Kerne)")
+    parser.add_argument('--until', type=str, default='report', choices=STAGES, help="Letzte auszuführende Stufe")
+    parser.add_argument('--force', type=str, default='', help="Stufen, die trotz Cache neu berechnet werden (z.B. 'train optimize')")
+    parser.add_argument('--offline', action='store_true')
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    symbols = [s.upper() + "/USDT:USDT" for s in args.symbols.split()]
+    timeframes = args.timeframes.split()
+    workers = args.workers or min(cpu_count, len(symbols) * len(timeframes))
+    total_jobs = cpu_count if args.jobs == -1 else args.jobs
+    options = {
+        'trials': args.trials, 'mode': args.mode, 'offline': is_offline_mode(settings, args.offline),
+        'workers': workers, 'jobs': max(1, total_jobs // workers),
+        'until': 'optimize' if args.until == 'report' else args.until,
+        'force': set(args.force.split()), 'cache_dir': os.path.join(PROJECT_ROOT, 'artifacts', 'cache', 'pipeline'),
+    }
+    results = run_pipeline(symbols, timeframes, args.start_date, settings, options)
+    if args.until == 'report':
+        from lbot.analysis.optimizer import save_results
+        save_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# src/lbot/analysis/portfolio.py
+import numpy as np
+import pandas as pd
+
+DEFAULT_GRID = '1h'
+DEFAULT_ALLOCATION_PCT = 50.0
+DEFAULT_MAX_EXPOSURE_PCT = 100.0
+
+
+class PortfolioSimulator:
+    """
+    Simuliert viele Strategien gemeinsam auf einem geteilten Konto, vollständig als Array-Operationen.
+
+    Alle Trade-Streams werden auf ein gemeinsames Zeitraster gelegt:
+      open_count[t, i]  = 1, solange Strategie i in Kerze t eine Position hält
+      Trade k bucht seine Rendite (netto, auf das eingesetzte Kapital) bei seinem Ausstieg.
+    Eine Auswahl ist eine Gewichtsspalte w (Anteil des Kontos pro Strategie). Viele Auswahlen
+    werden als Matrix W (Strategien x Kombinationen) in einem Durchgang simuliert. Übersteigt das
+    Gesamt-Exposure beim Einstieg eines Trades max_exposure, wird der Trade anteilig verkleinert.
+    """
+    def __init__(self, streams, grid=DEFAULT_GRID):
+        """ streams: {Name: {'entry': [ms], 'exit': [ms], 'return': [float]}} (siehe Backtester.trade_stream). """
+        self.names = [name for name, s in streams.items() if s and len(s.get('return', []))]
+        if not self.names:
+            raise ValueError("Keine Trade-Streams mit abgeschlossenen Trades vorhanden.")
+        step_ms = int(pd.Timedelta(grid).total_seconds() * 1000)
+
+        entry = np.concatenate([np.asarray(streams[n]['entry'], dtype=np.int64) for n in self.names])
+        exit_ = np.concatenate([np.asarray(streams[n]['exit'], dtype=np.int64) for n in self.names])
+        self.trade_returns = np.concatenate([np.asarray(streams[n]['return'], dtype=float) for n in self.names])
+        self.trade_strategy = np.concatenate([np.full(len(streams[n]['return']), i) for i, n in enumerate(self.names)])
+
+        origin = entry.min() // step_ms * step_ms
+        self.entry_idx = ((entry - origin) // step_ms).astype(np.int64)
+        # Ausstieg frühestens eine Rasterzelle nach dem Einstieg (sonst wäre die Position nie offen)
+        self.exit_idx = np.maximum((exit_ - origin) // step_ms, self.entry_idx + 1).astype(np.int64)
+        self.num_bars = int(self.exit_idx.max()) + 1
+        self.index = pd.to_datetime(origin + np.arange(self.num_bars) * step_ms, unit='ms', utc=True)
+
+        n = len(self.names)
+        changes = np.zeros((self.num_bars + 1, n), dtype=np.int32)
+        np.add.at(changes, (self.entry_idx, self.trade_strategy), 1)
+        np.add.at(changes, (self.exit_idx, self.trade_strategy), -1)
+        self.open_count = np.cumsum(changes[:-1], axis=0).clip(0, 1).astype(np.float32)
+
+        # Realisierte Rendite pro Strategie und Kerze (für Korrelationen der Strategien untereinander)
+        self.bar_returns = np.zeros((self.num_bars, n), dtype=np.float32)
+        np.add.at(self.bar_returns, (self.exit_idx, self.trade_strategy), self.trade_returns)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.corrcoef(self.bar_returns.T)
+        self.correlation = np.nan_to_num(np.atleast_2d(corr), nan=0.0)
+
+    @classmethod
+    def from_results(cls, results, grid=DEFAULT_GRID):
+        """ Baut den Simulator aus den Einträgen von optimization_results.json (nur Einträge mit Trade-Stream). """
+        streams = {f"{r['symbol']} ({r['timeframe']})": r['trades'] for r in results if r.get('trades')}
+        return cls(streams, grid)
+
+    def weights(self, selections, allocation_pct=DEFAULT_ALLOCATION_PCT):
+        """ Liste von Namens-Listen -> Gewichtsmatrix (Strategien x Kombinationen). """
+        positions = {name: i for i, name in enumerate(self.names)}
+        W = np.zeros((len(self.names), len(selections)), dtype=np.float32)
+        for column, selection in enumerate(selections):
+            for name in selection:
+                W[positions[name], column] = allocation_pct / 100
+        return W
+
+    def simulate(self, W, max_exposure_pct=DEFAULT_MAX_EXPOSURE_PCT, start_capital=1000.0):
+        """ Simuliert alle Spalten von W gleichzeitig. Gibt (Equity-Matrix, Metriken-DataFrame) zurück. """
+        W = np.asarray(W, dtype=np.float32)
+        if W.ndim == 1:
+            W = W[:, None]
+        exposure = self.open_count @ W                                     # (Kerzen x Kombinationen)
+        max_exposure = max_exposure_pct / 100
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(exposure > max_exposure, max_exposure / exposure, 1.0)
+
+        trade_weights = W[self.trade_strategy]                              # (Trades x Kombinationen)
+        contributions = trade_weights * scale[self.entry_idx] * self.trade_returns[:, None]
+        portfolio_returns = np.zeros((self.num_bars, W.shape[1]), dtype=np.float64)
+        np.add.at(portfolio_returns, self.exit_idx, contributions)
+
+        equity = start_capital * np.cumprod(1 + portfolio_returns, axis=0)
+        peak = np.maximum.accumulate(np.vstack([np.full((1, W.shape[1]), start_capital), equity]), axis=0)[1:]
+        drawdown = 1 - equity / peak
+
+        selected = W > 0
+        counts = selected.sum(axis=0)
+        # Mittlere paarweise Korrelation der ausgewählten Strategien (Diagonale abgezogen)
+        pair_sum = np.einsum('ic,ij,jc->c', selected.astype(float), self.correlation, selected.astype(float)) - counts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_correlation = np.where(counts > 1, pair_sum / (counts * (counts - 1)), 0.0)
+
+        total_pnl_pct = (equity[-1] / start_capital - 1) * 100
+        max_drawdown_pct = drawdown.max(axis=0) * 100
+        metrics = pd.DataFrame({
+            'total_pnl_pct': total_pnl_pct,
+            'max_drawdown_pct': max_drawdown_pct,
+            'max_exposure_pct': exposure.max(axis=0) * 100,
+            'num_trades': (trade_weights > 0).sum(axis=0),
+            'num_strategies': counts,
+            'avg_correlation': avg_correlation,
+            'score': np.where(max_drawdown_pct > 0, total_pnl_pct / np.maximum(max_drawdown_pct, 1e-9), total_pnl_pct),
+        })
+        return equity, metrics
+
+    def greedy_select(self, max_strategies, candidates=None, allocation_pct=DEFAULT_ALLOCATION_PCT,
+                      max_exposure_pct=DEFAULT_MAX_EXPOSURE_PCT, start_capital=1000.0):
+        """
+        Vorwärtsauswahl: in jedem Schritt werden alle verbleibenden Kandidaten gleichzeitig (eine
+        Matrix-Simulation) zur bisherigen Auswahl hinzugefügt; übernommen wird der mit dem besten
+        Score (PnL / Max-Drawdown). Stoppt, wenn keine Ergänzung den Score mehr verbessert.
+        """
+        remaining = list(candidates if candidates is not None else self.names)
+        selection, best_score, history = [], -np.inf, []
+        while remaining and len(selection) < max_strategies:
+            W = self.weights([selection + [name] for name in remaining], allocation_pct)
+            _, metrics = self.simulate(W, max_exposure_pct, start_capital)
+            best = int(metrics['score'].values.argmax())
+            if metrics['score'].iloc[best] <= best_score:
+                break
+            best_score = metrics['score'].iloc[best]
+            selection.append(remaining.pop(best))
+            history.append(metrics.iloc[best].to_dict())
+        return selection, history
@@ -10,6 +10,65 @@ sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
 RESULTS_FILE = os.path.join(PROJECT_ROOT, 'artifacts', 'optimization_results.json')
 SETTINGS_FILE = os.path.join(PROJECT_ROOT, 'settings.json')
 
+from lbot.analysis.portfolio import PortfolioSimulator
+from lbot.analysis.robustness import robustness_report, passes_constraints
+
+def robustness_filter(strategies, settings):
+    """ Verwirft Strategien, deren Bootstrap-Perzentile die Grenzen aus robustness_settings verletzen. """
+    robust_conf = settings.get('robustness_settings', {})
+    if not robust_conf:
+        return strategies
+    print(f"Prüfe Robustheit (Bootstrap der Trade-Renditen): {robust_conf}")
+    kept, unchecked = [], 0
+    for strat in strategies:
+        report = strat.get('robustness')
+        if report is None and strat.get('trades'):
+            report = robustness_report(strat['trades']['return'], robust_conf.get('num_paths', 10000))
+            strat['robustness'] = report
+        if report is None:
+            unchecked += 1
+            kept.append(strat)
+        elif passes_constraints(report, robust_conf):
+            kept.append(strat)
+    if unchecked:
+        print(f"Hinweis: {unchecked} Strategie(n) ohne Trade-Stream konnten nicht auf Robustheit geprüft werden.")
+    return kept
+
+def suggest_portfolio(qualified_strategies, settings):
+    """
+    Simuliert die qualifizierten Strategien gemeinsam auf einem Konto und schlägt per
+    Vorwärtsauswahl eine Kombination vor. Gibt die Indizes in qualified_strategies zurück.
+    """
+    with_trades = [s for s in qualified_strategies if s.get('trades')]
+    if len(with_trades) < len(qualified_strategies):
+        print(f"Hinweis: {len(qualified_strategies) - len(with_trades)} Strategie(n) ohne Trade-Stream "
+              "(ältere Ergebnisse, Pipeline neu ausführen) werden ignoriert.")
+    if not with_trades:
+        print("Keine Strategie mit Trade-Stream vorhanden. Portfolio-Simulation nicht möglich.")
+        return []
+
+    portfolio_conf = settings.get('portfolio_settings', {})
+    allocation_pct = portfolio_conf.get('allocation_per_strategy_pct', 50)
+    max_exposure_pct = portfolio_conf.get('max_total_exposure_pct', 100)
+    max_strategies = settings['live_trading_settings'].get('top_n_strategies_to_trade', 3)
+    start_capital = settings['optimization_settings'].get('start_capital', 1000)
+    simulator = PortfolioSimulator.from_results(with_trades, portfolio_conf.get('grid', '1h'))
+
+    selection, _ = simulator.greedy_select(max_strategies, allocation_pct=allocation_pct,
+                                           max_exposure_pct=max_exposure_pct, start_capital=start_capital)
+    # Vergleich: die nach Einzel-Score besten Strategien, gemeinsam simuliert
+    standalone = simulator.names[:max_strategies]
+    W = simulator.weights([selection, standalone], allocation_pct)
+    _, metrics = simulator.simulate(W, max_exposure_pct, start_capital)
+    metrics.insert(0, 'Auswahl', ['Portfolio', f'Top {len(standalone)} Einzel-Score'])
+    print(f"\nPortfolio-Simulation (Anteil pro Strategie: {allocation_pct}%, max. Exposure: {max_exposure_pct}%):")
+    print(metrics.to_string(index=False))
+    print("Vorgeschlagen: " + ", ".join(selection))
+
+    names = [f"{s['symbol']} ({s['timeframe']})" for s in qualified_strategies]
+    return [names.index(name) for name in selection]
+
+
 def main():
     print("--- L-Bot Interaktiver Strategie-Aktivator ---")
 
@@ -36,6 +95,8 @@ def main():
             metrics['total_pnl_pct'] >= constraints.get('min_pnl_pct', 0)):
             qualified_strategies.append(result)
             
+    qualified_strategies = robustness_filter(qualified_strategies, settings)
+
     if not qualified_strategies:
         print("\nKeine Strategien haben die Kriterien erfüllt. Es gibt nichts zu aktivieren.")
         return
@@ -53,6 +114,8 @@ def main():
             "Max DD (%)": strat['metrics']['max_drawdown_pct'],
             "Win-Rate (%)": strat['metrics']['win_rate'],
             "Trades": strat['metrics']['num_trades'],
+            "PnL p5 (%)": (strat.get('robustness') or {}).get('pnl_p5'),
+            "DD p95 (%)": (strat.get('robustness') or {}).get('drawdown_p95'),
         })
         
     df = pd.DataFrame(display_data)
@@ -63,7 +126,7 @@ def main():
     # 4. Frage den Benutzer nach seiner Auswahl
     while True:
         try:
-            choice = input("\nBitte wähle die zu aktivierenden Strategien (z.B. '1 3 4'), 'a' für alle, oder 'q' zum Abbrechen: ").lower()
+            choice = input("\nBitte wähle die zu aktivierenden Strategien (z.B. '1 3 4'), 'a' für alle, 'p' für den Portfolio-Vorschlag, oder 'q' zum Abbrechen: ").lower()
             if choice == 'q':
                 print("Abgebrochen. Es wurden keine Änderungen vorgenommen.")
                 return
@@ -71,6 +134,12 @@ def main():
             selected_indices = []
             if choice == 'a':
                 selected_indices = list(range(len(qualified_strategies)))
+            elif choice == 'p':
+                selected_indices = suggest_portfolio(qualified_strategies, settings)
+                if not selected_indices:
+                    continue
+                if input("Vorschlag übernehmen? (j/n): ").lower() != 'j':
+                    continue
             else:
                 selected_indices = [int(i) - 1 for i in choice.split()]
 
@@ -0,0 +1,82 @@
+# src/lbot/analysis/robustness.py
+import numpy as np
+
+DEFAULT_PATHS = 10000
+DEFAULT_SEED = 42
+PERCENTILES = (5, 50, 95)
+# Obergrenze für Pfade x Trades pro Block, damit auch lange Trade-Listen nicht den Speicher sprengen
+MAX_BLOCK_CELLS = 4_000_000
+
+
+def trade_returns(equity_curve):
+    """ Rendite pro abgeschlossenem Trade aus der Equity-Kurve des Backtesters (ein Punkt pro Trade). """
+    equity = np.asarray(equity_curve, dtype=float)
+    if len(equity) < 2:
+        return np.empty(0)
+    return equity[1:] / equity[:-1] - 1
+
+
+def resample_paths(returns, n_paths, method='bootstrap', rng=None):
+    """
+    Erzeugt n_paths alternative Trade-Reihenfolgen als Matrix (Pfade x Trades).
+      bootstrap: Ziehen mit Zurücklegen (PnL und Drawdown variieren)
+      permute:   nur die Reihenfolge wird gemischt (End-PnL bleibt gleich, Drawdown variiert)
+    """
+    rng = rng or np.random.default_rng(DEFAULT_SEED)
+    returns = np.asarray(returns, dtype=float)
+    if method == 'bootstrap':
+        return returns[rng.integers(0, len(returns), size=(n_paths, len(returns)))]
+    if method == 'permute':
+        return rng.permuted(np.broadcast_to(returns, (n_paths, len(returns))), axis=1)
+    raise ValueError(f"Unbekannte Methode: {method}")
+
+
+def path_metrics(paths):
+    """ End-PnL und maximaler Drawdown (beide in %) für jede Zeile der Pfad-Matrix. """
+    growth = np.cumprod(1 + paths, axis=1)
+    peak = np.maximum.accumulate(np.maximum(growth, 1.0), axis=1)
+    max_drawdown = (1 - growth / peak).max(axis=1)
+    return (growth[:, -1] - 1) * 100, max_drawdown * 100
+
+
+def simulate(returns, n_paths=DEFAULT_PATHS, method='bootstrap', seed=DEFAULT_SEED):
+    """ Verteilung von End-PnL und Max-Drawdown über n_paths Pfade, blockweise berechnet. """
+    returns = np.asarray(returns, dtype=float)
+    rng = np.random.default_rng(seed)
+    block = max(1, MAX_BLOCK_CELLS // max(len(returns), 1))
+    pnl, drawdown = [], []
+    for start in range(0, n_paths, block):
+        block_pnl, block_drawdown = path_metrics(resample_paths(returns, min(block, n_paths - start), method, rng))
+        pnl.append(block_pnl)
+        drawdown.append(block_drawdown)
+    return np.concatenate(pnl), np.concatenate(drawdown)
+
+
+def robustness_report(returns, n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED):
+    """
+    Kennzahlen der Robustheit einer Trade-Liste:
+      pnl_pXX / drawdown_pXX   Perzentile aus dem Bootstrap
+      perm_drawdown_p95        95%-Drawdown allein durch eine ungünstigere Reihenfolge
+      prob_loss_pct            Anteil der Bootstrap-Pfade mit Verlust
+    Bei weniger als zwei Trades gibt es nichts zu resampeln; dann wird None zurückgegeben.
+    """
+    returns = np.asarray(returns, dtype=float)
+    if len(returns) < 2:
+        return None
+    pnl, drawdown = simulate(returns, n_paths, 'bootstrap', seed)
+    _, perm_drawdown = simulate(returns, n_paths, 'permute', seed)
+    report = {'paths': int(n_paths), 'num_trades': int(len(returns))}
+    for p, pnl_value, drawdown_value in zip(PERCENTILES, np.percentile(pnl, PERCENTILES), np.percentile(drawdown, PERCENTILES)):
+        report[f'pnl_p{p}'] = float(pnl_value)
+        report[f'drawdown_p{p}'] = float(drawdown_value)
+    report['perm_drawdown_p95'] = float(np.percentile(perm_drawdown, 95))
+    report['prob_loss_pct'] = float((pnl < 0).mean() * 100)
+    return report
+
+
+def passes_constraints(report, constraints):
+    """ Filter für den result_selector: pessimistische Perzentile gegen die Grenzen aus den Settings. """
+    if report is None:
+        return False
+    return (report['pnl_p5'] >= constraints.get('min_pnl_p5_pct', -100) and
+            max(report['drawdown_p95'], report['perm_drawdown_p95']) <= constraints.get('max_drawdown_p95_pct', 100))
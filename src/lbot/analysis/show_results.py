@@ -2,95 +2,219 @@
 import os
 import sys
 import json
+import argparse
+import multiprocessing
 import pandas as pd
-from datetime import date
+from datetime import date, datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
 
-from lbot.analysis.backtester import Backtester
-from lbot.utils.exchange import Exchange
-from lbot.utils.data_handler import get_market_data
-from lbot.utils.lstm_model import create_ann_features, load_model_and_scaler
+from lbot.utils.data_handler import get_market_data, create_data_exchange, is_offline_mode, MissingDataError
+from lbot.utils.artifact_cache import ArtifactCache, fingerprint, code_fingerprint, frame_fingerprint, file_fingerprint
+from lbot.utils.profiling import span, add_profile_arguments, profile_run
 
-def run_backtest_for_config(config, start_date, end_date, start_capital, settings):
-    """ Führt einen einzelnen Backtest für eine gegebene Konfiguration durch. """
-    symbol = config['market']['symbol']
-    timeframe = config['market']['timeframe']
-    
-    print(f"\nAnalysiere Ergebnisse für: {symbol} ({timeframe})...")
+CACHE_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'cache', 'pipeline')
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'results')
+
+def load_backtest_data(symbol, timeframe, start_date, end_date, settings, data_exchange):
+    """ Lädt das Backtest-Fenster einmal pro Symbol/Timeframe (im Hauptprozess, ein Schreiber pro Store). """
+    try:
+        with span('data'):
+            data_for_backtest = get_market_data(data_exchange, symbol, timeframe, start_date, end_date)
+    except MissingDataError as e:
+        print(f"{e} Überspringe.")
+        return None
 
-    dummy_exchange = Exchange({'apiKey': 'dummy', 'secret': 'dummy'})
-    
-    # Der data_handler wird jetzt mit dem Startdatum des Backtests aufgerufen
-    data_raw = get_market_data(dummy_exchange, symbol, timeframe, start_date)
-    
-    data_for_backtest = data_raw.loc[start_date:end_date]
-    
     sequence_length = settings.get('model_settings', {}).get('sequence_length', 24)
     if data_for_backtest.empty or len(data_for_backtest) < sequence_length:
         print(f"Konnte nicht genügend Daten für {symbol} im Zeitraum {start_date}-{end_date} laden. Überspringe.")
         return None
-
-    # KORRIGIERTER AUFRUF: Keine 'ema_period' mehr übergeben
-    data_with_features = create_ann_features(data_for_backtest)
-    
-    safe_filename = f"{symbol.replace('/', '').replace(':', '')}_{timeframe}"
-    model_path = os.path.join(PROJECT_ROOT, 'artifacts', 'models', f'ann_predictor_{safe_filename}.h5')
-    scaler_path = os.path.join(PROJECT_ROOT, 'artifacts', 'models', f'ann_scaler_{safe_filename}.joblib')
-    model, scaler = load_model_and_scaler(model_path, scaler_path)
-    if not model or not scaler:
+    return data_for_backtest
+
+def backtest_group(job):
+    """
+    Backtestet alle Konfigurationen, die sich Daten und Modell teilen (gleiches Symbol/Timeframe).
+    Features und Vorhersagen kommen aus dem inhaltsadressierten Cache; liegen die Vorhersagen
+    dort bereits, wird das Keras-Modell gar nicht erst geladen.
+    """
+    symbol, timeframe, data_for_backtest, configs, settings, start_capital, cache_dir, drilldown = job
+    from lbot.analysis.backtester import Backtester, batch_predict
+    from lbot.utils.lstm_model import create_ann_features
+    from lbot.utils.model_registry import ModelRegistry, load_model_version
+
+    resolved = ModelRegistry().resolve(symbol, timeframe)
+    if resolved is None:
         print(f"Modell/Scaler für {symbol} nicht gefunden. (Hast du die Pipeline für diese Strategie laufen lassen?)")
-        return None
+        return []
+    model_version, model_path, scaler_path = resolved
+
+    cache = ArtifactCache(cache_dir)
+    # Gleiche Key-Bildung wie die Pipeline-Stufe 'features', damit beide denselben Cache nutzen
+    features_key = fingerprint('features', symbol, timeframe, [frame_fingerprint(data_for_backtest)], [code_fingerprint(create_ann_features)])
+    with span('features'):
+        if cache.has('features', features_key):
+            data_with_features = cache.load('features', features_key)
+        else:
+            data_with_features = cache.save('features', features_key, create_ann_features(data_for_backtest))
 
-    backtester = Backtester(
-        data=data_with_features.copy(),
-        model=model,
-        scaler=scaler,
-        params=config,
-        settings=settings,
-        start_capital=start_capital
-    )
-    result = backtester.run()
-    
+    sequence_length = settings.get('model_settings', {}).get('sequence_length', 24)
+    predict_key = fingerprint('report_predict', symbol, timeframe, [features_key, file_fingerprint(model_path), file_fingerprint(scaler_path)],
+                              [sequence_length, code_fingerprint(batch_predict)])
+    model = scaler = None
+    if cache.has('report_predict', predict_key):
+        with span('predict'):
+            predictions = cache.load('report_predict', predict_key)
+    else:
+        with span('model_load'):
+            model, scaler, _, _, _ = load_model_version(symbol, timeframe, model_version)
+        if not model or not scaler:
+            print(f"Modell/Scaler für {symbol} konnte nicht geladen werden.")
+            return []
+        with span('predict'):
+            predictions = cache.save('report_predict', predict_key, batch_predict(data_with_features, model, scaler, sequence_length))
+
+    summaries = []
+    for config in configs:
+        backtester = Backtester(
+            data=data_with_features,
+            model=model,
+            scaler=scaler,
+            params=config,
+            settings=settings,
+            start_capital=start_capital,
+            predictions=predictions,
+            drilldown=drilldown
+        )
+        with span('backtest'):
+            result = backtester.run()
+        summaries.append(_summarize(config, result, start_capital, model_version))
+    return summaries
+
+def _summarize(config, result, start_capital, model_version=None):
+    symbol, timeframe = config['market']['symbol'], config['market']['timeframe']
     end_capital = start_capital * (1 + result['total_pnl_pct'] / 100)
-    
     return {
         "Strategie": f"{symbol} ({timeframe})",
-        "PnL (%)": result['total_pnl_pct'],
-        "Max DD (%)": result['max_drawdown_pct'],
-        "Win-Rate (%)": result['win_rate'],
-        "Trades": result['num_trades'],
-        "Endkapital": end_capital
+        "PnL (%)": float(result['total_pnl_pct']),
+        "Max DD (%)": float(result['max_drawdown_pct']),
+        "Win-Rate (%)": float(result['win_rate']),
+        "Trades": int(result['num_trades']),
+        # None = kein Verlusttrade (Profit-Faktor nicht definiert)
+        "Profit-Faktor": float(result['profit_factor']) if result.get('profit_factor') is not None else None,
+        "Sharpe (Trade)": float(result.get('sharpe', 0.0)),
+        "Im Markt (%)": float(result.get('exposure_pct', 0.0)),
+        "Endkapital": float(end_capital),
+        "Modell": model_version[:8] if model_version else "-"
+    }
+
+def run_backtest_for_config(config, start_date, end_date, start_capital, settings, offline=False):
+    """ Führt einen einzelnen Backtest für eine gegebene Konfiguration durch. """
+    symbol = config['market']['symbol']
+    timeframe = config['market']['timeframe']
+    print(f"\nAnalysiere Ergebnisse für: {symbol} ({timeframe})...")
+    data_for_backtest = load_backtest_data(symbol, timeframe, start_date, end_date, settings, create_data_exchange(offline))
+    if data_for_backtest is None:
+        return None
+    from lbot.analysis.backtester import load_drilldown
+    drilldown = load_drilldown(symbol, timeframe, data_for_backtest, settings)
+    summaries = backtest_group((symbol, timeframe, data_for_backtest, [config], settings, start_capital, CACHE_DIR, drilldown))
+    return summaries[0] if summaries else None
+
+def run_batch_report(configs, start_date, end_date, start_capital, settings, offline=False, workers=None):
+    """ Gruppiert die Konfigurationen nach Symbol/Timeframe und backtestet die Gruppen parallel. """
+    groups = {}
+    for config in configs:
+        groups.setdefault((config['market']['symbol'], config['market']['timeframe']), []).append(config)
+
+    from lbot.analysis.backtester import load_drilldown
+    data_exchange = create_data_exchange(offline)
+    jobs = []
+    for (symbol, timeframe), group_configs in groups.items():
+        print(f"Lade Daten für: {symbol} ({timeframe}) [{len(group_configs)} Konfiguration(en)]...")
+        data_for_backtest = load_backtest_data(symbol, timeframe, start_date, end_date, settings, data_exchange)
+        if data_for_backtest is not None:
+            # Sub-Kerzen im Hauptprozess laden (ein Schreiber pro Store), die Worker lesen nur
+            drilldown = load_drilldown(symbol, timeframe, data_for_backtest, settings)
+            jobs.append((symbol, timeframe, data_for_backtest, group_configs, settings, start_capital, CACHE_DIR, drilldown))
+    if not jobs:
+        return []
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    print(f"\nStarte {len(jobs)} Backtest-Gruppe(n) auf {workers} Prozess(en)...")
+    if workers == 1:
+        return [summary for job in jobs for summary in backtest_group(job)]
+    # spawn: TensorFlow verträgt kein fork
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return [summary for summaries in pool.map(backtest_group, jobs) for summary in summaries]
+
+def save_report(results_df, start_date, end_date, start_capital):
+    """ Schreibt die Tabelle zusätzlich als CSV und JSON nach artifacts/results/. """
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    csv_path = os.path.join(RESULTS_DIR, 'backtest_report.csv')
+    json_path = os.path.join(RESULTS_DIR, 'backtest_report.json')
+    results_df.to_csv(csv_path, index=False)
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'start_date': start_date,
+        'end_date': end_date,
+        'start_capital': start_capital,
+        # Fehlende Werte (z.B. Profit-Faktor ohne Verlusttrade) als null statt NaN: NaN ist kein gültiges JSON
+        'results': results_df.astype(object).where(results_df.notna(), None).to_dict(orient='records'),
     }
+    with open(json_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    return csv_path, json_path
 
 def main():
+    parser = argparse.ArgumentParser(description="L-Bot Ergebnis-Analyse")
+    parser.add_argument('--offline', action='store_true', help="Nur lokale Historie verwenden, keine Börsenverbindung")
+    parser.add_argument('--start_date', type=str, default=None, help="Startdatum (JJJJ-MM-TT), sonst interaktive Abfrage")
+    parser.add_argument('--end_date', type=str, default=None, help="Enddatum (JJJJ-MM-TT), sonst interaktive Abfrage")
+    parser.add_argument('--capital', type=int, default=None, help="Startkapital in USDT, sonst interaktive Abfrage")
+    parser.add_argument('--workers', type=int, default=None, help="Parallele Backtest-Prozesse (Standard: alle Kerne)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    workers = args.workers
+    if (args.profile or args.profile_dir) and workers != 1:
+        # Spans werden pro Prozess gesammelt: für ein vollständiges Profil laufen die Backtests im Hauptprozess
+        print("Profiling aktiv: Backtests laufen im Hauptprozess (--workers 1).")
+        workers = 1
+
     print("--- L-Bot Ergebnis-Analyse ---")
-    
+
     settings_path = os.path.join(PROJECT_ROOT, 'settings.json')
     if not os.path.exists(settings_path):
         print(f"Fehler: settings.json nicht gefunden unter {settings_path}")
         return
     with open(settings_path, 'r') as f:
         settings = json.load(f)
+    offline = is_offline_mode(settings, args.offline)
 
     print("\n--- Bitte Konfiguration für den Backtest festlegen ---")
     default_start_date = "2023-01-01"
-    start_date_input = input(f"Startdatum (JJJJ-MM-TT) eingeben [Standard: {default_start_date}]: ")
-    start_date = start_date_input if start_date_input else default_start_date
+    start_date = args.start_date
+    if start_date is None:
+        start_date_input = input(f"Startdatum (JJJJ-MM-TT) eingeben [Standard: {default_start_date}]: ")
+        start_date = start_date_input if start_date_input else default_start_date
 
     default_end_date = date.today().strftime("%Y-%m-%d")
-    end_date_input = input(f"Enddatum (JJJJ-MM-TT) eingeben [Standard: {default_end_date}]: ")
-    end_date = end_date_input if end_date_input else default_end_date
+    end_date = args.end_date
+    if end_date is None:
+        end_date_input = input(f"Enddatum (JJJJ-MM-TT) eingeben [Standard: {default_end_date}]: ")
+        end_date = end_date_input if end_date_input else default_end_date
 
     default_capital = settings.get('optimization_settings', {}).get('start_capital', 1000)
-    try:
-        start_capital_input = input(f"Startkapital in USDT eingeben [Standard: {default_capital}]: ")
-        start_capital = int(start_capital_input) if start_capital_input else default_capital
-    except ValueError:
-        print(f"Ungültige Eingabe, verwende Standardwert: {default_capital} USDT")
-        start_capital = default_capital
-    
+    start_capital = args.capital
+    if start_capital is None:
+        try:
+            start_capital_input = input(f"Startkapital in USDT eingeben [Standard: {default_capital}]: ")
+            start_capital = int(start_capital_input) if start_capital_input else default_capital
+        except ValueError:
+            print(f"Ungültige Eingabe, verwende Standardwert: {default_capital} USDT")
+            start_capital = default_capital
+
     print("--------------------------------------------------")
 
     configs_dir = os.path.join(PROJECT_ROOT, 'src', 'lbot', 'strategy', 'configs')
@@ -98,16 +222,14 @@ def main():
         print(f"Fehler: Konfigurations-Ordner nicht gefunden in {configs_dir}. (Hast du die Pipeline schon laufen lassen?)")
         return
 
-    all_results = []
-    for filename in os.listdir(configs_dir):
+    configs = []
+    for filename in sorted(os.listdir(configs_dir)):
         if filename.startswith('config_') and filename.endswith('.json'):
-            config_path = os.path.join(configs_dir, filename)
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-            
-            result_summary = run_backtest_for_config(config, start_date, end_date, start_capital, settings)
-            if result_summary:
-                all_results.append(result_summary)
+            with open(os.path.join(configs_dir, filename), 'r') as f:
+                configs.append(json.load(f))
+
+    with profile_run('show_results', args.profile, args.profile_dir):
+        all_results = run_batch_report(configs, start_date, end_date, start_capital, settings, offline, workers)
 
     if not all_results:
         print("\nKeine gültigen Konfigurationen zum Analysieren gefunden.")
@@ -123,6 +245,8 @@ def main():
     pd.set_option('display.float_format', '{:.2f}'.format)
     print(results_df.to_string(index=False))
     print("=======================================================")
+    csv_path, json_path = save_report(results_df, start_date, end_date, start_capital)
+    print(f"Ergebnisse gespeichert: {csv_path}, {json_path}")
 
 if __name__ == "__main__":
     main()
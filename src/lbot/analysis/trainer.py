@@ -6,15 +6,16 @@ import json
 from sklearn.preprocessing import StandardScaler
 from joblib import dump as joblib_dump
 import logging
-from tensorflow.keras.callbacks import EarlyStopping
 import pandas as pd
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
 
-from lbot.utils.exchange import Exchange
-from lbot.utils.lstm_model import create_ann_features, create_sequences, create_lstm_model
-from lbot.utils.data_handler import get_market_data
+from lbot.utils.lstm_model import create_ann_features, create_sequences, create_lstm_model, MODEL_FEATURE_COLUMNS
+from lbot.utils.data_handler import get_market_data, create_data_exchange, is_offline_mode
+from lbot.utils.profiling import span, add_profile_arguments, profile_run
+from lbot.utils.model_registry import ModelRegistry, legacy_paths
+from lbot.utils.artifact_cache import fingerprint
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -22,69 +23,95 @@ def load_settings():
     with open(os.path.join(PROJECT_ROOT, 'settings.json'), 'r') as f:
         return json.load(f)
 
-def train_for_symbol(symbol, timeframe, start_date, settings):
-    logging.info(f"Starte LSTM-Trainingsprozess für {symbol} auf {timeframe}...")
-    
+def model_paths(symbol, timeframe):
+    """ Modell und Scaler der aktuellen Version in der Registry (bzw. der alten Ablage, solange nichts registriert ist). """
+    resolved = ModelRegistry().resolve(symbol, timeframe)
+    return resolved[1:] if resolved else legacy_paths(symbol, timeframe)
+
+def model_metadata(data, settings, model=None):
+    """ Metadaten einer neuen Modell-Version: Trainingszeitraum, Hash der Modell-Settings und Trainingskennzahlen. """
+    history = getattr(getattr(model, 'history', None), 'history', None) or {}
+    metrics = {name: float(values[-1]) for name, values in history.items() if values}
+    if history.get('val_loss'): metrics['best_val_loss'] = float(min(history['val_loss']))
+    return {'train_start': str(data.index[0]), 'train_end': str(data.index[-1]), 'rows': len(data),
+            'settings_hash': fingerprint(settings.get('model_settings', {})), 'metrics': metrics}
+
+def train_model(data_with_features, settings):
+    """ Trainiert Scaler und LSTM auf bereits berechneten Features. Gibt (model, scaler) oder (None, None) zurück. """
     model_conf = settings.get('model_settings', {})
-    exchange = Exchange({'apiKey': 'dummy', 'secret': 'dummy'})
-    data = get_market_data(exchange, symbol, timeframe, start_date)
-    
-    if data.empty or len(data) < 400:
-        logging.warning(f"Nicht genug Daten für {symbol} ({timeframe}). Überspringe.")
-        return
 
-    data_with_features = create_ann_features(data)
-    
     # KORREKTE REIHENFOLGE:
     # 1. Definiere die Spalten, die das Modell lernen soll (ohne Filter-Indikatoren)
-    model_feature_columns = ['rsi', 'adx', 'stoch_k', 'price_vs_ema_short', 'price_vs_ema_medium', 'rsi_vs_ema_rsi']
-    features_to_scale = data_with_features[model_feature_columns]
+    features_to_scale = data_with_features[MODEL_FEATURE_COLUMNS]
 
     # 2. Trainiere den Scaler auf dem 2D-DataFrame
-    scaler = StandardScaler()
-    scaled_feature_values = scaler.fit_transform(features_to_scale)
-    
-    # Erstelle einen DataFrame mit den skalierten Werten und den Original-Spaltennamen
-    scaled_features_df = pd.DataFrame(scaled_feature_values, index=features_to_scale.index, columns=features_to_scale.columns)
-    
-    # Füge die unskalierten Spalten (für Filter und Ziel) wieder hinzu
-    full_df_for_sequences = pd.concat([scaled_features_df, data_with_features.drop(columns=model_feature_columns)], axis=1)
+    with span('scaling'):
+        scaler = StandardScaler()
+        scaled_feature_values = scaler.fit_transform(features_to_scale)
+
+        # Für die Sequenzen reichen die skalierten Features und der unskalierte Schlusskurs (für das Ziel)
+        full_df_for_sequences = pd.DataFrame(scaled_feature_values, index=features_to_scale.index, columns=features_to_scale.columns)
+        full_df_for_sequences['close'] = data_with_features['close']
 
     # 3. Erstelle die Sequenzen aus den jetzt skalierten Daten
-    X, y = create_sequences(
-        data=full_df_for_sequences, 
-        sequence_length=model_conf.get('sequence_length', 24),
-        future_steps=model_conf.get('future_steps', 5)
-    )
+    with span('sequences'):
+        X, y = create_sequences(
+            data=full_df_for_sequences,
+            sequence_length=model_conf.get('sequence_length', 24),
+            future_steps=model_conf.get('future_steps', 5)
+        )
     
     if len(X) == 0:
         logging.warning(f"Nicht genug Daten für Sequenzen. Überspringe.")
-        return
+        return None, None
     logging.info(f"{len(X)} Trainings-Sequenzen erstellt.")
 
+    from tensorflow.keras.callbacks import EarlyStopping
     num_features = X.shape[2]
     model = create_lstm_model(model_conf.get('sequence_length', 24), num_features)
     
     early_stopping = EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True, mode='min')
 
     logging.info(f"Trainiere LSTM-Regressions-Modell mit Early Stopping...")
-    model.fit(
-        X, y, 
-        epochs=model_conf.get('epochs', 50), 
-        batch_size=model_conf.get('batch_size', 32), 
-        validation_split=model_conf.get('validation_split', 0.1), 
-        callbacks=[early_stopping],
-        verbose=1
-    )
-
-    safe_filename = f"{symbol.replace('/', '').replace(':', '')}_{timeframe}"
-    models_dir = os.path.join(PROJECT_ROOT, 'artifacts', 'models')
-    os.makedirs(models_dir, exist_ok=True)
-    model_path = os.path.join(models_dir, f'ann_predictor_{safe_filename}.h5')
-    scaler_path = os.path.join(models_dir, f'ann_scaler_{safe_filename}.joblib')
+    with span('fit'):
+        model.fit(
+            X, y,
+            epochs=model_conf.get('epochs', 50),
+            batch_size=model_conf.get('batch_size', 32),
+            validation_split=model_conf.get('validation_split', 0.1),
+            callbacks=[early_stopping],
+            verbose=1
+        )
+    return model, scaler
+
+def save_model(model, scaler, model_path, scaler_path):
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
     model.save(model_path)
     joblib_dump(scaler, scaler_path)
-    logging.info(f"Modell und Scaler erfolgreich gespeichert.")
+
+def train_for_symbol(symbol, timeframe, start_date, settings, offline=False):
+    logging.info(f"Starte LSTM-Trainingsprozess für {symbol} auf {timeframe}...")
+    
+    with span('data'):
+        exchange = create_data_exchange(offline)
+        data = get_market_data(exchange, symbol, timeframe, start_date)
+    
+    if data.empty or len(data) < 400:
+        logging.warning(f"Nicht genug Daten für {symbol} ({timeframe}). Überspringe.")
+        return
+
+    with span('features'):
+        data_with_features = create_ann_features(data)
+    with span('train'):
+        model, scaler = train_model(data_with_features, settings)
+    if model is None:
+        return
+
+    registry = ModelRegistry()
+    with span('save'):
+        version = registry.save(symbol, timeframe, model, scaler, model_metadata(data_with_features, settings, model))
+        registry.promote(symbol, timeframe, version)
+    logging.info(f"Modell und Scaler als Version {version} gespeichert und aktiviert.")
 
 def main():
     settings = load_settings()
@@ -92,19 +119,23 @@ def main():
     parser.add_argument('--symbols', required=True, type=str)
     parser.add_argument('--timeframes', required=True, type=str)
     parser.add_argument('--start_date', type=str, default='2020-01-01')
+    parser.add_argument('--offline', action='store_true', help="Nur lokale Historie verwenden, keine Börsenverbindung")
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    offline = is_offline_mode(settings, args.offline)
     symbols = [s.upper() + "/USDT:USDT" for s in args.symbols.split()]
     timeframes = args.timeframes.split()
     total_jobs = len(symbols) * len(timeframes)
     job_count = 0
-    for symbol in symbols:
-        for timeframe in timeframes:
-            job_count += 1
-            logging.info(f"--- Paket {job_count}/{total_jobs}: Start für {symbol} ({timeframe}) ---")
-            try:
-                train_for_symbol(symbol, timeframe, args.start_date, settings)
-            except Exception as e:
-                logging.error(f"FATALER FEHLER bei {symbol} ({timeframe}): {e}", exc_info=True)
+    with profile_run('trainer', args.profile, args.profile_dir):
+        for symbol in symbols:
+            for timeframe in timeframes:
+                job_count += 1
+                logging.info(f"--- Paket {job_count}/{total_jobs}: Start für {symbol} ({timeframe}) ---")
+                try:
+                    train_for_symbol(symbol, timeframe, args.start_date, settings, offline)
+                except Exception as e:
+                    logging.error(f"FATALER FEHLER bei {symbol} ({timeframe}): {e}", exc_info=True)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,272 @@
+# src/lbot/analysis/walk_forward.py
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+
+from lbot.utils.data_handler import create_data_exchange, is_offline_mode
+from lbot.utils.artifact_cache import ArtifactCache, fingerprint, code_fingerprint, frame_fingerprint, file_fingerprint
+from lbot.utils.model_registry import ModelRegistry
+from lbot.analysis.pipeline import load_pair_data, load_settings, SkipPair
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CACHE_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'cache', 'pipeline')
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'results')
+
+
+def make_folds(index, train_days, optimize_days, test_days):
+    """
+    Rollierende Folds, verankert am Anfang der Historie: Fold k trainiert auf [k*test, k*test + train),
+    optimiert auf den folgenden optimize_days (Vorhersagen für Kerzen, die das Modell nicht gesehen hat)
+    und testet auf den test_days danach. Kommen neue Kerzen hinzu, bleiben die bisherigen Fenster
+    identisch und damit im Cache.
+    """
+    folds = []
+    start, last = index[0], index[-1]
+    train, optimize, test = pd.Timedelta(days=train_days), pd.Timedelta(days=optimize_days), pd.Timedelta(days=test_days)
+    while start + train + optimize + test <= last + pd.Timedelta(microseconds=1):
+        train_end = start + train
+        folds.append({'fold': len(folds) + 1, 'train_start': start, 'train_end': train_end,
+                      'optimize_end': train_end + optimize, 'test_end': train_end + optimize + test})
+        start += test
+    return folds
+
+
+def features_for(symbol, timeframe, raw_data, cache):
+    """ Features einmal für die gesamte Historie; gleicher Key wie die Pipeline-Stufe 'features'. """
+    from lbot.utils.lstm_model import create_ann_features
+    key = fingerprint('features', symbol, timeframe, [frame_fingerprint(raw_data)], [code_fingerprint(create_ann_features)])
+    if cache.has('features', key):
+        return key, cache.load('features', key)
+    return key, cache.save('features', key, create_ann_features(raw_data))
+
+
+def run_fold(job):
+    """
+    Ein Fold in einem eigenen Prozess: Modell auf dem Trainingsfenster (oder das veröffentlichte
+    Modell), Vorhersagen für Optimierungs- und Testfenster in einem Durchgang, Optuna auf dem
+    Optimierungsfenster, danach Backtest der besten Parameter auf dem ungesehenen Testfenster.
+    Modell, Vorhersagen und beste Parameter liegen im Cache und werden bei gleichen Fenstern wiederverwendet.
+    """
+    symbol, timeframe, features, features_key, fold, settings, options, drilldown = job
+    from lbot.utils.lstm_model import load_model_and_scaler
+    from lbot.analysis import trainer, optimizer
+    from lbot.analysis.backtester import Backtester, batch_predict, entry_mask
+
+    cache = ArtifactCache(options['cache_dir'])
+    model_conf = settings.get('model_settings', {})
+    sequence_length = model_conf.get('sequence_length', 24)
+    optimizer.SETTINGS, optimizer.OPTIM_MODE = settings, options['mode']
+    start_capital = settings.get('optimization_settings', {}).get('start_capital', 1000)
+    timings = {}
+
+    train_data = features[(features.index >= fold['train_start']) & (features.index < fold['train_end'])]
+    optimize_start, test_start, test_end = features.index.searchsorted([fold['train_end'], fold['optimize_end'], fold['test_end']])
+    # Optimierungs- und Testfenster brauchen sequence_length Kerzen Vorlauf für die erste Vorhersage
+    predict_data = features.iloc[max(optimize_start - sequence_length, 0):test_end]
+    optimize_data = features.iloc[max(optimize_start - sequence_length, 0):test_start]
+    test_data = features.iloc[max(test_start - sequence_length, 0):test_end]
+
+    model = scaler = model_version = None
+    start = time.perf_counter()
+    if options['retrain']:
+        model_key = fingerprint('wf_train', symbol, timeframe, [frame_fingerprint(train_data)],
+                                [model_conf, code_fingerprint(trainer.train_model)])
+        model_dir = cache.path('wf_train', model_key, suffix='')
+        if not cache.has('wf_train', model_key):
+            logging.info(f"[{symbol} {timeframe} Fold {fold['fold']}] Trainiere Modell...")
+            model, scaler = trainer.train_model(train_data, settings)
+            if model is None:
+                return {'fold': fold['fold'], 'error': "Nicht genug Daten für Sequenzen."}
+            cache.save_dir('wf_train', model_key, lambda d: trainer.save_model(model, scaler, os.path.join(d, 'model.h5'), os.path.join(d, 'scaler.joblib')))
+        model_files = [os.path.join(model_dir, 'model.h5'), os.path.join(model_dir, 'scaler.joblib')]
+    else:
+        resolved = ModelRegistry().resolve(symbol, timeframe)
+        if resolved is None:
+            return {'fold': fold['fold'], 'error': "Kein veröffentlichtes Modell gefunden (Pipeline zuerst ausführen)."}
+        model_version, model_files = resolved[0], list(resolved[1:])
+        model_key = fingerprint('model_files', [file_fingerprint(path) for path in model_files])
+    timings['train'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predict_key = fingerprint('wf_predict', symbol, timeframe, [model_key, frame_fingerprint(predict_data)],
+                              [sequence_length, code_fingerprint(batch_predict)])
+    if cache.has('wf_predict', predict_key):
+        predictions = cache.load('wf_predict', predict_key)
+    else:
+        if model is None:
+            model, scaler = load_model_and_scaler(*model_files)
+        predictions = cache.save('wf_predict', predict_key, pd.Series(batch_predict(predict_data, model, scaler, sequence_length), index=predict_data.index))
+    timings['predict'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    optimize_predictions = predictions.reindex(optimize_data.index).values
+    optimize_key = fingerprint('wf_optimize', symbol, timeframe, [predict_key, frame_fingerprint(optimize_data)],
+                               [options['trials'], options['mode'], settings.get('optimization_settings', {}),
+                                settings.get('backtest_settings', {}), settings.get('strategy_filters', {}),
+                                settings.get('robustness_settings', {}),
+                                code_fingerprint(optimizer.objective, optimizer.feasible_bounds, optimizer.run_study, Backtester, entry_mask)])
+    if cache.has('wf_optimize', optimize_key):
+        best = cache.load('wf_optimize', optimize_key)
+    else:
+        study = optimizer.run_study(optimize_data, model, scaler, optimize_predictions, options['trials'], options['jobs'], drilldown)
+        best = {'params': study.best_trial.params, 'score': study.best_trial.value} if study.best_trial and study.best_value > 0 else None
+        cache.save('wf_optimize', optimize_key, best)
+    timings['optimize'] = time.perf_counter() - start
+    if best is None:
+        return {'fold': fold['fold'], 'error': "Keine profitable Lösung im Optimierungsfenster.", 'timings': timings}
+
+    config = optimizer.build_config(symbol, timeframe, best['params'], model_version)
+    in_sample = Backtester(optimize_data, model, scaler, config, settings, start_capital, predictions=optimize_predictions, drilldown=drilldown)
+    out_of_sample = Backtester(test_data, model, scaler, config, settings, start_capital,
+                               predictions=predictions.reindex(test_data.index).values, drilldown=drilldown)
+    is_metrics, oos_metrics = in_sample.run(), out_of_sample.run()
+    return {
+        'fold': fold['fold'], 'error': None, 'timings': timings,
+        'train_start': str(fold['train_start']), 'optimize_start': str(fold['train_end']),
+        'test_start': str(fold['optimize_end']), 'test_end': str(fold['test_end']),
+        # None bleibt erhalten (Profit-Faktor ohne Verlusttrade, siehe Backtester._calculate_metrics)
+        'in_sample_score': float(best['score']), 'in_sample': {k: None if v is None else float(v) for k, v in is_metrics.items()},
+        'out_of_sample': {k: None if v is None else float(v) for k, v in oos_metrics.items()},
+        'oos_equity': [float(v) for v in out_of_sample.equity_curve], 'params': config,
+    }
+
+
+def aggregate(folds, optimize_days, test_days):
+    """ Verkettet die Testfenster zu einer durchgehenden Out-of-Sample-Equity. """
+    from lbot.analysis.robustness import trade_returns
+    valid = [f for f in folds if not f.get('error')]
+    if not valid:
+        return {}
+    returns = np.concatenate([trade_returns(f['oos_equity']) for f in valid])
+    equity = np.cumprod(np.r_[1.0, 1 + returns])
+    drawdown = 1 - equity / np.maximum.accumulate(equity)
+    oos_pnl = np.array([f['out_of_sample']['total_pnl_pct'] for f in valid])
+    is_pnl = np.array([f['in_sample']['total_pnl_pct'] for f in valid])
+    # Effizienz: Out-of-Sample-Rendite pro Tag relativ zur In-Sample-Rendite pro Tag
+    is_per_day = is_pnl.mean() / optimize_days
+    return {
+        'folds': len(folds), 'valid_folds': len(valid),
+        'oos_total_pnl_pct': float((equity[-1] - 1) * 100),
+        'oos_max_drawdown_pct': float(drawdown.max() * 100),
+        'oos_num_trades': int(len(returns)),
+        'oos_mean_fold_pnl_pct': float(oos_pnl.mean()),
+        'profitable_folds_pct': float((oos_pnl > 0).mean() * 100),
+        'walk_forward_efficiency': float(oos_pnl.mean() / test_days / is_per_day) if is_per_day > 0 else None,
+    }
+
+
+def walk_forward_pair(symbol, timeframe, start_date, settings, options, exchange):
+    wf_conf = settings.get('walk_forward_settings', {})
+    train_days, optimize_days, test_days = wf_conf.get('train_days', 365), wf_conf.get('optimize_days', 90), wf_conf.get('test_days', 90)
+    if optimize_days <= 0:
+        raise ValueError("walk_forward_settings.optimize_days muss größer als 0 sein.")
+    cache = ArtifactCache(options['cache_dir'])
+    raw_data = load_pair_data(symbol, timeframe, start_date, exchange)
+    features_key, features = features_for(symbol, timeframe, raw_data, cache)
+    folds = make_folds(features.index, train_days, optimize_days, test_days)
+    if not folds:
+        raise SkipPair(f"Historie zu kurz für {train_days} Tage Training + {optimize_days} Tage Optimierung + {test_days} Tage Test.")
+    if not options['retrain']:
+        logging.warning(f"{symbol} ({timeframe}): --no_retrain verwendet das veröffentlichte Modell, das auf der gesamten "
+                        f"Historie trainiert wurde. Die Ergebnisse sind NICHT out-of-sample.")
+
+    from lbot.analysis.backtester import load_drilldown
+    # Einmal im Hauptprozess (ein Schreiber pro Store); die Folds teilen sich die Sub-Kerzen
+    drilldown = load_drilldown(symbol, timeframe, features, settings)
+
+    workers = max(1, min(options['workers'], len(folds)))
+    fold_options = dict(options, jobs=max(1, options['jobs'] // workers))
+    jobs = [(symbol, timeframe, features, features_key, fold, settings, fold_options, drilldown) for fold in folds]
+    logging.info(f"{symbol} ({timeframe}): {len(folds)} Folds ({train_days}d Training / {optimize_days}d Optimierung / {test_days}d Test) auf {workers} Prozess(en)...")
+    if workers == 1:
+        results = [run_fold(job) for job in jobs]
+    else:
+        # spawn: TensorFlow verträgt kein fork
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(run_fold, jobs))
+    # Ohne Neutraining kennt das Modell Optimierungs- und Testfenster: der Bericht ist nicht out-of-sample
+    return {'symbol': symbol, 'timeframe': timeframe, 'train_days': train_days, 'optimize_days': optimize_days, 'test_days': test_days,
+            'retrain': options['retrain'], 'out_of_sample': options['retrain'], 'folds': results,
+            'summary': aggregate(results, optimize_days, test_days)}
+
+
+def print_report(report):
+    rows = []
+    for fold in report['folds']:
+        if fold.get('error'):
+            rows.append({'Fold': fold['fold'], 'Test ab': '-', 'IS PnL (%)': None, 'OOS PnL (%)': None,
+                         'OOS DD (%)': None, 'OOS Trades': None, 'OOS PF': None, 'Hinweis': fold['error']})
+            continue
+        rows.append({'Fold': fold['fold'], 'Test ab': fold['test_start'][:10],
+                     'IS PnL (%)': fold['in_sample']['total_pnl_pct'], 'OOS PnL (%)': fold['out_of_sample']['total_pnl_pct'],
+                     'OOS DD (%)': fold['out_of_sample']['max_drawdown_pct'], 'OOS Trades': int(fold['out_of_sample']['num_trades']),
+                     'OOS PF': fold['out_of_sample'].get('profit_factor'),
+                     'Hinweis': '' if fold['out_of_sample'].get('profit_factor') is not None else 'kein Verlusttrade'})
+    print(f"\n=== Walk-Forward: {report['symbol']} ({report['timeframe']}) ===")
+    pd.set_option('display.float_format', '{:.2f}'.format)
+    # Fehlende Werte (Fehler-Folds, Profit-Faktor ohne Verlusttrade) als '-'
+    print(pd.DataFrame(rows).to_string(index=False, na_rep='-'))
+    for key, value in report['summary'].items():
+        print(f"  {key}: {value:.2f}" if isinstance(value, float) else f"  {key}: {'-' if value is None else value}")
+    if not report.get('out_of_sample', True):
+        print("  ⚠️  Veröffentlichtes Modell (--no_retrain): es kennt die Testfenster, die Kennzahlen sind NICHT out-of-sample.")
+
+
+def save_report(report):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    safe_filename = f"{report['symbol'].replace('/', '').replace(':', '')}_{report['timeframe']}"
+    path = os.path.join(RESULTS_DIR, f'walk_forward_{safe_filename}.json')
+    with open(path, 'w') as f:
+        json.dump(dict(report, created=datetime.now(timezone.utc).isoformat()), f, indent=4)
+    return path
+
+
+def main():
+    settings = load_settings()
+    parser = argparse.ArgumentParser(description="L-Bot Walk-Forward-Validierung")
+    parser.add_argument('--symbols', required=True, type=str)
+    parser.add_argument('--timeframes', required=True, type=str)
+    parser.add_argument('--start_date', required=True, type=str)
+    parser.add_argument('--trials', type=int, default=None, help="Optuna-Trials pro Fold (Standard: walk_forward_settings)")
+    parser.add_argument('--jobs', type=int, default=-1, help="CPU-Kerne für Optuna (-1 = alle, werden auf die Folds aufgeteilt)")
+    parser.add_argument('--mode', type=str, default='strict')
+    parser.add_argument('--workers', type=int, default=None, help="Parallel laufende Folds (Standard: alle Kerne)")
+    parser.add_argument('--no_retrain', action='store_true', help="Veröffentlichtes Modell verwenden und nur die Parameter pro Fold optimieren (nicht out-of-sample)")
+    parser.add_argument('--offline', action='store_true')
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    options = {
+        'trials': args.trials or settings.get('walk_forward_settings', {}).get('trials_per_fold', 100),
+        'mode': args.mode, 'retrain': not args.no_retrain,
+        'workers': args.workers or cpu_count, 'jobs': cpu_count if args.jobs == -1 else args.jobs,
+        'cache_dir': CACHE_DIR,
+    }
+    exchange = create_data_exchange(is_offline_mode(settings, args.offline))
+    for symbol in [s.upper() + "/USDT:USDT" for s in args.symbols.split()]:
+        for timeframe in args.timeframes.split():
+            try:
+                report = walk_forward_pair(symbol, timeframe, args.start_date, settings, options, exchange)
+            except SkipPair as e:
+                logging.warning(f"{symbol} ({timeframe}): {e} Überspringe.")
+                continue
+            print_report(report)
+            logging.info(f"Walk-Forward-Bericht gespeichert: {save_report(report)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,19 @@ import json
 import logging
 import sqlite3
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Pfad-Konfiguration ---
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
 
 # --- Kern-Importe für L-Bot ---
-from lbot.utils.exchange import Exchange
-from lbot.utils.lstm_model import load_model_and_scaler
-# NEU: Import des neuen Trade Managers
-from lbot.utils.trade_manager import full_trade_cycle 
-from lbot.utils.telegram import send_message
+from lbot.utils.model_registry import load_model_version
+from lbot.utils.trade_manager import fan_out_trade_cycle
+from lbot.utils.telegram import queue_message, flush_notifications
 from lbot.utils.decorators import run_with_guardian_checks
+from lbot.utils.profiling import span, add_profile_arguments, profile_run
+from lbot.utils.metrics import export_metrics
 
 # --- Hilfsfunktionen ---
 # ... (alle Hilfsfunktionen wie create_safe_filename, load_config, setup_logging, get_db_file_path, setup_database, get_state, set_state bleiben UNVERÄNDERT) ...
@@ -84,73 +85,94 @@ def set_state(account_name, symbol, timeframe, key, value):
 
 # --- Hauptlogik ---
 @run_with_guardian_checks
-def run_for_account(account, telegram_config, params, model, scaler, logger, settings, model_path, scaler_path):
-    account_name = account.get('name', 'Standard-Account')
+def prepare_account(account, telegram_config, params, logger, model_path, scaler_path, exchange=None):
+    """ Pro Konto: Guardian-Checks (Decorator, liefert auch die Exchange), State-DB und Kontostand. Gibt (exchange, balance) oder None zurück. """
+    account_name = account.get('name', 'Standard')
     symbol = params['market']['symbol']
     timeframe = params['market']['timeframe']
     
     logger.info(f"--- Starte L-Bot für {account_name} auf {symbol} ({timeframe}) ---")
-    
-    exchange = Exchange(account)
     setup_database(account_name, symbol, timeframe)
-        
-    current_balance = exchange.fetch_balance_usdt()
-    logger.info(f"Aktueller Kontostand: {current_balance:.2f} USDT")
+
+    with span('balance'):
+        current_balance = exchange.fetch_balance_usdt()
+    logger.info(f"[{account_name}] Aktueller Kontostand: {current_balance:.2f} USDT")
 
     if current_balance <= 0:
-        logger.warning("Kein Guthaben gefunden oder Fehler beim Abruf. Überspringe den Handelszyklus.")
+        logger.warning(f"[{account_name}] Kein Guthaben gefunden oder Fehler beim Abruf. Überspringe den Handelszyklus.")
+        return None
+    return exchange, current_balance
+
+def run_strategy(accounts, telegram_config, params, model, scaler, logger, settings, model_path, scaler_path):
+    """
+    Bereitet alle Konten parallel vor und rechnet das Signal danach nur einmal; die Orders gehen
+    parallel an alle Konten (siehe fan_out_trade_cycle). Weitere Konten kosten so weder
+    Inferenz noch zusätzliche Einstiegs-Latenz.
+    """
+    prepare = lambda account: prepare_account(account, telegram_config, params, logger, model_path, scaler_path)
+    with span('exchange_init'):
+        if len(accounts) > 1:
+            with ThreadPoolExecutor(max_workers=len(accounts), thread_name_prefix="AccountInit") as pool:
+                prepared = list(pool.map(prepare, accounts))
+        else:
+            prepared = [prepare(account) for account in accounts]
+    ready = [entry for entry in prepared if entry is not None]
+    if not ready:
         return
 
-    # Verwende die neue, zentrale trade_cycle Funktion
-    full_trade_cycle(
-        exchange=exchange,
-        model=model,
-        scaler=scaler,
-        params=params,
-        settings=settings, # NEU: Globale Settings werden übergeben
-        current_balance=current_balance,
-        db_get_state=get_state,
-        db_set_state=set_state,
-        telegram_config=telegram_config,
-        logger=logger
-    )
+    symbol = params['market']['symbol']
+    try:
+        with span('trade_cycle'):
+            fan_out_trade_cycle(ready, model, scaler, params, settings, get_state, set_state, telegram_config, logger)
+    except Exception as e:
+        logger.critical(f"Kritischer Fehler im Handelszyklus für {symbol}: {e}", exc_info=True)
+        message = f"🚨 *Kritischer Systemfehler* im Handelszyklus für {symbol}."
+        queue_message(telegram_config.get('bot_token'), telegram_config.get('chat_id'), message)
 
 def main():
     parser = argparse.ArgumentParser(description="L-Bot LSTM Trading Skript")
     parser.add_argument('--symbol', required=True, type=str)
     parser.add_argument('--timeframe', required=True, type=str)
+    add_profile_arguments(parser)
     args, _ = parser.parse_known_args()
 
     symbol, timeframe = args.symbol, args.timeframe
     logger = setup_logging(symbol, timeframe)
-    
-    try:
-        # Lade alle Konfigurationen
-        params = load_config(symbol, timeframe)
-        with open(os.path.join(PROJECT_ROOT, 'settings.json'), "r") as f:
-            settings = json.load(f)
-        with open(os.path.join(PROJECT_ROOT, 'secret.json'), "r") as f:
-            secrets = json.load(f)
-            
-        safe_filename = create_safe_filename(symbol, timeframe)
-        model_path = os.path.join(PROJECT_ROOT, 'artifacts', 'models', f'ann_predictor_{safe_filename}.h5')
-        scaler_path = os.path.join(PROJECT_ROOT, 'artifacts', 'models', f'ann_scaler_{safe_filename}.joblib')
-        MODEL, SCALER = load_model_and_scaler(model_path, scaler_path)
-        
-        if MODEL is None or SCALER is None:
-            raise FileNotFoundError(f"Modell oder Scaler für {symbol} ({timeframe}) nicht gefunden.")
-            
-        accounts_to_run = secrets.get('lbot', [])
-        telegram_config = secrets.get('telegram', {})
 
-    except Exception as e:
-        logger.critical(f"Kritischer Initialisierungs-Fehler: {e}")
-        sys.exit(1)
-        
-    for account in accounts_to_run:
-        # Hänge settings an die Argumente an
-        run_for_account(account, telegram_config, params, MODEL, SCALER, logger, settings, model_path, scaler_path)
-    
+    with profile_run(f"run_{create_safe_filename(symbol, timeframe)}", args.profile, args.profile_dir, printer=logger.info):
+        try:
+            # Lade alle Konfigurationen
+            with span('config_load'):
+                params = load_config(symbol, timeframe)
+                with open(os.path.join(PROJECT_ROOT, 'settings.json'), "r") as f:
+                    settings = json.load(f)
+                with open(os.path.join(PROJECT_ROOT, 'secret.json'), "r") as f:
+                    secrets = json.load(f)
+
+            safe_filename = create_safe_filename(symbol, timeframe)
+            with span('model_load'):
+                MODEL, SCALER, model_version, model_path, scaler_path = load_model_version(symbol, timeframe)
+
+            if MODEL is None or SCALER is None:
+                raise FileNotFoundError(f"Modell oder Scaler für {symbol} ({timeframe}) nicht gefunden.")
+            config_version = params.get('model', {}).get('version')
+            if model_version and config_version and config_version != model_version:
+                logger.warning(f"Konfiguration wurde auf Modell-Version {config_version} optimiert, aktiv ist {model_version}.")
+
+            accounts_to_run = secrets.get('lbot', [])
+            telegram_config = secrets.get('telegram', {})
+
+        except Exception as e:
+            logger.critical(f"Kritischer Initialisierungs-Fehler: {e}")
+            sys.exit(1)
+
+        run_strategy(accounts_to_run, telegram_config, params, MODEL, SCALER, logger, settings, model_path, scaler_path)
+
+    # Telegram-Versand abwarten, damit dessen Latenzen noch in diesem Lauf exportiert werden
+    flush_notifications()
+    metrics_file = export_metrics(settings, f"run_{safe_filename}", strategy=safe_filename)
+    if metrics_file:
+        logger.info(f"Metriken geschrieben: {metrics_file}")
     logger.info(f">>> L-Bot-Lauf für {symbol} ({timeframe}) abgeschlossen <<<\n")
 
 if __name__ == "__main__":
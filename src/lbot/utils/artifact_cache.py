@@ -0,0 +1,87 @@
+# src/lbot/utils/artifact_cache.py
+import os
+import json
+import shutil
+import hashlib
+import inspect
+import pandas as pd
+from joblib import dump as joblib_dump, load as joblib_load
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+CACHE_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'cache')
+
+
+def fingerprint(*parts):
+    """ Stabiler Hash beliebiger JSON-fähiger Bestandteile (Parameter, Settings, andere Hashes). """
+    payload = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha256(payload).hexdigest()[:24]
+
+
+def code_fingerprint(*objects):
+    """ Hash des Quelltexts: ändert sich die Berechnung, werden ihre Ergebnisse automatisch ungültig. """
+    return fingerprint(*[inspect.getsource(obj) for obj in objects])
+
+
+def frame_fingerprint(df):
+    """ Inhalts-Hash eines DataFrames (Index, Spalten und Werte). """
+    if df is None or df.empty:
+        return fingerprint('empty')
+    row_hashes = pd.util.hash_pandas_object(df, index=True).values
+    return fingerprint(list(df.columns), hashlib.sha256(row_hashes.tobytes()).hexdigest())
+
+
+def array_fingerprint(*arrays):
+    """ Inhalts-Hash von numpy-Arrays (z.B. der Sub-Kerzen eines IntrabarDrilldown). """
+    sha = hashlib.sha256()
+    for array in arrays:
+        sha.update(str(array.dtype).encode()); sha.update(array.tobytes()); sha.update(b'\0')
+    return fingerprint(sha.hexdigest())
+
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    """ Inhalts-Hash einer Datei (z.B. eines gespeicherten Modells). """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()[:24]
+
+
+class ArtifactCache:
+    """
+    Inhaltsadressierter Cache: jedes Ergebnis liegt unter <stage>/<key>, wobei der Key aus
+    den Keys der Eingaben und den Parametern der Stufe gebildet wird. Ein Eintrag wird nie
+    überschrieben, sondern über einen temporären Namen atomar angelegt.
+    """
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+
+    def path(self, stage, key, suffix='.joblib'):
+        return os.path.join(self.root, stage, f"{key}{suffix}")
+
+    def has(self, stage, key):
+        return os.path.exists(self.path(stage, key)) or os.path.isdir(self.path(stage, key, suffix=''))
+
+    def load(self, stage, key):
+        return joblib_load(self.path(stage, key))
+
+    def save(self, stage, key, value):
+        path = self.path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib_dump(value, tmp_path)
+        os.replace(tmp_path, path)
+        return value
+
+    def save_dir(self, stage, key, writer):
+        """ Für Artefakte aus mehreren Dateien (z.B. Keras-Modell + Scaler): writer(tmp_dir) befüllt das Verzeichnis. """
+        final_dir = self.path(stage, key, suffix='')
+        tmp_dir = f"{final_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        writer(tmp_dir)
+        if os.path.isdir(final_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, final_dir)
+        return final_dir
@@ -3,136 +3,245 @@ import os
 import sys
 import pandas as pd
 import logging
-import ccxt
 from datetime import datetime, timezone
-import time
-from tqdm import tqdm
+from .history_store import HistoryStore, HISTORY_DIR
+from .resampler import get_base_timeframe, is_derivable, update_derived_store, rederive_missing
 
-PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
-HISTORY_DIR = os.path.join(PROJECT_ROOT, 'data', 'history')
 os.makedirs(HISTORY_DIR, exist_ok=True)
 
 log = logging.getLogger("DataHandler")
 log.setLevel(logging.INFO)
 
-def get_history_filepath(symbol, timeframe):
-    """ Erstellt einen sicheren Dateinamen für die lokale Historiendatei. """
-    safe_symbol = symbol.replace('/', '_').replace(':', '')
-    return os.path.join(HISTORY_DIR, f"{safe_symbol}_{timeframe}.parquet")
+class MissingDataError(Exception):
+    """ Im Offline-Modus fehlen lokale Daten für den angeforderten Zeitraum. """
+    pass
+
+def create_data_exchange(offline=False):
+    """
+    Erstellt den Börsen-Client für die Analyse-Tools (nur für die neuesten Live-Kerzen).
+    Im Offline-Modus wird kein Client erstellt, ccxt wird dann nicht einmal importiert.
+    """
+    if offline:
+        return None
+    from .exchange import Exchange
+    return Exchange({'apiKey': 'dummy', 'secret': 'dummy'})
+
+def is_offline_mode(settings, cli_flag=False):
+    return bool(cli_flag or settings.get('data_settings', {}).get('offline_analysis', False))
+
+def get_history_store(symbol, timeframe):
+    """
+    Liefert den partitionierten Historien-Store für ein Symbol (Binance-Schreibweise ohne ':USDT').
+    Nur lesend: aus dem base_timeframe abgeleitete Timeframes werden ausschließlich beim Download
+    bzw. bei der Reparatur aktualisiert (siehe _download_binance_data, repair_gaps).
+    """
+    return HistoryStore(symbol.split(':')[0], timeframe)
 
 def _download_binance_data(symbol, timeframe, start_date_str):
     """
     Private Funktion, die den Download-Prozess von Binance durchführt.
-    Startet den Download ab dem übergebenen Startdatum.
+    Ergänzt den lokalen Store nach hinten (ab start_date_str) und nach vorne (bis jetzt).
+    Es werden nur die fehlenden Kerzen geladen und als neue Partitionen angehängt.
     """
-    exchange = ccxt.binance()
     since = int(datetime.strptime(start_date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
-    
+
+    from .downloader import HistoryDownloader
+
     binance_symbol = symbol.split(':')[0]
-    filepath = get_history_filepath(binance_symbol, timeframe)
-    
-    df_existing = None
-    if os.path.exists(filepath):
-        try:
-            df_existing = pd.read_parquet(filepath)
-            if not df_existing.empty:
-                # Wenn wir schon aktuellere Daten haben, müssen wir nicht erneut laden
-                if df_existing.index[-1].timestamp() * 1000 > since:
-                     log.info(f"Lokale Daten für {binance_symbol} ({timeframe}) sind bereits aktuell genug.")
-                     return df_existing
-                # Ansonsten setzen wir den Startpunkt auf das Ende der vorhandenen Daten
-                since = int(df_existing.index[-1].timestamp() * 1000) + 1
-        except Exception:
-            df_existing = None # Fehler beim Lesen, lade neu
-
-    all_data = []
-    pbar = tqdm(desc=f"  Download {binance_symbol} ({timeframe})", unit=" Kerzen")
-    
-    while True:
-        try:
-            ohlcv = exchange.fetch_ohlcv(binance_symbol, timeframe, since=since, limit=1000)
-            if not ohlcv: break
-            
-            first_ts = pd.to_datetime(ohlcv[0][0], unit='ms', utc=True)
-            last_ts = pd.to_datetime(ohlcv[-1][0], unit='ms', utc=True)
-            pbar.set_postfix_str(f"Lade Block: {first_ts.date()} -> {last_ts.date()}")
-            
-            all_data.extend(ohlcv)
-            since = ohlcv[-1][0] + 1
-            pbar.update(len(ohlcv))
-            time.sleep(exchange.rateLimit / 1000)
-        except Exception as e:
-            print(f" Fehler bei Download: {e}"); break
-            
-    pbar.close()
+    base_timeframe = get_base_timeframe()
+    if is_derivable(base_timeframe, timeframe):
+        # Nur die Basis-Kerzen werden geladen, der gewünschte Timeframe wird lokal abgeleitet
+        _download_binance_data(symbol, base_timeframe, start_date_str)
+        return update_derived_store(binance_symbol, base_timeframe, timeframe)
+
+    store = get_history_store(binance_symbol, timeframe)
+    downloader = HistoryDownloader()
+
+    first_ts, last_ts = store.first_timestamp(), store.last_timestamp()
+    ranges = []
+    if first_ts is None:
+        ranges.append((since, None))
+    else:
+        first_ms = int(first_ts.timestamp() * 1000)
+        if first_ms > since and store.manifest.get('requested_from', first_ms) > since:
+            ranges.append((since, first_ms))
+        ranges.append((int(last_ts.timestamp() * 1000) + 1, None))
 
-    if not all_data:
-        log.info("Keine neuen Daten zum Herunterladen gefunden.")
-        return df_existing if df_existing is not None else pd.DataFrame()
+    for range_start, range_end in ranges:
+        df_new = downloader.download_pair(binance_symbol, timeframe, range_start, until=range_end)
+        if df_new is None:
+            log.warning(f"Download für {binance_symbol} ({timeframe}) unvollständig. Ein erneuter Aufruf setzt am Checkpoint fort.")
+            continue
+        store.append(df_new)
 
-    df_new = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df_new['timestamp'] = pd.to_datetime(df_new['timestamp'], unit='ms', utc=True)
-    df_new.set_index('timestamp', inplace=True)
+    # Merken, ab wann Daten angefordert wurden: liegt der erste Kurs später, gibt es davor schlicht keine
+    if store.exists() and store.manifest.get('requested_from', float('inf')) > since:
+        store.update_meta(requested_from=since)
 
-    if df_existing is not None and not df_existing.empty:
-        df_combined = pd.concat([df_existing, df_new])
+    if not store.exists():
+        log.info("Keine Daten zum Herunterladen gefunden.")
     else:
-        df_combined = df_new
+        log.info(f"Erfolgreich! {store.num_rows()} Kerzen für {binance_symbol} ({timeframe}) lokal gespeichert.")
+    return store
+
+def repair_gaps(symbol, timeframe, downloader=None):
+    """
+    Lädt gezielt nur die Kerzen nach, die im Gap-Index als fehlend vermerkt sind.
+    Bereiche, die auch die Börse nicht liefern kann (z.B. Handelsunterbrechungen), werden
+    im Manifest als 'unfillable' vermerkt und bei späteren Reparaturen übersprungen.
+    Gibt die Anzahl nachgeladener Kerzen zurück.
+    """
+    binance_symbol = symbol.split(':')[0]
+    base_timeframe = get_base_timeframe()
+    if is_derivable(base_timeframe, timeframe):
+        repaired = repair_gaps(symbol, base_timeframe, downloader)
+        return repaired + rederive_missing(binance_symbol, base_timeframe, timeframe)
+
+    from .downloader import HistoryDownloader
 
-    df_combined = df_combined[~df_combined.index.duplicated(keep='last')].sort_index()
-    df_combined.to_parquet(filepath)
-    
-    log.info(f"Erfolgreich! {len(df_combined)} Kerzen für {binance_symbol} ({timeframe}) lokal gespeichert.")
-    return df_combined
+    store = HistoryStore(binance_symbol, timeframe)
+    if not store.exists() or store.step_ms is None:
+        return 0
+    gaps = store.gap_index()
+    step = store.step_ms
+    unfillable = [tuple(r) for r in gaps.get('unfillable', [])]
+    ranges = [r for r in gaps.get('missing', []) if tuple(r) not in unfillable]
+    if not ranges:
+        log.info(f"{binance_symbol} ({timeframe}): keine reparierbaren Lücken.")
+        return 0
 
-def get_market_data(exchange, symbol: str, timeframe: str, start_date_str: str):
+    downloader = downloader or HistoryDownloader(show_progress=False)
+    repaired = 0
+    for start, end in ranges:
+        df_new = downloader.download_pair(binance_symbol, timeframe, start, until=end + step)
+        if df_new is None:
+            log.warning(f"Reparatur von {binance_symbol} ({timeframe}) ab {pd.to_datetime(start, unit='ms', utc=True)} fehlgeschlagen.")
+            continue
+        df_new = df_new[(df_new.index >= pd.to_datetime(start, unit='ms', utc=True)) & (df_new.index <= pd.to_datetime(end, unit='ms', utc=True))]
+        repaired += store.append(df_new)
+
+    # Was nach dem Nachladen noch fehlt, hat die Börse nicht -> merken, damit es nicht erneut geladen wird
+    requested = {tuple(r) for r in ranges}
+    still_missing = [r for r in store.gap_index().get('missing', [])
+                     if any(r[0] >= s and r[1] <= e for s, e in requested)]
+    if still_missing:
+        store.update_meta(gaps=dict(store.gap_index(), unfillable=sorted(set(unfillable) | {tuple(r) for r in still_missing})))
+    log.info(f"{binance_symbol} ({timeframe}): {repaired} Kerzen nachgeladen, {len(still_missing)} Lücken von der Börse nicht lieferbar.")
+    return repaired
+
+def warn_if_incomplete(store, start_dt=None, end_dt=None):
     """
-    NEUE LOGIK V2:
-    1. Prüft, ob die lokale Datei die angeforderten Daten (ab start_date_str) enthält.
-    2. Wenn nicht, lädt es die fehlenden Daten ab start_date_str herunter.
-    3. Holt die allerletzten Live-Daten von der Trading-Börse.
-    4. Gibt exakt den angeforderten Zeitraum zurück.
+    Schneller Vollständigkeits-Check über den Gap-Index im Manifest (ohne den Index zu scannen).
+    Gibt die fehlenden Bereiche im Zeitraum zurück und warnt, falls es welche gibt.
     """
-    history_file = get_history_filepath(symbol.split(':')[0], timeframe)
+    if store.is_complete(start_dt, end_dt):
+        return []
+    missing = store.missing_ranges(start_dt, end_dt)
+    step = pd.Timedelta(milliseconds=store.step_ms)
+    candles = sum(int((end - start) / step) + 1 for start, end in missing)
+    log.warning(f"Historie für {store.symbol} ({store.timeframe}) hat {len(missing)} Lücken ({candles} Kerzen) im Zeitraum, "
+                f"erste ab {missing[0][0]}. Reparatur: download_data.py --repair")
+    return missing
+
+def _covers_start(store, start_dt):
+    first_ts = store.first_timestamp()
+    if first_ts is None:
+        return False
+    requested_from = store.manifest.get('requested_from')
+    return first_ts <= start_dt or (requested_from is not None and requested_from <= start_dt.timestamp() * 1000)
+
+def _parse_range(start_date_str, end_date_str):
     start_dt = pd.to_datetime(start_date_str, utc=True)
-    df_history = None
+    end_dt = None
+    if end_date_str:
+        # Ein reines Datum meint den ganzen Tag
+        end_dt = pd.to_datetime(end_date_str, utc=True) + pd.Timedelta(days=1) - pd.Timedelta(milliseconds=1)
+    return start_dt, end_dt
 
-    if os.path.exists(history_file):
-        try:
-            df_full_history = pd.read_parquet(history_file)
-            # Prüfen, ob der Start der lokalen Daten VOR unserem gewünschten Start liegt
-            if not df_full_history.empty and df_full_history.index[0] <= start_dt:
-                log.info(f"Ausreichende Historiendaten für {symbol} ({timeframe}) in lokaler Datei gefunden.")
-                df_history = df_full_history
-            else:
-                log.warning(f"Lokale Daten sind nicht alt genug. Lade fehlende Daten ab {start_date_str}...")
-                df_history = _download_binance_data(symbol, timeframe, start_date_str)
-        except Exception as e:
-            log.warning(f"Konnte lokale Historiendatei nicht lesen: {e}. Starte Download.")
-            df_history = _download_binance_data(symbol, timeframe, start_date_str)
-    else:
-        log.warning(f"Keine lokale Historiendatei für {symbol} ({timeframe}) gefunden.")
-        print(f"Starte Download für den angeforderten Zeitraum ab {start_date_str}... Dies kann dauern.")
-        df_history = _download_binance_data(symbol, timeframe, start_date_str)
+def get_local_market_data(symbol: str, timeframe: str, start_date_str: str, end_date_str: str = None, columns=None):
+    """
+    Offline-Datenquelle: liefert ausschließlich Daten aus dem lokalen Store.
+    Es wird weder ein Börsen-Client erstellt noch etwas heruntergeladen; fehlen
+    Daten für den Zeitraum, wird sofort ein MissingDataError geworfen.
+    """
+    start_dt, end_dt = _parse_range(start_date_str, end_date_str)
+    store = get_history_store(symbol, timeframe)
+    if not store.exists():
+        base_timeframe = get_base_timeframe()
+        if is_derivable(base_timeframe, timeframe):
+            raise MissingDataError(f"Keine lokale Historie für {symbol} ({timeframe}). download_data.sh leitet sie aus den {base_timeframe}-Daten ab.")
+        raise MissingDataError(f"Keine lokale Historie für {symbol} ({timeframe}). Bitte zuerst download_data.sh ausführen.")
+    if not _covers_start(store, start_dt):
+        raise MissingDataError(f"Lokale Historie für {symbol} ({timeframe}) beginnt erst am {store.first_timestamp().date()}, angefordert ab {start_date_str}.")
+    warn_if_incomplete(store, start_dt, end_dt)
+    df = store.read(start=start_dt, end=end_dt, columns=columns)
+    if df.empty:
+        raise MissingDataError(f"Keine lokalen Daten für {symbol} ({timeframe}) im Zeitraum ab {start_date_str}.")
+    log.info(f"Offline-Modus: {len(df)} Kerzen für {symbol} ({timeframe}) aus dem lokalen Store geladen.")
+    return df
+
+def get_market_data(exchange, symbol: str, timeframe: str, start_date_str: str, end_date_str: str = None, columns=None):
+    """
+    NEUE LOGIK V3:
+    0. Ist `exchange` None (Offline-Modus), wird ausschließlich der lokale Store gelesen.
+    1. Prüft anhand des Manifests, ob der lokale Store die angeforderten Daten (ab start_date_str) enthält.
+    2. Wenn nicht, lädt es die fehlenden Daten herunter.
+    3. Liest nur den Zeitraum [start_date_str, end_date_str] (Enddatum inklusive) und nur die
+       gewünschten Spalten; Filter und Projektion werden an pyarrow durchgereicht.
+    4. Ergänzt die allerletzten Live-Daten von der Trading-Börse, sofern der Zeitraum bis heute reicht.
+    """
+    if exchange is None:
+        return get_local_market_data(symbol, timeframe, start_date_str, end_date_str, columns)
+
+    start_dt, end_dt = _parse_range(start_date_str, end_date_str)
+    df_history = None
+    store = None
 
     try:
-        df_live = exchange.fetch_recent_ohlcv(symbol, timeframe, limit=300)
-        if not df_live.empty:
-            log.info(f"{len(df_live)} neueste Kerzen von {exchange.exchange.id} geladen.")
+        store = get_history_store(symbol, timeframe)
+        first_ts = store.first_timestamp()
+        if _covers_start(store, start_dt):
+            log.info(f"Ausreichende Historiendaten für {symbol} ({timeframe}) im lokalen Store gefunden.")
+        elif first_ts is None:
+            log.warning(f"Keine lokale Historie für {symbol} ({timeframe}) gefunden.")
+            print(f"Starte Download für den angeforderten Zeitraum ab {start_date_str}... Dies kann dauern.")
+            store = _download_binance_data(symbol, timeframe, start_date_str)
+        else:
+            log.warning(f"Lokale Daten sind nicht alt genug. Lade fehlende Daten ab {start_date_str}...")
+            store = _download_binance_data(symbol, timeframe, start_date_str)
+        warn_if_incomplete(store, start_dt, end_dt)
+        df_history = store.read(start=start_dt, end=end_dt, columns=columns)
     except Exception as e:
-        log.error(f"Fehler beim Laden der Live-Daten: {e}")
-        df_live = pd.DataFrame()
+        log.warning(f"Konnte lokale Historie nicht lesen: {e}.")
+
+    # Live-Daten werden nur gebraucht, wenn der angeforderte Zeitraum über die lokale Historie hinausreicht
+    last_ts = store.last_timestamp() if store is not None else None
+    df_live = pd.DataFrame()
+    if end_dt is None or last_ts is None or end_dt > last_ts:
+        try:
+            df_live = exchange.fetch_recent_ohlcv(symbol, timeframe, limit=300)
+            if not df_live.empty:
+                log.info(f"{len(df_live)} neueste Kerzen von {exchange.exchange.id} geladen.")
+                if columns:
+                    df_live = df_live[[c for c in columns if c in df_live.columns]]
+        except Exception as e:
+            log.error(f"Fehler beim Laden der Live-Daten: {e}")
+            df_live = pd.DataFrame()
 
     if df_history is not None and not df_history.empty:
-        df_combined = pd.concat([df_history, df_live])
+        df_combined = pd.concat([df_history, df_live]) if not df_live.empty else df_history
     else:
         df_combined = df_live
-        
+
     if df_combined.empty:
         log.error("Keine Marktdaten verfügbar.")
         return pd.DataFrame()
 
-    df_combined = df_combined[~df_combined.index.duplicated(keep='last')].sort_index()
-    
+    if not df_live.empty:
+        df_combined = df_combined[~df_combined.index.duplicated(keep='last')].sort_index()
+
     # Gib exakt den angeforderten Zeitraum zurück
-    return df_combined[df_combined.index >= start_dt]
+    mask = df_combined.index >= start_dt
+    if end_dt is not None:
+        mask &= df_combined.index <= end_dt
+    return df_combined[mask]
@@ -1,40 +1,47 @@
 # src/lbot/utils/decorators.py
+import inspect
 from functools import wraps
 from .guardian import Guardian, PreFlightCheckError
-from .telegram import send_message
+from .telegram import queue_message
 from .exchange import Exchange
 
 def run_with_guardian_checks(func):
     """
     Ein Decorator, der sicherstellt, dass die Guardian Pre-Flight-Checks
     bestanden werden, bevor die eigentliche Bot-Logik ausgeführt wird.
+    Die Argumente account, telegram_config, params, logger, model_path und scaler_path
+    werden über ihren Namen gefunden. Hat die Funktion einen Parameter `exchange`,
+    bekommt sie die bereits geprüfte Exchange-Instanz (kein zweites load_markets).
     """
+    signature = inspect.signature(func)
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        account = args[0]
-        telegram_config = args[1]
-        params = args[2]
-        logger = args[5]
-        model_path = args[6]
-        scaler_path = args[7]
+        arguments = signature.bind_partial(*args, **kwargs).arguments
+        account = arguments['account']
+        telegram_config = arguments['telegram_config']
+        params = arguments['params']
+        logger = arguments['logger']
         
-        account_name = account.get('name', 'Standard-Account')
+        account_name = account.get('name', 'Standard')
         symbol = params['market']['symbol']
         
         try:
             exchange = Exchange(account)
-            guardian = Guardian(exchange, params, model_path, scaler_path, logger)
+            guardian = Guardian(exchange, params, arguments['model_path'], arguments['scaler_path'], logger)
             guardian.run_pre_flight_checks()
+            if 'exchange' in signature.parameters:
+                kwargs['exchange'] = exchange
             return func(*args, **kwargs)
 
         except PreFlightCheckError as e:
             logger.critical(f"Guardian hat den Start für {account_name} ({symbol}) verhindert.")
             message = f"🚨 *L-Bot Gestoppt* ({symbol})\n\nGrund: Pre-Flight-Check fehlgeschlagen!\n\n_{e}_"
-            send_message(telegram_config.get('bot_token'), telegram_config.get('chat_id'), message)
+            queue_message(telegram_config.get('bot_token'), telegram_config.get('chat_id'), message)
         
         except Exception as e:
             logger.critical(f"Ein kritischer Fehler ist im Guardian-Decorator aufgetreten: {e}", exc_info=True)
             message = f"🚨 *Kritischer Systemfehler* im Guardian-Decorator für {symbol}."
-            send_message(telegram_config.get('bot_token'), telegram_config.get('chat_id'), message)
+            queue_message(telegram_config.get('bot_token'), telegram_config.get('chat_id'), message)
             
     return wrapper
@@ -0,0 +1,201 @@
+# src/lbot/utils/downloader.py
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+import ccxt
+import requests
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+CHECKPOINT_DIR = os.path.join(PROJECT_ROOT, 'data', 'history', '.downloads')
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+PAGE_LIMIT = 1000
+DEFAULT_WORKERS = 8
+MAX_PAGE_RETRIES = 4
+
+log = logging.getLogger("Downloader")
+log.setLevel(logging.INFO)
+
+
+class TokenBucket:
+    """ Thread-sicherer Token-Bucket: `rate` Requests pro Sekunde, Bursts bis `capacity`. """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def ohlcv_to_dataframe(data):
+    df = pd.DataFrame(data, columns=OHLCV_COLUMNS)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
+    df.set_index('timestamp', inplace=True)
+    return df
+
+
+class HistoryDownloader:
+    """
+    Lädt OHLCV-Historien für viele Symbol/Timeframe-Paare parallel herunter.
+    Alle Seiten (je `page_limit` Kerzen) aller Paare teilen sich einen Thread-Pool und
+    einen gemeinsamen Token-Bucket. Jede fertige Seite wird sofort als Chunk gespeichert
+    und im Checkpoint des Paares vermerkt, sodass ein abgebrochener Download dort weitermacht.
+    """
+    def __init__(self, exchange=None, max_workers=DEFAULT_WORKERS, requests_per_second=None,
+                 page_limit=PAGE_LIMIT, checkpoint_dir=CHECKPOINT_DIR, show_progress=True):
+        self.exchange = exchange or ccxt.binance({'enableRateLimit': False})
+        # Ohne Vorgabe: so viele Requests, wie das von ccxt hinterlegte Limit der Börse zulässt
+        if requests_per_second is None:
+            requests_per_second = 1000 / max(self.exchange.rateLimit, 1)
+        self.bucket = TokenBucket(requests_per_second, capacity=max_workers)
+        # Alle Worker-Threads teilen sich den Client: der Verbindungspool der Session muss für alle reichen,
+        # sonst verwirft urllib3 Verbindungen und jeder weitere Request baut eine neue auf
+        session = getattr(self.exchange, 'session', None)
+        if isinstance(session, requests.Session):
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.max_workers = max_workers
+        self.page_limit = page_limit
+        self.checkpoint_dir = checkpoint_dir
+        self.show_progress = show_progress
+        self._markets_loaded = False
+
+    # --- Checkpoints ---
+
+    def _pair_dir(self, symbol, timeframe):
+        safe_symbol = symbol.replace('/', '_').replace(':', '')
+        return os.path.join(self.checkpoint_dir, f"{safe_symbol}_{timeframe}")
+
+    def _load_checkpoint(self, pair_dir, since):
+        checkpoint_file = os.path.join(pair_dir, 'checkpoint.json')
+        if os.path.exists(checkpoint_file):
+            try:
+                with open(checkpoint_file, 'r') as f:
+                    checkpoint = json.load(f)
+                if checkpoint.get('since') == since:
+                    return set(checkpoint.get('done', []))
+            except (json.JSONDecodeError, OSError):
+                pass
+            # Checkpoint gehört zu einem anderen Download -> verwerfen
+            shutil.rmtree(pair_dir, ignore_errors=True)
+        return set()
+
+    def _save_checkpoint(self, pair_dir, since, done):
+        os.makedirs(pair_dir, exist_ok=True)
+        checkpoint_file = os.path.join(pair_dir, 'checkpoint.json')
+        tmp_file = checkpoint_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'since': since, 'done': sorted(done)}, f)
+        os.replace(tmp_file, checkpoint_file)
+
+    # --- Download ---
+
+    def _plan_pages(self, since, until, timeframe_ms):
+        page_span = self.page_limit * timeframe_ms
+        return list(range(since, until, page_span))
+
+    def _fetch_page(self, symbol, timeframe, page_start):
+        for attempt in range(MAX_PAGE_RETRIES):
+            self.bucket.acquire()
+            try:
+                return self.exchange.fetch_ohlcv(symbol, timeframe, since=page_start, limit=self.page_limit)
+            except (ccxt.NetworkError, ccxt.RateLimitExceeded) as e:
+                wait = 2 ** attempt
+                log.warning(f"Seite {page_start} für {symbol} ({timeframe}) fehlgeschlagen: {e}. Neuer Versuch in {wait}s...")
+                time.sleep(wait)
+        raise ccxt.NetworkError(f"Seite {page_start} für {symbol} ({timeframe}) nach {MAX_PAGE_RETRIES} Versuchen nicht ladbar.")
+
+    def download_many(self, jobs, until=None):
+        """
+        jobs: Liste von (symbol, timeframe, since_ms).
+        Gibt {(symbol, timeframe): DataFrame} mit allen neu geladenen Kerzen zurück
+        (None für Paare, deren Download nicht vollständig war).
+        """
+        if not self._markets_loaded:
+            self.exchange.load_markets()
+            self._markets_loaded = True
+        until = until or self.exchange.milliseconds()
+
+        tasks, pair_state = [], {}
+        for symbol, timeframe, since in jobs:
+            timeframe_ms = self.exchange.parse_timeframe(timeframe) * 1000
+            pair_dir = self._pair_dir(symbol, timeframe)
+            done = self._load_checkpoint(pair_dir, since)
+            pages = self._plan_pages(since, until, timeframe_ms)
+            # Nur Seiten, die vollständig in der Vergangenheit liegen, dürfen als erledigt gelten
+            last_closed = until - timeframe_ms
+            pair_state[(symbol, timeframe)] = {
+                'since': since, 'dir': pair_dir, 'done': done, 'pages': pages,
+                'failed': False, 'tail': {}, 'lock': threading.Lock(),
+                'complete_before': last_closed - self.page_limit * timeframe_ms,
+            }
+            tasks.extend((symbol, timeframe, page) for page in pages if page not in done)
+
+        pbar = tqdm(total=len(tasks), desc="  Download Seiten", unit=" Seiten", disable=not self.show_progress)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._fetch_page, symbol, timeframe, page): (symbol, timeframe, page) for symbol, timeframe, page in tasks}
+            for future in as_completed(futures):
+                symbol, timeframe, page = futures[future]
+                state = pair_state[(symbol, timeframe)]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    log.error(f"Download für {symbol} ({timeframe}) unvollständig: {e}")
+                    state['failed'] = True
+                    pbar.update(1)
+                    continue
+                with state['lock']:
+                    if page <= state['complete_before']:
+                        if data:
+                            os.makedirs(state['dir'], exist_ok=True)
+                            ohlcv_to_dataframe(data).to_parquet(os.path.join(state['dir'], f"{page}.parquet"))
+                        state['done'].add(page)
+                        self._save_checkpoint(state['dir'], state['since'], state['done'])
+                    elif data:
+                        state['tail'][page] = data
+                pbar.update(1)
+        pbar.close()
+
+        results = {}
+        for (symbol, timeframe), state in pair_state.items():
+            if state['failed']:
+                results[(symbol, timeframe)] = None
+                continue
+            results[(symbol, timeframe)] = self._assemble(state)
+            shutil.rmtree(state['dir'], ignore_errors=True)
+        return results
+
+    def download_pair(self, symbol, timeframe, since, until=None):
+        return self.download_many([(symbol, timeframe, since)], until=until)[(symbol, timeframe)]
+
+    def _assemble(self, state):
+        frames = []
+        for page in state['pages']:
+            chunk_file = os.path.join(state['dir'], f"{page}.parquet")
+            if os.path.exists(chunk_file):
+                frames.append(pd.read_parquet(chunk_file))
+            elif page in state['tail']:
+                frames.append(ohlcv_to_dataframe(state['tail'][page]))
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames)
+        return df[~df.index.duplicated(keep='last')].sort_index()
@@ -1,21 +1,45 @@
 # src/lbot/utils/exchange.py
 import ccxt
-import pandas as pd
+import time
 from time import sleep
+from .metrics import EXCHANGE_CALLS, EXCHANGE_LATENCY
 
 class Exchange:
-    def __init__(self, account_config):
+    def __init__(self, account_config, client=None):
+        """ client: optional ein fertiger ccxt-kompatibler Client (z.B. SimulatedExchange für Lasttests). """
         self.account = account_config
-        self.exchange = getattr(ccxt, 'bitget')({
+        self.exchange = client if client is not None else getattr(ccxt, 'bitget')({
             'apiKey': self.account.get('apiKey'),
             'secret': self.account.get('secret'),
             'password': self.account.get('password'),
             'options': { 'defaultType': 'swap' },
         })
-        self.markets = self.exchange.load_markets()
+        self.last_successful_call = None
+        self.markets = self._call('load_markets')
+
+    def _call(self, method, *args, **kwargs):
+        """ Ruft eine ccxt-Methode auf, misst die Latenz und merkt sich den Zeitpunkt des letzten erfolgreichen Aufrufs. """
+        start = time.perf_counter()
+        try:
+            result = getattr(self.exchange, method)(*args, **kwargs)
+        except Exception as e:
+            EXCHANGE_LATENCY.observe(time.perf_counter() - start, method=method)
+            EXCHANGE_CALLS.inc(method=method, result=type(e).__name__)
+            raise
+        EXCHANGE_LATENCY.observe(time.perf_counter() - start, method=method)
+        EXCHANGE_CALLS.inc(method=method, result='ok')
+        self.last_successful_call = time.time()
+        return result
+
+    def seconds_since_last_successful_call(self):
+        if self.last_successful_call is None:
+            return None
+        return time.time() - self.last_successful_call
 
     def _format_dataframe(self, data):
         """ Konvertiert die rohen OHLCV-Daten in einen formatierten DataFrame. """
+        # pandas erst hier: der Babysitter braucht nur Positionen und Orders und startet so schneller
+        import pandas as pd
         if not data:
             return pd.DataFrame()
         df = pd.DataFrame(data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
@@ -29,7 +53,7 @@ class Exchange:
         all_data = []
         while True:
             try:
-                data = self.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+                data = self._call('fetch_ohlcv', symbol, timeframe, since=since, limit=limit)
                 if not data:
                     break
                 all_data.extend(data)
@@ -43,39 +67,53 @@ class Exchange:
 
     def fetch_recent_ohlcv(self, symbol, timeframe, limit=100):
         """ Holt die letzten N Kerzen (für Live-Trading benötigt). """
-        data = self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+        data = self._call('fetch_ohlcv', symbol, timeframe, limit=limit)
         return self._format_dataframe(data)
 
+    def fetch_time(self):
+        return self._call('fetch_time')
+
     def fetch_ticker(self, symbol):
-        return self.exchange.fetch_ticker(symbol)
+        return self._call('fetch_ticker', symbol)
 
     def set_margin_mode(self, symbol, mode='isolated'):
-        try: self.exchange.set_margin_mode(mode, symbol)
+        try: self._call('set_margin_mode', mode, symbol)
         except Exception: pass
 
     def set_leverage(self, symbol, level=10):
-        self.exchange.set_leverage(level, symbol)
+        self._call('set_leverage', level, symbol)
 
     def create_market_order(self, symbol, side, amount, params={}):
-        return self.exchange.create_order(symbol, 'market', side, amount, params=params)
+        return self._call('create_order', symbol, 'market', side, amount, params=params)
+
+    def supports_attached_sl_tp(self):
+        return bool(self.exchange.has.get('createOrderWithTakeProfitAndStopLoss'))
+
+    def create_market_order_with_sl_tp(self, symbol, side, amount, stop_loss_price, take_profit_price):
+        """ Eröffnet eine Market-Order, an die SL und TP direkt an der Börse angehängt werden. """
+        order_params = {'stopLoss': {'triggerPrice': stop_loss_price}, 'takeProfit': {'triggerPrice': take_profit_price}}
+        return self._call('create_order', symbol, 'market', side, amount, params=order_params)
+
+    def fetch_order(self, order_id, symbol):
+        return self._call('fetch_order', order_id, symbol)
     
     def place_trigger_market_order(self, symbol, side, amount, trigger_price, params={}):
         order_params = {'triggerPrice': trigger_price, 'reduceOnly': params.get('reduceOnly', False)}
-        return self.exchange.create_order(symbol, 'market', side, amount, params=order_params)
+        return self._call('create_order', symbol, 'market', side, amount, params=order_params)
 
     def fetch_open_positions(self, symbol):
-        positions = self.exchange.fetch_positions([symbol])
+        positions = self._call('fetch_positions', [symbol])
         return [p for p in positions if p.get('contracts', 0.0) > 0.0]
 
     def fetch_open_trigger_orders(self, symbol):
-        return self.exchange.fetch_open_orders(symbol, params={'type': 'market', 'stop': True})
+        return self._call('fetch_open_orders', symbol, params={'type': 'market', 'stop': True})
     
     def cancel_trigger_order(self, order_id, symbol):
-        return self.exchange.cancel_order(order_id, symbol)
+        return self._call('cancel_order', order_id, symbol)
 
     def fetch_balance_usdt(self):
         try:
-            balance = self.exchange.fetch_balance()
+            balance = self._call('fetch_balance')
             if 'USDT' in balance: return balance['USDT']['free']
             elif 'total' in balance and 'USDT' in balance['total']: return balance['total']['USDT']
             else: return 0
@@ -0,0 +1,356 @@
+# src/lbot/utils/exchange_simulator.py
+import time
+import random
+import itertools
+import threading
+import ccxt
+import numpy as np
+import pandas as pd
+from .gap_index import timeframe_to_ms, index_to_ms
+from .history_store import HistoryStore
+from .resampler import resample_ohlcv
+
+DEFAULT_FEE_RATE = 0.0006
+DEFAULT_OHLCV_LIMIT = 100
+
+
+def synthetic_candles(n_bars, timeframe='1h', start='2024-01-01', start_price=100.0, volatility=0.01, seed=0):
+    """ Reproduzierbare OHLCV-Kerzen (geometrische Irrfahrt) für Tests ohne lokale Historie. """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, volatility, n_bars)
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = np.concatenate([[start_price], close[:-1]])
+    spread = np.abs(rng.normal(0, volatility / 2, n_bars)) * close
+    index = pd.date_range(start, periods=n_bars, freq=pd.Timedelta(milliseconds=timeframe_to_ms(timeframe)), tz='UTC', name='timestamp')
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.uniform(100, 1000, n_bars),
+    }, index=index)
+
+
+class SimulatedMarket:
+    """
+    Gemeinsame Marktdaten und Uhr für beliebig viele simulierte Konten.
+    Die Uhr steht immer auf dem Ende einer Kerze des Basis-Timeframes: sichtbar sind nur
+    abgeschlossene Kerzen, der letzte Schlusskurs ist der aktuelle Preis. Mit advance()
+    rückt die Uhr vor, dabei werden die Trigger-Orders aller Konten gegen High/Low geprüft.
+    """
+    def __init__(self, candles, timeframe, start_bar=300):
+        self.timeframe = timeframe
+        self.step_ms = timeframe_to_ms(timeframe)
+        self.candles = {symbol: df[['open', 'high', 'low', 'close', 'volume']] for symbol, df in candles.items()}
+        self._arrays = {symbol: (index_to_ms(df.index), df.to_numpy(dtype=float)) for symbol, df in self.candles.items()}
+        self._resampled = {}
+        first_open = min(ts[0] for ts, _ in self._arrays.values())
+        self.end_ms = max(ts[-1] for ts, _ in self._arrays.values()) + self.step_ms
+        self.now_ms = min(first_open + start_bar * self.step_ms, self.end_ms)
+        self.accounts = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_history_store(cls, symbols, timeframe, start=None, end=None, start_bar=300):
+        """ Lädt die Kerzen aus dem lokalen Store. Symbole in ccxt-Schreibweise (z.B. 'BTC/USDT:USDT'). """
+        candles = {}
+        for symbol in symbols:
+            df = HistoryStore(symbol.split(':')[0], timeframe).read(start=start, end=end)
+            if df.empty:
+                raise ValueError(f"Keine lokale Historie für {symbol} ({timeframe}).")
+            candles[symbol] = df
+        return cls(candles, timeframe, start_bar=start_bar)
+
+    @property
+    def symbols(self):
+        return list(self.candles)
+
+    def _position_of(self, symbol):
+        """ Index der letzten abgeschlossenen Basis-Kerze. """
+        timestamps, _ = self._arrays[symbol]
+        return int(np.searchsorted(timestamps, self.now_ms - self.step_ms, side='right')) - 1
+
+    def last_bar(self, symbol):
+        timestamps, values = self._arrays[symbol]
+        position = self._position_of(symbol)
+        if position < 0:
+            return None
+        return timestamps[position], values[position]
+
+    def last_price(self, symbol):
+        bar = self.last_bar(symbol)
+        return None if bar is None else float(bar[1][3])
+
+    def ohlcv(self, symbol, timeframe, since=None, limit=None):
+        if timeframe == self.timeframe:
+            timestamps, values = self._arrays[symbol]
+            step = self.step_ms
+        else:
+            if (symbol, timeframe) not in self._resampled:
+                df = resample_ohlcv(self.candles[symbol], self.timeframe, timeframe)
+                self._resampled[(symbol, timeframe)] = (index_to_ms(df.index), df.to_numpy(dtype=float))
+            timestamps, values = self._resampled[(symbol, timeframe)]
+            step = timeframe_to_ms(timeframe)
+        closed_end = int(np.searchsorted(timestamps, self.now_ms - step, side='right'))
+        if since is not None:
+            start = int(np.searchsorted(timestamps, since, side='left'))
+            end = min(closed_end, start + (limit or DEFAULT_OHLCV_LIMIT))
+        else:
+            end = closed_end
+            start = max(0, end - (limit or DEFAULT_OHLCV_LIMIT))
+        return [[int(ts)] + row.tolist() for ts, row in zip(timestamps[start:end], values[start:end])]
+
+    def advance(self, bars=1):
+        """ Rückt die Uhr um `bars` Basis-Kerzen vor. Gibt False zurück, wenn die Daten zu Ende sind. """
+        for _ in range(bars):
+            if self.now_ms >= self.end_ms:
+                return False
+            with self.lock:
+                self.now_ms += self.step_ms
+            for account in list(self.accounts):
+                account._process_triggers()
+        return True
+
+
+class SimulatedExchange:
+    """
+    Lokales Konto mit der ccxt-Oberfläche, die `Exchange` nutzt (fetch_ohlcv, fetch_ticker,
+    create_order inkl. Trigger und angehängtem SL/TP, fetch_positions, fetch_open_orders,
+    fetch_balance, fetch_time, ...). Market-Orders werden sofort zum letzten Schlusskurs
+    (plus Slippage) gefüllt, Trigger-Orders beim Vorrücken der Uhr gegen High/Low geprüft.
+    Latenz und Fehler werden pro Aufruf aus einem festen Seed gezogen und sind damit bei
+    gleicher Aufrufreihenfolge reproduzierbar.
+    """
+    id = 'simulator'
+    rateLimit = 0
+
+    def __init__(self, market, start_balance=10000.0, latency_ms=0.0, latency_jitter_ms=0.0,
+                 error_rate=0.0, error_rates=None, fee_rate=DEFAULT_FEE_RATE, slippage_pct=0.0,
+                 supports_attached_sl_tp=True, tick_size=None, seed=0):
+        self.sim_market = market
+        self.cash = float(start_balance)
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.error_rates = error_rates or {}
+        self.fee_rate = fee_rate
+        self.slippage_pct = slippage_pct
+        self.tick_size = tick_size
+        self.has = {'createOrderWithTakeProfitAndStopLoss': supports_attached_sl_tp, 'fetchPositions': True}
+        self.rng = random.Random(seed)
+        self.lock = threading.RLock()
+        self.orders = {}
+        self.positions = {}
+        self.leverage = {}
+        self.markets = None
+        self.call_counts = {}
+        self.trades_closed = 0
+        self._ids = itertools.count(1)
+        market.accounts.append(self)
+
+    # --- Netzwerk-Simulation ---
+
+    def _io(self, method):
+        with self.lock:
+            self.call_counts[method] = self.call_counts.get(method, 0) + 1
+            delay = max(0.0, self.latency_ms + self.rng.uniform(-self.latency_jitter_ms, self.latency_jitter_ms)) / 1000
+            failed = self.rng.random() < self.error_rates.get(method, self.error_rate)
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise ccxt.NetworkError(f"simulator: {method} fehlgeschlagen (injizierter Fehler)")
+
+    # --- Marktdaten ---
+
+    def load_markets(self, reload=False, params={}):
+        self._io('load_markets')
+        if self.markets is None or reload:
+            self.markets = {symbol: self._build_market(symbol) for symbol in self.sim_market.symbols}
+        return self.markets
+
+    def _build_market(self, symbol):
+        base, quote = symbol.split(':')[0].split('/')
+        price = self.sim_market.last_price(symbol) or 1.0
+        tick = self.tick_size or 10 ** (np.floor(np.log10(price)) - 4)
+        return {'id': symbol.replace('/', '').replace(':', '_'), 'symbol': symbol, 'base': base, 'quote': quote,
+                'contract': True, 'linear': True, 'precision': {'price': float(tick), 'amount': 1e-4}}
+
+    def market(self, symbol):
+        if self.markets is None:
+            self.markets = {s: self._build_market(s) for s in self.sim_market.symbols}
+        if symbol not in self.markets:
+            raise ccxt.BadSymbol(f"simulator: unbekanntes Symbol {symbol}")
+        return self.markets[symbol]
+
+    def parse_timeframe(self, timeframe):
+        return timeframe_to_ms(timeframe) // 1000
+
+    def milliseconds(self):
+        return self.sim_market.now_ms
+
+    def fetch_time(self, params={}):
+        self._io('fetch_time')
+        return self.sim_market.now_ms
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        self._io('fetch_ohlcv')
+        self.market(symbol)
+        return self.sim_market.ohlcv(symbol, timeframe, since, limit)
+
+    def fetch_ticker(self, symbol, params={}):
+        self._io('fetch_ticker')
+        self.market(symbol)
+        price = self.sim_market.last_price(symbol)
+        return {'symbol': symbol, 'timestamp': self.sim_market.now_ms, 'last': price, 'bid': price, 'ask': price, 'close': price}
+
+    # --- Konto ---
+
+    def set_leverage(self, leverage, symbol=None, params={}):
+        self._io('set_leverage')
+        self.leverage[symbol] = leverage
+        return {'symbol': symbol, 'leverage': leverage}
+
+    def set_margin_mode(self, margin_mode, symbol=None, params={}):
+        self._io('set_margin_mode')
+        return {'symbol': symbol, 'marginMode': margin_mode}
+
+    def _used_margin(self):
+        return sum(abs(p['contracts']) * p['entryPrice'] / self.leverage.get(symbol, 1) for symbol, p in self.positions.items())
+
+    def _unrealized_pnl(self, symbol, position):
+        price = self.sim_market.last_price(symbol)
+        direction = 1 if position['side'] == 'long' else -1
+        return direction * (price - position['entryPrice']) * position['contracts']
+
+    def fetch_balance(self, params={}):
+        self._io('fetch_balance')
+        with self.lock:
+            used = self._used_margin()
+            total = self.cash + sum(self._unrealized_pnl(s, p) for s, p in self.positions.items())
+            free = self.cash - used
+        usdt = {'free': free, 'used': used, 'total': total}
+        return {'USDT': usdt, 'free': {'USDT': free}, 'used': {'USDT': used}, 'total': {'USDT': total}}
+
+    def fetch_positions(self, symbols=None, params={}):
+        self._io('fetch_positions')
+        with self.lock:
+            return [{
+                'symbol': symbol, 'side': p['side'], 'contracts': p['contracts'], 'entryPrice': p['entryPrice'],
+                'leverage': self.leverage.get(symbol, 1), 'notional': p['contracts'] * self.sim_market.last_price(symbol),
+                'unrealizedPnl': self._unrealized_pnl(symbol, p),
+            } for symbol, p in self.positions.items() if symbols is None or symbol in symbols]
+
+    # --- Orders ---
+
+    def _new_order(self, symbol, order_type, side, amount, trigger_price=None, reduce_only=False, parent=None):
+        order_id = str(next(self._ids))
+        order = {'id': order_id, 'symbol': symbol, 'type': order_type, 'side': side, 'amount': float(amount),
+                 'filled': 0.0, 'remaining': float(amount), 'price': None, 'average': None, 'status': 'open',
+                 'triggerPrice': trigger_price, 'reduceOnly': reduce_only, 'timestamp': self.sim_market.now_ms,
+                 'info': {'parent': parent}}
+        if trigger_price is not None:
+            # Richtung relativ zum Preis bei Auftragserteilung: darunter = Stop (fällt), darüber = Ausbruch (steigt)
+            order['info']['trigger_direction'] = 'down' if trigger_price <= self.sim_market.last_price(symbol) else 'up'
+        self.orders[order_id] = order
+        return order
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self._io('create_order')
+        self.market(symbol)
+        if type != 'market':
+            raise ccxt.NotSupported("simulator: nur Market- und Trigger-Market-Orders werden unterstützt")
+        with self.lock:
+            trigger_price = params.get('triggerPrice')
+            if trigger_price is not None:
+                order = self._new_order(symbol, type, side, amount, trigger_price, params.get('reduceOnly', False))
+                return dict(order)
+            order = self._new_order(symbol, type, side, amount, reduce_only=params.get('reduceOnly', False))
+            self._fill(order, self.sim_market.last_price(symbol))
+            # Angehängtes SL/TP: zwei verknüpfte Trigger, die sich gegenseitig aufheben (OCO)
+            close_side = 'sell' if side == 'buy' else 'buy'
+            for key in ('stopLoss', 'takeProfit'):
+                if params.get(key):
+                    self._new_order(symbol, type, close_side, order['filled'], params[key]['triggerPrice'], True, parent=order['id'])
+            return dict(order)
+
+    def _fill(self, order, price):
+        slip = 1 + self.slippage_pct / 100 if order['side'] == 'buy' else 1 - self.slippage_pct / 100
+        fill_price = price * slip
+        amount = order['amount']
+        position = self.positions.get(order['symbol'])
+        if order['reduceOnly']:
+            if position is None or (position['side'] == 'long') != (order['side'] == 'sell'):
+                order['status'] = 'canceled'
+                return
+            amount = min(amount, position['contracts'])
+        self.cash -= amount * fill_price * self.fee_rate
+        self._apply_to_position(order['symbol'], order['side'], amount, fill_price)
+        order.update(filled=amount, remaining=order['amount'] - amount, average=fill_price, price=fill_price, status='closed')
+
+    def _apply_to_position(self, symbol, side, amount, price):
+        position = self.positions.get(symbol)
+        order_side = 'long' if side == 'buy' else 'short'
+        if position is None:
+            self.positions[symbol] = {'side': order_side, 'contracts': amount, 'entryPrice': price}
+            return
+        if position['side'] == order_side:
+            total = position['contracts'] + amount
+            position['entryPrice'] = (position['entryPrice'] * position['contracts'] + price * amount) / total
+            position['contracts'] = total
+            return
+        closed = min(amount, position['contracts'])
+        direction = 1 if position['side'] == 'long' else -1
+        self.cash += direction * (price - position['entryPrice']) * closed
+        position['contracts'] -= closed
+        if position['contracts'] <= 1e-12:
+            del self.positions[symbol]
+            self.trades_closed += 1
+            self._cancel_reduce_only(symbol)
+            if amount > closed:
+                self.positions[symbol] = {'side': order_side, 'contracts': amount - closed, 'entryPrice': price}
+
+    def _cancel_reduce_only(self, symbol):
+        for order in self.orders.values():
+            if order['symbol'] == symbol and order['status'] == 'open' and order['reduceOnly']:
+                order['status'] = 'canceled'
+
+    def _process_triggers(self):
+        """ Prüft alle offenen Trigger-Orders gegen die zuletzt abgeschlossene Kerze. """
+        with self.lock:
+            for order in list(self.orders.values()):
+                if order['status'] != 'open' or order['triggerPrice'] is None:
+                    continue
+                bar = self.sim_market.last_bar(order['symbol'])
+                if bar is None:
+                    continue
+                _, (open_, high, low, close, _) = bar
+                trigger = order['triggerPrice']
+                # Eröffnet die Kerze bereits jenseits des Triggers (Gap), wird zum Eröffnungskurs gefüllt
+                if order['info']['trigger_direction'] == 'down' and low <= trigger:
+                    self._fill(order, min(trigger, open_))
+                elif order['info']['trigger_direction'] == 'up' and high >= trigger:
+                    self._fill(order, max(trigger, open_))
+
+    def fetch_order(self, id, symbol=None, params={}):
+        self._io('fetch_order')
+        with self.lock:
+            if id not in self.orders:
+                raise ccxt.OrderNotFound(f"simulator: Order {id} nicht gefunden")
+            return dict(self.orders[id])
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        self._io('fetch_open_orders')
+        stop_only = params.get('stop', False)
+        with self.lock:
+            return [dict(o) for o in self.orders.values()
+                    if o['status'] == 'open' and (symbol is None or o['symbol'] == symbol)
+                    and (not stop_only or o['triggerPrice'] is not None)]
+
+    def cancel_order(self, id, symbol=None, params={}):
+        self._io('cancel_order')
+        with self.lock:
+            order = self.orders.get(id)
+            if order is None or order['status'] != 'open':
+                raise ccxt.OrderNotFound(f"simulator: Order {id} nicht offen")
+            order['status'] = 'canceled'
+            return dict(order)
@@ -0,0 +1,92 @@
+# src/lbot/utils/gap_index.py
+import numpy as np
+
+_UNIT_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+MAX_DUPLICATE_RANGES = 1000
+# Wochenkerzen öffnen (wie bei Binance) montags 00:00 UTC; die Unix-Epoche 1970-01-01 war ein Donnerstag
+_BUCKET_OFFSET_MS = {'w': 4 * 86_400_000}
+
+def timeframe_to_ms(timeframe):
+    unit = timeframe[-1]
+    if unit not in _UNIT_MS:
+        raise ValueError(f"Timeframe '{timeframe}' hat keine feste Kerzenlänge.")
+    return int(timeframe[:-1]) * _UNIT_MS[unit]
+
+def bucket_origin_ms(timeframe):
+    """ Beginn eines beliebigen Buckets des Timeframes in ms seit der Epoche (0 außer bei Wochen: Montag, 1970-01-05). """
+    return _BUCKET_OFFSET_MS.get(timeframe[-1], 0)
+
+def index_to_ms(index):
+    """ DatetimeIndex -> int64-Array in Millisekunden (unabhängig von der internen Auflösung). """
+    return index.as_unit('ms').asi8
+
+def merge_ranges(ranges, step):
+    """ Sortiert [start, end]-Bereiche (inklusive) und verschmilzt überlappende oder direkt angrenzende. """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + step:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([int(start), int(end)])
+    return merged
+
+def find_missing(timestamps_ms, step):
+    """ Fehlende Kerzen zwischen aufeinanderfolgenden Zeitstempeln als [start, end]-Bereiche. """
+    if len(timestamps_ms) < 2:
+        return []
+    diffs = np.diff(timestamps_ms)
+    holes = np.nonzero(diffs > step)[0]
+    return [[int(timestamps_ms[i] + step), int(timestamps_ms[i + 1] - step)] for i in holes]
+
+def find_duplicate_ranges(timestamps_ms, step):
+    """ Zeitstempel, die im Delta mehrfach vorkommen, zusammengefasst zu Bereichen. """
+    if len(timestamps_ms) < 2:
+        return []
+    values, counts = np.unique(timestamps_ms, return_counts=True)
+    duplicated = values[counts > 1]
+    return merge_ranges([[int(ts), int(ts)] for ts in duplicated], step)
+
+def clip_outside(ranges, window_start, window_end, step):
+    """ Schneidet den Bereich [window_start, window_end] aus allen Lücken heraus. """
+    clipped = []
+    for start, end in ranges:
+        if end < window_start or start > window_end:
+            clipped.append([start, end])
+            continue
+        if start < window_start:
+            clipped.append([start, window_start - step])
+        if end > window_end:
+            clipped.append([window_end + step, end])
+    return clipped
+
+def update_gap_index(gaps, step, touched_ms, previous_end_ms, next_start_ms):
+    """
+    Aktualisiert den Gap-Index inkrementell für einen neu geschriebenen Bereich.
+    touched_ms:      sortierte Zeitstempel aller neu geschriebenen Partitionen (vollständig)
+    previous_end_ms: letzter Zeitstempel vor diesem Bereich (None = Beginn der Historie)
+    next_start_ms:   erster Zeitstempel nach diesem Bereich (None = Ende der Historie)
+    Lücken außerhalb des Bereichs bleiben unverändert, innerhalb werden sie neu bestimmt.
+    """
+    gaps = dict(gaps or {})
+    window_start, window_end = int(touched_ms[0]), int(touched_ms[-1])
+    missing = clip_outside(gaps.get('missing', []), window_start, window_end, step)
+    missing += find_missing(touched_ms, step)
+    if previous_end_ms is not None and window_start - previous_end_ms > step:
+        missing.append([int(previous_end_ms + step), window_start - step])
+    if next_start_ms is not None and next_start_ms - window_end > step:
+        missing.append([window_end + step, int(next_start_ms - step)])
+    gaps['missing'] = merge_ranges(missing, step)
+    gaps['step_ms'] = step
+    gaps['missing_candles'] = sum((end - start) // step + 1 for start, end in gaps['missing'])
+    return gaps
+
+def record_duplicates(gaps, step, duplicate_ms):
+    """ Vermerkt doppelt gelieferte Kerzen (beim Schreiben wurde jeweils die letzte behalten). """
+    gaps = dict(gaps or {})
+    duplicates = merge_ranges(gaps.get('duplicates', []) + find_duplicate_ranges(duplicate_ms, step), step)
+    gaps['duplicates'] = duplicates[-MAX_DUPLICATE_RANGES:]
+    return gaps
+
+def ranges_in_window(ranges, start_ms=None, end_ms=None):
+    return [[s, e] for s, e in ranges
+            if (start_ms is None or e >= start_ms) and (end_ms is None or s <= end_ms)]
@@ -1,18 +1,79 @@
 # src/lbot/utils/guardian.py
 import os
+import time
 import hashlib
 import json
+import threading
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+CHECK_CACHE_FILE = os.path.join(PROJECT_ROOT, 'artifacts', 'db', 'guardian_cache.json')
+
+# Gültigkeitsdauer (Sekunden) eines bestandenen Checks, solange sich seine Eingaben nicht ändern
+CHECK_TTLS = {
+    '_check_config_sanity': 24 * 3600,
+    '_check_risk_parameters': 24 * 3600,
+    '_check_artifacts_exist': 3600,
+    '_check_exchange_connection': 60,
+}
 
 class PreFlightCheckError(Exception):
     pass
 
+def _hash_file(path, chunk_size=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+class CheckCache:
+    """ Persistenter Cache bestandener Checks (prozessübergreifend, da jeder Lauf ein eigener Prozess ist). """
+    def __init__(self, cache_file=CHECK_CACHE_FILE):
+        self.cache_file = cache_file
+        self.entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_file): return {}
+        try:
+            with open(self.cache_file, 'r') as f: return json.load(f)
+        except (json.JSONDecodeError, OSError): return {}
+
+    def get(self, key, ttl):
+        entry = self.entries.get(key)
+        if entry and time.time() - entry.get('checked_at', 0) <= ttl:
+            return entry
+        return None
+
+    def put(self, key, **fields):
+        self.entries[key] = {'checked_at': time.time(), **fields}
+
+    def prune(self, now=None):
+        """
+        Entfernt abgelaufene Einträge. Die Schlüssel enthalten Parameter-Hash bzw. Modellpfad und
+        würden sonst mit jeder Konfiguration und Registry-Version weiter wachsen.
+        """
+        now = now or time.time()
+        expired = [key for key, entry in self.entries.items() if key.split(':', 1)[0] not in CHECK_TTLS
+                   or now - entry.get('checked_at', 0) > CHECK_TTLS[key.split(':', 1)[0]]]
+        for key in expired:
+            del self.entries[key]
+
+    def save(self):
+        self.prune()
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        # Pro Thread eine eigene Temp-Datei: run.py prüft mehrere Konten parallel
+        tmp_file = f"{self.cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w') as f: json.dump(self.entries, f, indent=4)
+        os.replace(tmp_file, self.cache_file)
+
 class Guardian:
-    def __init__(self, exchange, params, model_path, scaler_path, logger):
+    def __init__(self, exchange, params, model_path, scaler_path, logger, cache=None):
         self.exchange = exchange
         self.params = params
         self.model_path = model_path
         self.scaler_path = scaler_path
         self.logger = logger
+        self.cache = cache if cache is not None else CheckCache()
         self.checklist = [
             self._check_config_sanity,
             self._check_risk_parameters,
@@ -25,37 +86,82 @@ class Guardian:
         for check_function in self.checklist:
             check_name = check_function.__name__
             try:
-                check_function()
-                self.logger.info(f"  ✅ Check bestanden: {check_name}")
+                if check_function():
+                    self.logger.info(f"  ✅ Check bestanden (Cache): {check_name}")
+                else:
+                    self.logger.info(f"  ✅ Check bestanden: {check_name}")
             except Exception as e:
                 self.logger.critical(f"  ❌ CHECK FEHLGESCHLAGEN: {check_name} -> {e}")
                 raise PreFlightCheckError(f"Guardian-Check '{check_name}' fehlgeschlagen: {e}")
+        try:
+            self.cache.save()
+        except OSError as e:
+            self.logger.warning(f"Guardian-Cache konnte nicht gespeichert werden: {e}")
         self.logger.info("Guardian: Alle Checks erfolgreich bestanden.")
         return True
 
+    # Jeder Check gibt True zurück, wenn das Ergebnis aus dem Cache stammt.
+
+    def _params_hash(self):
+        return hashlib.sha256(json.dumps(self.params, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _cached_by_params(self, check_name):
+        key = f"{check_name}:{self._params_hash()}"
+        return key, self.cache.get(key, CHECK_TTLS[check_name]) is not None
+
     def _check_config_sanity(self):
+        key, cached = self._cached_by_params('_check_config_sanity')
+        if cached: return True
         required_keys = ['market', 'strategy', 'risk', 'behavior']
-        for key in required_keys:
-            if key not in self.params:
-                raise ValueError(f"Sektion '{key}' fehlt in der Konfiguration.")
+        for key_name in required_keys:
+            if key_name not in self.params:
+                raise ValueError(f"Sektion '{key_name}' fehlt in der Konfiguration.")
+        self.cache.put(key)
+        return False
 
     def _check_risk_parameters(self):
+        key, cached = self._cached_by_params('_check_risk_parameters')
+        if cached: return True
         risk_pct = self.params['risk'].get('risk_per_trade_pct', 0)
         leverage = self.params['risk'].get('leverage', 0)
         if not 0 < risk_pct <= 10:
             raise ValueError(f"risk_per_trade_pct ({risk_pct}%) ist außerhalb des sicheren Bereichs (0-10%).")
         if not 0 < leverage <= 25:
             raise ValueError(f"leverage ({leverage}x) ist außerhalb des sicheren Bereichs (1-25x).")
+        self.cache.put(key)
+        return False
 
     def _check_artifacts_exist(self):
-        if not os.path.exists(self.model_path):
-            raise FileNotFoundError(f"Modelldatei nicht gefunden: {self.model_path}")
-        if not os.path.exists(self.scaler_path):
-            raise FileNotFoundError(f"Scaler-Datei nicht gefunden: {self.scaler_path}")
+        key = f"_check_artifacts_exist:{self.model_path}:{self.scaler_path}"
+        stats = {}
+        for path, label in ((self.model_path, 'Modelldatei'), (self.scaler_path, 'Scaler-Datei')):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{label} nicht gefunden: {path}")
+            stats[path] = [os.path.getsize(path), os.path.getmtime(path)]
+
+        # Nur neu hashen, wenn sich Größe oder mtime geändert haben. Legacy-Dateien (leere Registry)
+        # werden an Ort und Stelle überschrieben, der Pfad allein identifiziert das Modell also nicht.
+        previous = self.cache.entries.get(key, {})
+        if previous.get('stats') == stats and previous.get('hashes'):
+            hashes = previous['hashes']
+        else:
+            hashes = {path: _hash_file(path) for path in stats}
+            if previous.get('hashes') and previous['hashes'] != hashes:
+                self.logger.info("Guardian: Modell- oder Scaler-Datei wurde seit der letzten Prüfung verändert.")
+        # Ein bestandener Check gilt nur für denselben Inhalt
+        if previous.get('hashes') == hashes and self.cache.get(key, CHECK_TTLS['_check_artifacts_exist']) is not None:
+            return True
+        self.cache.put(key, stats=stats, hashes=hashes)
+        return False
 
     def _check_exchange_connection(self):
+        # Ein kürzlich erfolgreicher Aufruf des offenen Clients (z.B. load_markets) genügt als Beleg
+        age = self.exchange.seconds_since_last_successful_call()
+        if age is not None and age <= CHECK_TTLS['_check_exchange_connection']:
+            return True
         try:
-            if not self.exchange.exchange.fetch_time():
+            if not self.exchange.fetch_time():
                 raise ConnectionError("Server-Zeit konnte nicht abgerufen werden.")
         except Exception as e:
             raise ConnectionError(f"Verbindung zur Börse fehlgeschlagen: {e}")
+        return False
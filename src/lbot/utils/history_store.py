@@ -0,0 +1,306 @@
+# src/lbot/utils/history_store.py
+import os
+import json
+import time
+import fcntl
+import logging
+from contextlib import contextmanager
+import pandas as pd
+import pyarrow.dataset as ds
+from .gap_index import timeframe_to_ms, index_to_ms, update_gap_index, record_duplicates, find_missing, ranges_in_window
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+HISTORY_DIR = os.path.join(PROJECT_ROOT, 'data', 'history')
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = '.write.lock'
+MANIFEST_VERSION = 1
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+# Kleine Row-Groups, damit Zeitfilter über die Min/Max-Statistik auch innerhalb eines Monats greifen
+ROW_GROUP_SIZE = 2048
+
+log = logging.getLogger("HistoryStore")
+log.setLevel(logging.INFO)
+
+def _to_utc(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+def _to_ms(ts):
+    return int(_to_utc(ts).timestamp() * 1000)
+
+def _from_ms(ms):
+    return pd.to_datetime(ms, unit='ms', utc=True)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _tmp_owner_pid(file_name):
+    """ Temp-Dateien heißen <Ziel>.<pid>.tmp; liefert die pid des Schreibers (None bei fremdem Muster). """
+    parts = file_name.split('.')
+    return int(parts[-2]) if len(parts) >= 3 and parts[-2].isdigit() else None
+
+def _atomic_write_json(path, data):
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_file, path)
+
+class HistoryStore:
+    """
+    Partitionierte OHLCV-Historie: ein Parquet-File pro Kalendermonat plus ein kleines
+    Manifest mit den Zeitbereichen. Ein Append schreibt nur die Monate neu, die vom
+    Delta betroffen sind. Neue Partitionen werden unter einem neuen Dateinamen
+    geschrieben und erst durch das atomare Ersetzen des Manifests sichtbar, ein
+    Absturz mitten im Schreiben lässt die bisherigen Daten also unberührt.
+    Geschrieben wird nur aus Download/Repair; parallele Schreiber werden über einen
+    Datei-Lock (flock auf .write.lock) serialisiert, Leser brauchen keinen Lock.
+    """
+    def __init__(self, symbol, timeframe, base_dir=HISTORY_DIR):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        safe_symbol = symbol.split(':')[0].replace('/', '_')
+        self.name = f"{safe_symbol}_{timeframe}"
+        self.dir = os.path.join(base_dir, self.name)
+        self.manifest_path = os.path.join(self.dir, MANIFEST_FILE)
+        self.legacy_file = os.path.join(base_dir, f"{self.name}.parquet")
+        self._manifest = None
+        self._lock_depth = 0
+        self._migrate_legacy_file()
+
+    # --- Manifest ---
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r') as f:
+                    self._manifest = json.load(f)
+            else:
+                self._manifest = {'version': MANIFEST_VERSION, 'symbol': self.symbol, 'timeframe': self.timeframe, 'partitions': {}}
+        return self._manifest
+
+    def reload(self):
+        self._manifest = None
+        return self.manifest
+
+    def exists(self):
+        return bool(self.manifest['partitions'])
+
+    def first_timestamp(self):
+        partitions = self.manifest['partitions']
+        if not partitions: return None
+        return _from_ms(min(p['start'] for p in partitions.values()))
+
+    def last_timestamp(self):
+        partitions = self.manifest['partitions']
+        if not partitions: return None
+        return _from_ms(max(p['end'] for p in partitions.values()))
+
+    @contextmanager
+    def write_lock(self):
+        """
+        Exklusiver Schreib-Lock über Prozesse hinweg (reentrant innerhalb der Instanz). Nach dem
+        Erwerb wird das Manifest neu gelesen, damit Änderungen anderer Schreiber erhalten bleiben.
+        """
+        if self._lock_depth:
+            self._lock_depth += 1
+            try: yield
+            finally: self._lock_depth -= 1
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        with open(os.path.join(self.dir, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._lock_depth = 1
+            try:
+                self.reload()
+                yield
+            finally:
+                self._lock_depth = 0
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def update_meta(self, **fields):
+        """ Schreibt zusätzliche Metadaten (z.B. 'requested_from') atomar ins Manifest. """
+        with self.write_lock():
+            manifest = dict(self.manifest, **fields)
+            _atomic_write_json(self.manifest_path, manifest)
+            self._manifest = manifest
+
+    def num_rows(self):
+        return sum(p['rows'] for p in self.manifest['partitions'].values())
+
+    def _migrate_legacy_file(self):
+        """ Übernimmt eine alte Einzeldatei ({symbol}_{timeframe}.parquet) einmalig in den Store. """
+        if not os.path.exists(self.legacy_file) or os.path.exists(self.manifest_path):
+            return
+        log.info(f"Migriere {self.legacy_file} in partitioniertes Format...")
+        df_legacy = pd.read_parquet(self.legacy_file)
+        if not df_legacy.empty:
+            self.append(df_legacy)
+        os.remove(self.legacy_file)
+
+    # --- Schreiben ---
+
+    def append(self, df_new):
+        """ Fügt neue Kerzen hinzu. Kosten wachsen mit dem Delta, nicht mit der Historienlänge. """
+        if df_new is None or df_new.empty:
+            return 0
+        with self.write_lock():
+            duplicate_ms = index_to_ms(df_new.index) if df_new.index.has_duplicates else None
+            df_new = df_new[~df_new.index.duplicated(keep='last')].sort_index()
+            gaps = self.gap_index() if self.exists() else {}
+            partitions = dict(self.manifest['partitions'])
+            obsolete_files = []
+            touched = {}
+            month_keys = df_new.index.strftime('%Y-%m')
+
+            for month_key, df_month in df_new.groupby(month_keys):
+                existing = partitions.get(month_key)
+                if existing:
+                    old_path = os.path.join(self.dir, existing['file'])
+                    df_month = pd.concat([pd.read_parquet(old_path), df_month])
+                    df_month = df_month[~df_month.index.duplicated(keep='last')].sort_index()
+                    obsolete_files.append(old_path)
+                file_name = f"{month_key}_{time.time_ns()}.parquet"
+                tmp_path = os.path.join(self.dir, f".{file_name}.{os.getpid()}.tmp")
+                df_month.to_parquet(tmp_path, row_group_size=ROW_GROUP_SIZE)
+                os.replace(tmp_path, os.path.join(self.dir, file_name))
+                partitions[month_key] = {
+                    'file': file_name,
+                    'start': _to_ms(df_month.index[0]),
+                    'end': _to_ms(df_month.index[-1]),
+                    'rows': len(df_month),
+                }
+                touched[month_key] = index_to_ms(df_month.index)
+
+            partitions = dict(sorted(partitions.items()))
+            manifest = dict(self.manifest, partitions=partitions)
+            if self.step_ms is not None:
+                manifest['gaps'] = self._update_gaps(gaps, partitions, touched, duplicate_ms)
+            _atomic_write_json(self.manifest_path, manifest)
+            self._manifest = manifest
+            for path in obsolete_files:
+                try: os.remove(path)
+                except OSError: pass
+            self._remove_orphans()
+            return len(df_new)
+
+    # --- Gap-Index ---
+
+    @property
+    def step_ms(self):
+        try:
+            return timeframe_to_ms(self.timeframe)
+        except ValueError:
+            return None
+
+    def _update_gaps(self, gaps, partitions, touched, duplicate_ms):
+        """ Bestimmt die Lücken nur innerhalb der neu geschriebenen Monate neu. """
+        keys = list(partitions)
+        for month_key, touched_ms in touched.items():
+            position = keys.index(month_key)
+            previous_end = partitions[keys[position - 1]]['end'] if position > 0 else None
+            next_start = partitions[keys[position + 1]]['start'] if position + 1 < len(keys) else None
+            gaps = update_gap_index(gaps, self.step_ms, touched_ms, previous_end, next_start)
+        if duplicate_ms is not None:
+            gaps = record_duplicates(gaps, self.step_ms, duplicate_ms)
+        return gaps
+
+    def gap_index(self):
+        """ Liefert den Gap-Index; für ältere Stores ohne Index wird er einmalig aufgebaut. """
+        if 'gaps' not in self.manifest and self.exists() and self.step_ms is not None:
+            self.rebuild_gap_index()
+        return self.manifest.get('gaps', {})
+
+    def rebuild_gap_index(self):
+        step = self.step_ms
+        timestamps = self.read_timestamps()
+        missing = find_missing(timestamps, step)
+        gaps = {'step_ms': step, 'missing': missing, 'duplicates': [],
+                'missing_candles': sum((end - start) // step + 1 for start, end in missing)}
+        self.update_meta(gaps=gaps)
+        return gaps
+
+    def missing_ranges(self, start=None, end=None):
+        """ Fehlende Kerzenbereiche [start, end] als Timestamps, optional auf ein Fenster begrenzt. """
+        start_ms = _to_ms(start) if start is not None else None
+        end_ms = _to_ms(end) if end is not None else None
+        return [(_from_ms(s), _from_ms(e)) for s, e in ranges_in_window(self.gap_index().get('missing', []), start_ms, end_ms)]
+
+    def is_complete(self, start=None, end=None):
+        """ Schneller Vollständigkeits-Check über den Gap-Index, ohne die Daten zu lesen. """
+        gaps = self.gap_index()
+        if not gaps.get('missing'):
+            return True
+        if start is None and end is None:
+            return False
+        return not self.missing_ranges(start, end)
+
+    def _remove_orphans(self):
+        """
+        Entfernt Dateien aus abgebrochenen Schreibvorgängen, die nie ins Manifest gelangt sind.
+        Läuft unter dem Schreib-Lock; Temp-Dateien werden nur entfernt, wenn ihr Schreiber
+        (pid im Namen) dieser Prozess ist oder nicht mehr läuft.
+        """
+        referenced = {p['file'] for p in self.manifest['partitions'].values()}
+        for file_name in os.listdir(self.dir):
+            if file_name.endswith('.tmp'):
+                owner = _tmp_owner_pid(file_name)
+                orphaned = owner is not None and (owner == os.getpid() or not _pid_alive(owner))
+            else:
+                orphaned = file_name.endswith('.parquet') and file_name not in referenced
+            if orphaned:
+                try: os.remove(os.path.join(self.dir, file_name))
+                except OSError: pass
+
+    # --- Lesen ---
+
+    def partitions_for_range(self, start=None, end=None):
+        start_ms = _to_ms(start) if start is not None else None
+        end_ms = _to_ms(end) if end is not None else None
+        selected = []
+        for month_key, partition in self.manifest['partitions'].items():
+            if start_ms is not None and partition['end'] < start_ms: continue
+            if end_ms is not None and partition['start'] > end_ms: continue
+            selected.append(partition)
+        return selected
+
+    def read_timestamps(self, start=None, end=None):
+        """ Liest nur die Zeitstempel-Spalte als int64-Millisekunden. """
+        partitions = self.partitions_for_range(start, end)
+        if not partitions:
+            return index_to_ms(pd.DatetimeIndex([], tz='UTC'))
+        dataset = ds.dataset([os.path.join(self.dir, p['file']) for p in partitions], format='parquet')
+        timestamps = pd.DatetimeIndex(dataset.to_table(columns=['timestamp']).column('timestamp').to_pandas())
+        return index_to_ms(timestamps.sort_values())
+
+    def read(self, start=None, end=None, columns=None):
+        """
+        Liest den Zeitraum [start, end] mit den gewünschten Spalten. Es werden nur die Partitionen
+        geöffnet, die den Zeitraum berühren. Zeitfilter und Spaltenauswahl werden an pyarrow
+        durchgereicht, sodass nur passende Row-Groups (Min/Max-Statistik) dekodiert werden.
+        """
+        partitions = self.partitions_for_range(start, end)
+        if not partitions:
+            return pd.DataFrame()
+        paths = [os.path.join(self.dir, p['file']) for p in partitions]
+        dataset = ds.dataset(paths, format='parquet')
+
+        filter_expr = None
+        if start is not None:
+            filter_expr = ds.field('timestamp') >= _to_utc(start)
+        if end is not None:
+            end_expr = ds.field('timestamp') <= _to_utc(end)
+            filter_expr = end_expr if filter_expr is None else filter_expr & end_expr
+
+        selected_columns = ['timestamp'] + [c for c in (columns or OHLCV_COLUMNS) if c != 'timestamp']
+        scanner = dataset.scanner(columns=selected_columns, filter=filter_expr,
+                                  fragment_scan_options=ds.ParquetFragmentScanOptions(pre_buffer=False))
+        df = scanner.to_table().to_pandas(ignore_metadata=True)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+        return df.set_index('timestamp').sort_index()
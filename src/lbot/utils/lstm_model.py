@@ -1,10 +1,9 @@
 # src/lbot/utils/lstm_model.py
-import pandas as pd
 import numpy as np
-import ta
-from tensorflow.keras.models import load_model, Sequential
-from tensorflow.keras.layers import LSTM, Dense, Dropout
-from joblib import load as joblib_load
+
+# TensorFlow, ta (und damit pandas) sowie joblib werden erst in den Funktionen importiert, die sie
+# brauchen: so startet z.B. der Babysitter im master_runner, der nie ein Modell anfasst, ohne den
+# mehrsekündigen TF-Import.
 
 # Feste, bewährte Perioden für die Feature-Erstellung
 EMA_SHORT_PERIOD = 20
@@ -12,52 +11,72 @@ EMA_MEDIUM_PERIOD = 50
 EMA_LONG_PERIOD = 200
 ATR_PERIOD = 14
 RSI_EMA_PERIOD = 21
+# Die Features, die das Modell lernt (Filter-Indikatoren gehören nicht dazu)
+MODEL_FEATURE_COLUMNS = ['rsi', 'adx', 'stoch_k', 'price_vs_ema_short', 'price_vs_ema_medium', 'rsi_vs_ema_rsi']
+# Features, Sequenzen und Modell rechnen in float32: halber Speicher, und das LSTM rechnet ohnehin in float32.
+# Die Indikatoren selbst werden in float64 berechnet (rekursive EMAs) und erst das Ergebnis wird verkleinert.
+FEATURE_DTYPE = np.float32
+
+def create_ann_features(df_in, ema_period=EMA_LONG_PERIOD, atr_period=ATR_PERIOD):
+    """
+    Erstellt ein festes Set von technischen Indikatoren und relativen Features.
+    ema_period/atr_period betreffen nur die Filter-Spalten (ema_<n>, atr_<n>, natr_<n>).
+    Ergebnis: die Eingangsspalten plus Features, alle als FEATURE_DTYPE, ohne die Warmup-Zeilen.
+    """
+    import ta
+    import pandas as pd
+    high, low, close = (df_in[col].astype(np.float64) for col in ('high', 'low', 'close'))
+    features = {}
 
-def create_ann_features(df_in):
-    """ Erstellt ein festes Set von technischen Indikatoren und relativen Features. """
-    df = df_in.copy()
-    
     # --- Basis-Indikatoren für das Modell ---
-    df['rsi'] = ta.momentum.RSIIndicator(close=df['close'], window=14).rsi()
-    df['adx'] = ta.trend.ADXIndicator(high=df['high'], low=df['low'], close=df['close'], window=14).adx()
-    stoch = ta.momentum.StochasticOscillator(high=df['high'], low=df['low'], close=df['close'], window=14, smooth_window=3)
-    df['stoch_k'] = stoch.stoch()
+    features['rsi'] = ta.momentum.RSIIndicator(close=close, window=14).rsi()
+    features['adx'] = ta.trend.ADXIndicator(high=high, low=low, close=close, window=14).adx()
+    stoch = ta.momentum.StochasticOscillator(high=high, low=low, close=close, window=14, smooth_window=3)
+    features['stoch_k'] = stoch.stoch()
 
     # --- Relative Features (Kontext) für das Modell ---
-    ema_short = ta.trend.EMAIndicator(close=df['close'], window=EMA_SHORT_PERIOD).ema_indicator()
-    ema_medium = ta.trend.EMAIndicator(close=df['close'], window=EMA_MEDIUM_PERIOD).ema_indicator()
-    df['price_vs_ema_short'] = (df['close'] / ema_short - 1) * 100
-    df['price_vs_ema_medium'] = (df['close'] / ema_medium - 1) * 100
+    ema_short = ta.trend.EMAIndicator(close=close, window=EMA_SHORT_PERIOD).ema_indicator()
+    ema_medium = ta.trend.EMAIndicator(close=close, window=EMA_MEDIUM_PERIOD).ema_indicator()
+    features['price_vs_ema_short'] = (close / ema_short - 1) * 100
+    features['price_vs_ema_medium'] = (close / ema_medium - 1) * 100
     
-    ema_rsi = ta.trend.EMAIndicator(close=df['rsi'], window=RSI_EMA_PERIOD).ema_indicator()
-    df['rsi_vs_ema_rsi'] = df['rsi'] - ema_rsi
+    ema_rsi = ta.trend.EMAIndicator(close=features['rsi'], window=RSI_EMA_PERIOD).ema_indicator()
+    features['rsi_vs_ema_rsi'] = features['rsi'] - ema_rsi
 
     # --- Indikatoren NUR für die Filter-Logik (werden nicht vom Modell gelernt) ---
-    df[f'ema_{EMA_LONG_PERIOD}'] = ta.trend.EMAIndicator(close=df['close'], window=EMA_LONG_PERIOD).ema_indicator()
-    atr_indicator = ta.volatility.AverageTrueRange(high=df['high'], low=df['low'], close=df['close'], window=ATR_PERIOD)
-    df[f'atr_{ATR_PERIOD}'] = atr_indicator.average_true_range()
-    df[f'natr_{ATR_PERIOD}'] = (df[f'atr_{ATR_PERIOD}'] / df['close']) * 100
+    features[f'ema_{ema_period}'] = ta.trend.EMAIndicator(close=close, window=ema_period).ema_indicator()
+    atr_indicator = ta.volatility.AverageTrueRange(high=high, low=low, close=close, window=atr_period)
+    features[f'atr_{atr_period}'] = atr_indicator.average_true_range()
+    features[f'natr_{atr_period}'] = (features[f'atr_{atr_period}'] / close) * 100
 
-    df.dropna(inplace=True)
-    return df
+    # Ein einziger Block in float32; die Warmup-Zeilen fallen per Maske weg statt über Zwischenkopien
+    df = pd.concat([df_in.astype(FEATURE_DTYPE), pd.DataFrame(features).astype(FEATURE_DTYPE)], axis=1)
+    return df[df.notna().all(axis=1).to_numpy()]
 
 def create_sequences(data, sequence_length, future_steps):
-    data['future_price'] = data['close'].shift(-future_steps)
-    data['target'] = (data['future_price'] / data['close']) - 1
-    data.dropna(inplace=True)
-    
-    # Definiere hier explizit die Features, die das Modell lernen soll
-    model_feature_columns = ['rsi', 'adx', 'stoch_k', 'price_vs_ema_short', 'price_vs_ema_medium', 'rsi_vs_ema_rsi']
-    
-    X, y = [], []
-    if len(data) > sequence_length:
-        for i in range(len(data) - sequence_length):
-            X.append(data.iloc[i:(i + sequence_length)][model_feature_columns].values)
-            y.append(data.iloc[i + sequence_length]['target'])
-        
-    return np.array(X), np.array(y)
+    """
+    Trainings-Sequenzen: X[i] sind die MODEL_FEATURE_COLUMNS der Zeilen [i, i + sequence_length),
+    y[i] die Rendite von Zeile i + sequence_length über future_steps Kerzen. Zeilen ohne Ziel
+    (am Ende) oder mit Lücken fallen vorher weg. `data` wird nicht verändert.
+    X ist ein zusammenhängendes float32-Array (Sequenzen x Schritte x Features).
+    """
+    close = data['close'].to_numpy(np.float64)
+    target = np.full(len(data), np.nan)
+    if len(data) > future_steps:
+        target[:len(data) - future_steps] = close[future_steps:] / close[:len(data) - future_steps] - 1
+    valid = data.notna().all(axis=1).to_numpy() & ~np.isnan(target)
+    features = data[MODEL_FEATURE_COLUMNS].to_numpy(FEATURE_DTYPE)[valid]
+    target = target[valid]
+
+    num_features = len(MODEL_FEATURE_COLUMNS)
+    if len(features) <= sequence_length:
+        return np.empty((0, sequence_length, num_features), dtype=FEATURE_DTYPE), np.empty(0, dtype=FEATURE_DTYPE)
+    windows = np.lib.stride_tricks.sliding_window_view(features, sequence_length, axis=0).transpose(0, 2, 1)[:-1]
+    return np.ascontiguousarray(windows), target[sequence_length:].astype(FEATURE_DTYPE)
 
 def create_lstm_model(sequence_length, num_features):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense, Dropout
     model = Sequential([
         LSTM(50, return_sequences=True, input_shape=(sequence_length, num_features)),
         Dropout(0.2),
@@ -70,6 +89,8 @@ def create_lstm_model(sequence_length, num_features):
     return model
 
 def load_model_and_scaler(model_path, scaler_path):
+    from tensorflow.keras.models import load_model
+    from joblib import load as joblib_load
     try:
         model = load_model(model_path)
         scaler = joblib_load(scaler_path)
@@ -1,12 +1,13 @@
 # src/lbot/utils/mc_dropout_predictor.py
 import numpy as np
-import tensorflow as tf
 
 def make_mc_prediction(model, data, n_samples=30):
     """
     Führt Monte-Carlo-Dropout-Vorhersagen durch, um eine robustere Schätzung
     und ein Maß für die Unsicherheit zu erhalten.
     """
+    # Erst hier importieren: wer nur trade_manager importiert (z.B. der Babysitter), lädt kein TensorFlow
+    import tensorflow as tf
     # Stelle sicher, dass die Daten ein Tensor sind
     tf_data = tf.convert_to_tensor(data, dtype=tf.float32)
     
@@ -0,0 +1,231 @@
+# src/lbot/utils/metrics.py
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+DEFAULT_TEXTFILE_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'metrics')
+# Sekunden; deckt einzelne Börsen-Aufrufe (ms) bis zu kompletten Zyklen (Minuten) ab
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+CANDLE_BUCKETS = (1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, help_text, labelnames):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self, const_labels):
+        return [f"{self.name}{_format_labels(self.labelnames, key, const_labels)} {_format_value(value)}"
+                for key, value in sorted(self.values.items())]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self.registry.lock:
+            self.values[self._key(labels)] = float(value)
+
+    render = Counter.render
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help_text, labelnames, buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock:
+            state = self.values.get(key)
+            if state is None:
+                # Pro Bucket nur die Treffer; kumuliert wird erst beim Schreiben
+                state = self.values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+            state['counts'][index] += 1
+            state['sum'] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self, const_labels):
+        lines = []
+        for key, state in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state['counts']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), key + (le,), const_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key, const_labels)} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key, const_labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Leichtgewichtige Counter/Histogramme im Speicher (ein Lock, keine Threads, keine Abhängigkeiten).
+    Geschrieben wird einmal am Ende eines Laufs als Prometheus-Textfile. Da jeder Lauf ein eigener
+    Prozess ist, wird der Stand des letzten Laufs aus einer JSON-Datei neben dem Textfile geladen,
+    damit Counter und Histogramme über die Läufe hinweg kumulativ bleiben.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _get(self, cls, name, help_text, labelnames, **kwargs):
+        if name not in self.metrics:
+            self.metrics[name] = cls(self, name, help_text, labelnames, **kwargs)
+        return self.metrics[name]
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render(self, const_labels=()):
+        lines = []
+        with self.lock:
+            for metric in self.metrics.values():
+                if not metric.values:
+                    continue
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.render(tuple(const_labels)))
+        return "\n".join(lines) + "\n"
+
+    def merge_state(self, path):
+        """ Addiert Counter/Histogramme eines früheren Laufs (Gauges nur, wenn dieser Lauf sie nicht gesetzt hat). """
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as f:
+                previous = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        with self.lock:
+            for name, entries in previous.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for entry in entries:
+                    key = tuple(entry['labels'])
+                    if isinstance(metric, Histogram):
+                        if len(entry['counts']) != len(metric.buckets) + 1:
+                            continue  # Buckets geändert -> alter Stand passt nicht mehr
+                        state = metric.values.setdefault(key, {'counts': [0] * (len(metric.buckets) + 1), 'sum': 0.0})
+                        state['counts'] = [a + b for a, b in zip(state['counts'], entry['counts'])]
+                        state['sum'] += entry['sum']
+                    elif isinstance(metric, Gauge):
+                        metric.values.setdefault(key, entry['value'])
+                    else:
+                        metric.values[key] = metric.values.get(key, 0.0) + entry['value']
+
+    def state(self):
+        with self.lock:
+            result = {}
+            for name, metric in self.metrics.items():
+                if isinstance(metric, Histogram):
+                    result[name] = [{'labels': list(k), 'counts': v['counts'], 'sum': v['sum']} for k, v in metric.values.items()]
+                else:
+                    result[name] = [{'labels': list(k), 'value': v} for k, v in metric.values.items()]
+            return result
+
+    def write_textfile(self, directory, job, const_labels=()):
+        """
+        Schreibt <directory>/<job>.prom atomar (temporäre Datei + os.replace), damit der
+        node_exporter nie eine halb geschriebene Datei liest.
+        """
+        os.makedirs(directory, exist_ok=True)
+        state_path = os.path.join(directory, f".{job}.state.json")
+        self.merge_state(state_path)
+        prom_path = os.path.join(directory, f"{job}.prom")
+        for path, content in ((state_path, json.dumps(self.state())), (prom_path, self.render(const_labels))):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        # Der Stand liegt jetzt in der State-Datei; ein weiterer Export im selben Prozess zählt nur Neues hinzu
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.values = {}
+        return prom_path
+
+
+REGISTRY = MetricsRegistry()
+
+# --- Metriken des Live-Pfads ---
+EXCHANGE_CALLS = REGISTRY.counter('lbot_exchange_calls_total', 'Börsen-Aufrufe nach Methode und Ergebnis', ('method', 'result'))
+EXCHANGE_LATENCY = REGISTRY.histogram('lbot_exchange_call_seconds', 'Latenz der Börsen-Aufrufe', ('method',))
+CYCLE_STAGE = REGISTRY.histogram('lbot_trade_cycle_stage_seconds', 'Dauer der Stufen des Handelszyklus', ('stage',))
+CYCLES = REGISTRY.counter('lbot_trade_cycles_total', 'Ergebnisse des Handelszyklus pro Konto', ('result',))
+CANDLE_TO_ACK = REGISTRY.histogram('lbot_candle_close_to_order_ack_seconds',
+                                   'Zeit vom Kerzenschluss bis zur bestätigten Entry-Order', buckets=CANDLE_BUCKETS)
+BABYSIT = REGISTRY.histogram('lbot_babysit_seconds', 'Dauer einer Babysitter-Prüfung')
+BABYSIT_RESULTS = REGISTRY.counter('lbot_babysit_total', 'Ergebnisse der Babysitter-Prüfungen', ('result',))
+TELEGRAM_SEND = REGISTRY.histogram('lbot_telegram_send_seconds', 'Dauer eines Telegram-Versands (inkl. Wiederholungen)')
+TELEGRAM_MESSAGES = REGISTRY.counter('lbot_telegram_messages_total', 'Telegram-Nachrichten nach Ergebnis', ('result',))
+STRATEGY_RUNS = REGISTRY.histogram('lbot_strategy_run_seconds', 'Laufzeit eines Strategie-Subprozesses im master_runner',
+                                   ('strategy',), buckets=CANDLE_BUCKETS)
+STRATEGY_RUN_RESULTS = REGISTRY.counter('lbot_strategy_runs_total', 'Strategie-Läufe im master_runner nach Ergebnis',
+                                        ('strategy', 'result'))
+LAST_RUN = REGISTRY.gauge('lbot_last_run_timestamp_seconds', 'Unix-Zeit des letzten abgeschlossenen Laufs')
+
+
+def export_metrics(settings, job, **const_labels):
+    """ Schreibt die Metriken dieses Laufs, wenn monitoring_settings.metrics_enabled gesetzt ist. Fehler brechen den Lauf nie ab. """
+    conf = settings.get('monitoring_settings', {}) if settings else {}
+    if not conf.get('metrics_enabled', False):
+        return None
+    directory = conf.get('textfile_dir') or DEFAULT_TEXTFILE_DIR
+    if not os.path.isabs(directory):
+        directory = os.path.join(PROJECT_ROOT, directory)
+    LAST_RUN.set(time.time())
+    try:
+        return REGISTRY.write_textfile(directory, job, sorted(const_labels.items()))
+    except OSError as e:
+        print(f"Metriken konnten nicht geschrieben werden: {e}")
+        return None
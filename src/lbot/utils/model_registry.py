@@ -0,0 +1,221 @@
+# src/lbot/utils/model_registry.py
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+MODELS_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'models')
+REGISTRY_DIR = os.path.join(MODELS_DIR, 'registry')
+MODEL_FILE, SCALER_FILE, META_FILE, CURRENT_FILE = 'model.h5', 'scaler.joblib', 'meta.json', 'current.json'
+# Neben der aktuellen Version bleiben so viele ältere (die zuletzt registrierten) für Vergleiche und Rollbacks erhalten
+KEEP_VERSIONS = 5
+
+
+def pair_name(symbol, timeframe):
+    return f"{symbol.replace('/', '').replace(':', '')}_{timeframe}"
+
+
+def legacy_paths(symbol, timeframe, models_dir=MODELS_DIR):
+    """ Alte Ablage (ann_predictor_<Paar>.h5 / ann_scaler_<Paar>.joblib), wird gelesen, solange nichts registriert ist. """
+    name = pair_name(symbol, timeframe)
+    return os.path.join(models_dir, f'ann_predictor_{name}.h5'), os.path.join(models_dir, f'ann_scaler_{name}.joblib')
+
+
+def content_version(model_path, scaler_path, chunk_size=1024 * 1024):
+    """
+    Version = Inhalts-Hash von Modell und Scaler: gleiche Dateien ergeben immer dieselbe Version.
+    (Bewusst ohne artifact_cache, das pandas/joblib importiert: run.py lädt die Registry beim Start.)
+    """
+    sha = hashlib.sha256()
+    for path in (model_path, scaler_path):
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha.update(chunk)
+        sha.update(b'\0')
+    return sha.hexdigest()[:16]
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4, default=str)
+    os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """
+    Inhaltsadressierte Ablage der Modelle: <root>/<Paar>/<Version>/ enthält model.h5, scaler.joblib
+    und meta.json (Trainingszeitraum, Settings-Hash, Kennzahlen). Eine Version wird nie überschrieben.
+    Welche Version der Live-Handel nutzt, steht in <root>/<Paar>/current.json und wird per
+    promote() atomar umgestellt; danach werden ältere Versionen bis auf keep_versions entfernt
+    (None = alle behalten).
+    """
+    def __init__(self, root=REGISTRY_DIR, legacy_dir=MODELS_DIR, keep_versions=KEEP_VERSIONS):
+        self.root = root
+        self.legacy_dir = legacy_dir
+        self.keep_versions = keep_versions
+
+    def pair_dir(self, symbol, timeframe):
+        return os.path.join(self.root, pair_name(symbol, timeframe))
+
+    def version_dir(self, symbol, timeframe, version):
+        return os.path.join(self.pair_dir(symbol, timeframe), version)
+
+    def register(self, symbol, timeframe, model_path, scaler_path, metadata=None):
+        """ Übernimmt Modell/Scaler als neue Version (ohne sie zu aktivieren). Gibt die Version zurück. """
+        version = content_version(model_path, scaler_path)
+        target = self.version_dir(symbol, timeframe, version)
+        if os.path.isdir(target):
+            return version
+        os.makedirs(self.pair_dir(symbol, timeframe), exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.pair_dir(symbol, timeframe), prefix=f".{version}.")
+        try:
+            shutil.copy2(model_path, os.path.join(tmp_dir, MODEL_FILE))
+            shutil.copy2(scaler_path, os.path.join(tmp_dir, SCALER_FILE))
+            meta = {'version': version, 'symbol': symbol, 'timeframe': timeframe,
+                    'created': datetime.now(timezone.utc).isoformat(), **(metadata or {})}
+            with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+                json.dump(meta, f, indent=4, default=str)
+            os.rename(tmp_dir, target)
+        except OSError:
+            # Ein paralleler Lauf hat dieselbe Version schon angelegt: Inhalt ist identisch
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(target):
+                raise
+        return version
+
+    def save(self, symbol, timeframe, model, scaler, metadata=None):
+        """ Speichert ein trainiertes Modell direkt als Version. """
+        from joblib import dump as joblib_dump
+        os.makedirs(self.root, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.root) as tmp_dir:
+            model_path, scaler_path = os.path.join(tmp_dir, MODEL_FILE), os.path.join(tmp_dir, SCALER_FILE)
+            model.save(model_path)
+            joblib_dump(scaler, scaler_path)
+            return self.register(symbol, timeframe, model_path, scaler_path, metadata)
+
+    def promote(self, symbol, timeframe, version):
+        """ Macht eine registrierte Version zur aktuellen (atomarer Austausch von current.json). """
+        if not os.path.isdir(self.version_dir(symbol, timeframe, version)):
+            raise FileNotFoundError(f"Modell-Version {version} für {symbol} ({timeframe}) ist nicht registriert.")
+        _write_json_atomic(os.path.join(self.pair_dir(symbol, timeframe), CURRENT_FILE),
+                           {'version': version, 'promoted': datetime.now(timezone.utc).isoformat()})
+        if self.keep_versions is not None:
+            self.prune(symbol, timeframe, self.keep_versions)
+
+    def prune(self, symbol, timeframe, keep):
+        """
+        Entfernt alle Versionen außer der aktuellen und den `keep` zuletzt registrierten anderen.
+        Das Verzeichnis wird erst umbenannt und dann gelöscht, Leser sehen also nie eine halbe Version.
+        Gibt die entfernten Versionen zurück.
+        """
+        current = self.current(symbol, timeframe)
+        others = [entry['version'] for entry in self.versions(symbol, timeframe) if entry.get('version') != current]
+        removed = others[:max(len(others) - keep, 0)]
+        for version in removed:
+            doomed = os.path.join(self.pair_dir(symbol, timeframe), f".{version}.removed.{os.getpid()}")
+            try:
+                os.rename(self.version_dir(symbol, timeframe, version), doomed)
+            except OSError:
+                continue
+            shutil.rmtree(doomed, ignore_errors=True)
+        return removed
+
+    def current(self, symbol, timeframe):
+        path = os.path.join(self.pair_dir(symbol, timeframe), CURRENT_FILE)
+        try:
+            with open(path, 'r') as f:
+                return json.load(f).get('version')
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def resolve(self, symbol, timeframe, version=None):
+        """
+        (Version, Modell-Pfad, Scaler-Pfad) der gewünschten bzw. aktuellen Version. Ist noch nichts
+        registriert, werden die Dateien der alten Ablage mit Version None geliefert; None, wenn es
+        gar kein Modell gibt.
+        """
+        version = version or self.current(symbol, timeframe)
+        if version:
+            version_dir = self.version_dir(symbol, timeframe, version)
+            if os.path.isdir(version_dir):
+                return version, os.path.join(version_dir, MODEL_FILE), os.path.join(version_dir, SCALER_FILE)
+            return None
+        model_path, scaler_path = legacy_paths(symbol, timeframe, self.legacy_dir)
+        if os.path.exists(model_path) and os.path.exists(scaler_path):
+            return None, model_path, scaler_path
+        return None
+
+    def metadata(self, symbol, timeframe, version=None):
+        version = version or self.current(symbol, timeframe)
+        if not version:
+            return {}
+        try:
+            with open(os.path.join(self.version_dir(symbol, timeframe, version), META_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def versions(self, symbol, timeframe):
+        """ Metadaten aller registrierten Versionen, älteste zuerst. """
+        pair_dir = self.pair_dir(symbol, timeframe)
+        if not os.path.isdir(pair_dir):
+            return []
+        entries = [self.metadata(symbol, timeframe, name) for name in os.listdir(pair_dir)
+                   if not name.startswith('.') and os.path.isdir(os.path.join(pair_dir, name))]
+        return sorted((entry for entry in entries if entry), key=lambda entry: entry.get('created', ''))
+
+
+class ModelCache:
+    """
+    LRU-Cache geladener (Modell, Scaler)-Paare pro Prozess. Registrierte Versionen ändern sich nie,
+    ihr Cache-Eintrag ist daher immer gültig; Dateien der alten Ablage werden zusätzlich über
+    Größe und Änderungszeit erkannt.
+    """
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, loader):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            # Unter dem Lock laden: parallele Anfragen für dieselbe Version laden sie nur einmal
+            value = loader()
+            if value[0] is not None and value[1] is not None:
+                self.entries[key] = value
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+MODEL_CACHE = ModelCache()
+
+
+def load_model_version(symbol, timeframe, version=None, registry=None):
+    """
+    Lädt die gewünschte (Standard: aktuelle) Version über den LRU-Cache.
+    Gibt (model, scaler, version, model_path, scaler_path) zurück; ohne Modell (None, None, None, None, None).
+    """
+    from .lstm_model import load_model_and_scaler
+    resolved = (registry or ModelRegistry()).resolve(symbol, timeframe, version)
+    if resolved is None:
+        return None, None, None, None, None
+    version, model_path, scaler_path = resolved
+    if version:
+        key = (pair_name(symbol, timeframe), version)
+    else:
+        key = tuple((path, os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in (model_path, scaler_path))
+    model, scaler = MODEL_CACHE.get(key, lambda: load_model_and_scaler(model_path, scaler_path))
+    return model, scaler, version, model_path, scaler_path
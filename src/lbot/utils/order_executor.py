@@ -0,0 +1,180 @@
+# src/lbot/utils/order_executor.py
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_FILL_TIMEOUT = 5.0     # Sekunden, die maximal auf die Fill-Bestätigung gewartet wird
+DEFAULT_POLL_INTERVAL = 0.2    # Sekunden zwischen zwei Statusabfragen
+
+
+class OrderExecutionError(Exception):
+    """
+    entry_sent: die Entry-Order ging bereits an die Börse (die Position kann existieren).
+    flattened: danach wurden platzierte SL/TP-Orders storniert und die Position reduce-only glattgestellt.
+    """
+    def __init__(self, message, entry_sent=False, flattened=False):
+        super().__init__(message)
+        self.entry_sent = entry_sent
+        self.flattened = flattened
+
+
+class OrderExecutor:
+    """
+    Führt einen Entry inklusive Absicherung aus:
+    1. Wenn die Börse es unterstützt, werden SL/TP direkt an die Entry-Order angehängt.
+    2. Sonst wird die Fill-Bestätigung mit einer festen Deadline abgefragt und SL und TP
+       anschließend parallel platziert.
+    Scheitert nach dem Versand der Entry-Order ein Schritt, wird die bereits platzierte Absicherung
+    storniert und die Position per reduce-only Market-Order glattgestellt, bevor der Fehler weitergeht.
+    Die Latenz jeder Stufe wird in `timings` (Millisekunden) festgehalten.
+    """
+    def __init__(self, exchange, logger, fill_timeout=DEFAULT_FILL_TIMEOUT,
+                 poll_interval=DEFAULT_POLL_INTERVAL, use_attached_sl_tp=True):
+        self.exchange = exchange
+        self.logger = logger
+        self.fill_timeout = fill_timeout
+        self.poll_interval = poll_interval
+        self.use_attached_sl_tp = use_attached_sl_tp
+        self.timings = {}
+
+    @classmethod
+    def from_settings(cls, exchange, logger, settings):
+        conf = settings.get('live_trading_settings', {}).get('order_execution', {})
+        return cls(
+            exchange, logger,
+            fill_timeout=conf.get('fill_timeout_seconds', DEFAULT_FILL_TIMEOUT),
+            poll_interval=conf.get('fill_poll_interval_seconds', DEFAULT_POLL_INTERVAL),
+            use_attached_sl_tp=conf.get('attach_sl_tp_to_entry', True)
+        )
+
+    @contextmanager
+    def _stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (time.perf_counter() - start) * 1000
+
+    def open_long(self, symbol, amount, stop_loss_price, take_profit_price, on_entry_sent=None):
+        """ on_entry_sent: wird direkt nach dem Versand der Entry-Order aufgerufen (z.B. um den Positions-Status zu speichern). """
+        self.timings = {}
+        self.on_entry_sent = on_entry_sent
+        if self.use_attached_sl_tp and self.exchange.supports_attached_sl_tp():
+            result = self._open_with_attached_protection(symbol, amount, stop_loss_price, take_profit_price)
+        else:
+            result = self._open_with_separate_protection(symbol, amount, stop_loss_price, take_profit_price)
+        result['timings'] = dict(self.timings)
+        timing_str = ", ".join(f"{name}={ms:.0f}ms" for name, ms in self.timings.items())
+        self.logger.info(f"Ausführungs-Latenzen: {timing_str}")
+        return result
+
+    def _open_with_attached_protection(self, symbol, amount, stop_loss_price, take_profit_price):
+        with self._stage('entry_with_sl_tp'):
+            order = self.exchange.create_market_order_with_sl_tp(symbol, 'buy', amount, stop_loss_price, take_profit_price)
+        self._entry_sent(order)
+        if not order or 'id' not in order:
+            self._abort(symbol, amount, [], "Entry-Order mit angehängtem SL/TP wurde nicht bestätigt.")
+        with self._stage('sl_tp_lookup'):
+            sl_order_id, tp_order_id = self._attached_order_ids(symbol, stop_loss_price, take_profit_price)
+        return {'order': order, 'sl_order_id': sl_order_id, 'tp_order_id': tp_order_id, 'attached': True}
+
+    def _attached_order_ids(self, symbol, stop_loss_price, take_profit_price):
+        """ IDs der an die Entry-Order gehängten Trigger-Orders (über ihren Trigger-Preis), None wenn nicht auffindbar. """
+        try:
+            trigger_orders = self.exchange.fetch_open_trigger_orders(symbol)
+        except Exception as e:
+            self.logger.warning(f"Angehängte SL/TP-Orders konnten nicht abgefragt werden: {e}")
+            return None, None
+        def find(price):
+            for order in trigger_orders:
+                trigger = order.get('triggerPrice') or order.get('stopPrice')
+                if trigger is not None and order.get('reduceOnly', True) and abs(float(trigger) - price) <= abs(price) * 1e-9:
+                    return order.get('id')
+            return None
+        return find(stop_loss_price), find(take_profit_price)
+
+    def _open_with_separate_protection(self, symbol, amount, stop_loss_price, take_profit_price):
+        with self._stage('entry'):
+            order = self.exchange.create_market_order(symbol, 'buy', amount)
+        self._entry_sent(order)
+        if not order or 'id' not in order:
+            self._abort(symbol, amount, [], "Entry-Order wurde nicht bestätigt.")
+
+        with self._stage('fill_confirmation'):
+            try:
+                filled_amount = self._wait_for_fill(order, symbol, amount)
+            except OrderExecutionError as e:
+                self._abort(symbol, amount, [], str(e))
+
+        with self._stage('sl_tp_placement'):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                futures = {'SL': pool.submit(self.exchange.place_trigger_market_order, symbol, 'sell', filled_amount, stop_loss_price, {'reduceOnly': True}),
+                           'TP': pool.submit(self.exchange.place_trigger_market_order, symbol, 'sell', filled_amount, take_profit_price, {'reduceOnly': True})}
+                placed, errors = {}, []
+                for name, future in futures.items():
+                    try:
+                        leg = future.result()
+                    except Exception as e:
+                        errors.append(f"{name}: {e}")
+                        continue
+                    if leg and leg.get('id'):
+                        placed[name] = leg['id']
+                    else:
+                        errors.append(f"{name}: nicht bestätigt")
+
+        if errors:
+            self._abort(symbol, filled_amount, list(placed.values()), f"Fehler beim Platzieren der SL/TP-Orders ({'; '.join(errors)}).")
+        return {'order': order, 'sl_order_id': placed['SL'], 'tp_order_id': placed['TP'], 'attached': False}
+
+    def _entry_sent(self, order):
+        if self.on_entry_sent is not None:
+            self.on_entry_sent(order)
+
+    def _abort(self, symbol, amount, placed_order_ids, reason):
+        """ Nach gesendeter Entry-Order: platzierte Absicherung stornieren, Position glattstellen, Fehler auslösen. """
+        for order_id in placed_order_ids:
+            try:
+                self.exchange.cancel_trigger_order(order_id, symbol)
+            except Exception as e:
+                self.logger.error(f"Trigger-Order {order_id} konnte nicht storniert werden: {e}")
+        flattened = self._flatten(symbol, amount)
+        suffix = "Position wurde glattgestellt." if flattened else "Position ist möglicherweise UNGESICHERT offen!"
+        raise OrderExecutionError(f"{reason} {suffix}", entry_sent=True, flattened=flattened)
+
+    def _flatten(self, symbol, amount):
+        """ Schließt eine offene Position per reduce-only Market-Order. True, wenn (danach) keine Position mehr offen ist. """
+        try:
+            open_positions = self.exchange.fetch_open_positions(symbol)
+            if not open_positions:
+                return True
+            close_order = self.exchange.create_market_order(symbol, 'sell', open_positions[0].get('contracts') or amount, {'reduceOnly': True})
+            return bool(close_order and close_order.get('id'))
+        except Exception as e:
+            self.logger.error(f"Position für {symbol} konnte nicht glattgestellt werden: {e}")
+            return False
+
+    def _wait_for_fill(self, order, symbol, requested_amount):
+        """ Fragt den Order-Status bis zur Deadline ab und gibt die gefüllte Menge zurück. """
+        if order.get('status') == 'closed' and order.get('filled'):
+            return order['filled']
+
+        deadline = time.monotonic() + self.fill_timeout
+        while time.monotonic() < deadline:
+            try:
+                current = self.exchange.fetch_order(order['id'], symbol)
+                if current.get('status') == 'closed' and current.get('filled'):
+                    return current['filled']
+                if current.get('status') in ('canceled', 'rejected', 'expired'):
+                    raise OrderExecutionError(f"Entry-Order wurde nicht ausgeführt (Status: {current.get('status')}).")
+            except OrderExecutionError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"Order-Status konnte nicht abgefragt werden: {e}")
+            time.sleep(self.poll_interval)
+
+        # Letzter Rettungsanker: die Position selbst prüfen
+        open_positions = self.exchange.fetch_open_positions(symbol)
+        if open_positions:
+            self.logger.warning("Keine Fill-Bestätigung innerhalb der Deadline, Position ist aber offen. Sichere ab.")
+            return open_positions[0].get('contracts') or requested_amount
+        raise OrderExecutionError(f"Keine Fill-Bestätigung innerhalb von {self.fill_timeout}s erhalten.")
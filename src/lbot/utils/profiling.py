@@ -0,0 +1,126 @@
+# src/lbot/utils/profiling.py
+import os
+import json
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+PROFILE_DIR = os.path.join(PROJECT_ROOT, 'artifacts', 'profiles')
+# Obergrenze für Einzel-Ereignisse im JSON-Trace (die Summen pro Stufe sind davon nicht betroffen)
+MAX_TRACE_EVENTS = 200_000
+
+_NULL_SPAN = nullcontext()
+
+
+class Profiler:
+    """
+    Benannte Zeit-Spans für alle Tools. Ist das Profiling aus, liefert span() einen leeren
+    Kontext und kostet praktisch nichts. Verschachtelte Spans werden pro Thread als Pfad
+    geführt ('trade_cycle/inference'), die Summen sind threadsicher.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        self.stats = {}
+        self.events = []
+        self.started = time.perf_counter()
+
+    def enable(self):
+        self.reset()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name):
+        return self._span(name) if self.enabled else _NULL_SPAN
+
+    @contextmanager
+    def _span(self, name):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        path = f"{stack[-1]}/{name}" if stack else name
+        stack.append(path)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            with self.lock:
+                entry = self.stats.setdefault(path, {'count': 0, 'total': 0.0, 'max': 0.0})
+                entry['count'] += 1
+                entry['total'] += duration
+                entry['max'] = max(entry['max'], duration)
+                if len(self.events) < MAX_TRACE_EVENTS:
+                    self.events.append({'name': path, 'thread': threading.current_thread().name,
+                                        'start': start - self.started, 'duration': duration})
+
+    def report(self, title):
+        wall = time.perf_counter() - self.started
+        lines = [f"--- Profil: {title} (Laufzeit {wall:.2f}s) ---",
+                 f"{'Stufe':<40} {'Aufrufe':>8} {'Gesamt':>10} {'Mittel':>10} {'Max':>10} {'Anteil':>7}"]
+        for path, entry in sorted(self.stats.items()):
+            depth = path.count('/')
+            label = "  " * depth + path.rsplit('/', 1)[-1]
+            lines.append(f"{label:<40} {entry['count']:>8} {entry['total']:>9.3f}s {entry['total'] / entry['count']:>9.4f}s "
+                         f"{entry['max']:>9.4f}s {entry['total'] / wall * 100 if wall else 0:>6.1f}%")
+        return "\n".join(lines)
+
+    def trace(self, title):
+        return {'run': title, 'created': datetime.now(timezone.utc).isoformat(),
+                'wall_seconds': time.perf_counter() - self.started,
+                'stages': self.stats, 'events': self.events}
+
+
+PROFILER = Profiler()
+
+
+def span(name):
+    """ with span('features'): ... misst den Block, wenn das Profiling aktiv ist. """
+    return PROFILER.span(name)
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', action='store_true', help="Zeit pro Stufe messen und am Ende ausgeben")
+    parser.add_argument('--profile-dir', type=str, default=None,
+                        help=f"Zusätzlich cProfile-Dump (.pstats) und JSON-Trace hierhin schreiben (z.B. {PROFILE_DIR})")
+
+
+@contextmanager
+def profile_run(title, enabled, profile_dir=None, printer=print):
+    """
+    Umschließt einen ganzen Lauf: aktiviert die Spans, gibt am Ende die Aufschlüsselung aus
+    und schreibt mit profile_dir zusätzlich <title>_<Zeitstempel>.pstats und .json.
+    """
+    if not enabled and not profile_dir:
+        yield
+        return
+    PROFILER.enable()
+    profiler = cProfile.Profile() if profile_dir else None
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        PROFILER.disable()
+        printer(PROFILER.report(title))
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+            stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+            base = os.path.join(profile_dir, f"{title}_{stamp}_{os.getpid()}")
+            pstats.Stats(profiler).dump_stats(f"{base}.pstats")
+            with open(f"{base}.json", 'w') as f:
+                json.dump(PROFILER.trace(title), f, indent=2)
+            printer(f"Profil gespeichert: {base}.pstats, {base}.json")
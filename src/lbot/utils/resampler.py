@@ -0,0 +1,131 @@
+# src/lbot/utils/resampler.py
+import os
+import json
+import shutil
+import logging
+import pandas as pd
+from .history_store import HistoryStore, PROJECT_ROOT, _to_ms
+from .gap_index import timeframe_to_ms, bucket_origin_ms
+
+SETTINGS_FILE = os.path.join(PROJECT_ROOT, 'settings.json')
+OHLCV_AGGREGATION = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+
+log = logging.getLogger("Resampler")
+log.setLevel(logging.INFO)
+
+def get_base_timeframe():
+    """ Liest data_settings.base_timeframe aus settings.json (None = jeder Timeframe wird separat geladen). """
+    if not os.path.exists(SETTINGS_FILE):
+        return None
+    try:
+        with open(SETTINGS_FILE, 'r') as f:
+            return json.load(f).get('data_settings', {}).get('base_timeframe')
+    except (json.JSONDecodeError, OSError):
+        return None
+
+def is_derivable(base_timeframe, timeframe):
+    if not base_timeframe or timeframe == base_timeframe:
+        return False
+    base_ms, target_ms = timeframe_to_ms(base_timeframe), timeframe_to_ms(timeframe)
+    return target_ms > base_ms and target_ms % base_ms == 0
+
+def resample_ohlcv(df_base, base_timeframe, timeframe):
+    """
+    Exakte OHLCV-Aggregation (open=first, high=max, low=min, close=last, volume=sum).
+    Die Buckets sind wie bei Binance an der Unix-Epoche (UTC) ausgerichtet, Wochen an Montag 00:00 UTC
+    (siehe bucket_origin_ms). Nur vollständig von der Basis abgedeckte Buckets werden zurückgegeben.
+    """
+    if df_base.empty:
+        return df_base
+    base_ms, target_ms = timeframe_to_ms(base_timeframe), timeframe_to_ms(timeframe)
+    origin = pd.Timestamp(bucket_origin_ms(timeframe), unit='ms', tz='UTC')
+    resampled = df_base[list(OHLCV_AGGREGATION)].resample(pd.Timedelta(milliseconds=target_ms), origin=origin, label='left', closed='left')
+    df = resampled.agg(OHLCV_AGGREGATION)
+    # Nur Buckets mit allen Basis-Kerzen: angebrochene Buckets an den Rändern (Kerze läuft noch) ebenso wie
+    # Buckets mit Lücken in der Basis fehlen im abgeleiteten Store und landen so in dessen Gap-Index
+    df = df[resampled['close'].count() == target_ms // base_ms]
+    df.index.name = 'timestamp'
+    return df
+
+def update_derived_store(symbol, base_timeframe, timeframe, base_dir=None):
+    """
+    Aktualisiert den abgeleiteten Store (z.B. 4h aus 1m) inkrementell: neu berechnet wird nur
+    ab dem letzten bereits abgeleiteten Bucket. Gibt den abgeleiteten Store zurück.
+    """
+    store_kwargs = {'base_dir': base_dir} if base_dir else {}
+    base_store = HistoryStore(symbol, base_timeframe, **store_kwargs)
+    derived_store = HistoryStore(symbol, timeframe, **store_kwargs)
+    if not base_store.exists():
+        return derived_store
+
+    base_first, base_last = base_store.first_timestamp(), base_store.last_timestamp()
+    derived_first, derived_last = derived_store.first_timestamp(), derived_store.last_timestamp()
+    target_delta = pd.Timedelta(milliseconds=timeframe_to_ms(timeframe))
+
+    if derived_last is not None and derived_store.manifest.get('derived_from') != base_timeframe:
+        log.warning(f"{derived_store.name} stammt nicht aus {base_timeframe}-Daten und wird nicht überschrieben.")
+        return derived_store
+
+    if derived_last is not None and (_to_ms(derived_last) - bucket_origin_ms(timeframe)) % timeframe_to_ms(timeframe):
+        # Noch mit altem Bucket-Ursprung abgeleitet (Wochen ab Donnerstag) -> Store verwerfen und neu ableiten
+        log.warning(f"{derived_store.name}: Buckets nicht an {timeframe}-Grenzen ausgerichtet, leite komplett neu ab.")
+        shutil.rmtree(derived_store.dir, ignore_errors=True)
+        derived_store = HistoryStore(symbol, timeframe, **store_kwargs)
+        derived_first = derived_last = None
+
+    if derived_last is None or base_first < derived_first - target_delta:
+        # Erster Lauf oder die Basis wurde nach hinten erweitert -> komplett ableiten
+        recompute_from = None
+    elif base_last < derived_last + 2 * target_delta:
+        # Seit dem letzten Lauf kann kein neuer Bucket abgeschlossen worden sein
+        return derived_store
+    else:
+        # Den letzten Bucket erneut berechnen (falls er damals nachträglich ergänzt wurde)
+        recompute_from = derived_last
+
+    df_base = base_store.read(start=recompute_from)
+    df_derived = resample_ohlcv(df_base, base_timeframe, timeframe)
+    if not df_derived.empty:
+        derived_store.append(df_derived)
+    meta = {'derived_from': base_timeframe}
+    if base_store.manifest.get('requested_from') is not None:
+        meta['requested_from'] = base_store.manifest['requested_from']
+    derived_store.update_meta(**meta)
+    log.info(f"{derived_store.name}: {len(df_derived)} Kerzen aus {base_timeframe} abgeleitet.")
+    return derived_store
+
+def rederive_missing(symbol, base_timeframe, timeframe, base_dir=None):
+    """
+    Berechnet nur die Buckets neu, die im Gap-Index des abgeleiteten Stores als fehlend
+    vermerkt sind (z.B. nachdem Lücken in der Basis repariert wurden).
+    """
+    store_kwargs = {'base_dir': base_dir} if base_dir else {}
+    base_store = HistoryStore(symbol, base_timeframe, **store_kwargs)
+    derived_store = HistoryStore(symbol, timeframe, **store_kwargs)
+    target_delta = pd.Timedelta(milliseconds=timeframe_to_ms(timeframe))
+    filled = 0
+    for start, end in derived_store.missing_ranges():
+        df_base = base_store.read(start=start, end=end + target_delta - pd.Timedelta(milliseconds=1))
+        df_derived = resample_ohlcv(df_base, base_timeframe, timeframe)
+        if not df_derived.empty:
+            filled += derived_store.append(df_derived)
+    return filled
+
+def verify_parity(symbol, base_timeframe, timeframe, native_df, tolerance=1e-9, base_dir=None):
+    """
+    Vergleicht lokal abgeleitete Kerzen mit börsen-nativen Kerzen (native_df, gleicher Zeitraum).
+    Gibt (Anzahl verglichener Kerzen, DataFrame der Abweichungen) zurück.
+    """
+    if native_df.empty:
+        return 0, pd.DataFrame()
+    store_kwargs = {'base_dir': base_dir} if base_dir else {}
+    base_store = HistoryStore(symbol, base_timeframe, **store_kwargs)
+    end = native_df.index[-1] + pd.Timedelta(milliseconds=timeframe_to_ms(timeframe))
+    df_base = base_store.read(start=native_df.index[0], end=end - pd.Timedelta(milliseconds=1))
+    derived = resample_ohlcv(df_base, base_timeframe, timeframe)
+    common = derived.index.intersection(native_df.index)
+    columns = list(OHLCV_AGGREGATION)
+    diff = (derived.loc[common, columns] - native_df.loc[common, columns]).abs()
+    relative = diff / native_df.loc[common, columns].abs().where(lambda x: x > 0, 1.0)
+    mismatches = relative[(relative > tolerance).any(axis=1)]
+    return len(common), mismatches
@@ -1,21 +1,289 @@
 # src/lbot/utils/telegram.py
+import os
+import json
+import time
+import queue
+import atexit
+import threading
 import requests
+from .metrics import TELEGRAM_SEND, TELEGRAM_MESSAGES
 
-def send_message(bot_token, chat_id, text):
-    """ Sendet eine Nachricht über einen Telegram-Bot. """
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+SPOOL_FILE = os.path.join(PROJECT_ROOT, 'artifacts', 'db', 'telegram_spool.jsonl')
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+REQUEST_TIMEOUT = 10          # Sekunden pro HTTP-Request
+QUEUE_MAXSIZE = 500           # Obergrenze der Warteschlange, danach wird direkt gespoolt
+COALESCE_WINDOW = 1.0         # Sekunden, in denen Nachrichten gesammelt werden
+DIGEST_THRESHOLD = 3          # Ab so vielen gleichzeitigen Nachrichten wird ein Sammel-Digest gesendet
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0            # Sekunden, verdoppelt sich pro Versuch
+MAX_MESSAGE_LENGTH = 4000     # Telegram erlaubt max. 4096 Zeichen pro Nachricht
+SHUTDOWN_FLUSH_TIMEOUT = 15
+
+
+class TelegramDeliveryError(Exception):
+    """ Vorübergehender Fehler (Netzwerk, 429, 5xx) – ein erneuter Versuch ist sinnvoll. """
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _post_message(session, api_url, bot_token, chat_id, text):
+    """ Sendet genau eine Nachricht. Wirft TelegramDeliveryError bei vorübergehenden Fehlern. """
+    url = f"{api_url}/bot{bot_token}/sendMessage"
     payload = {
         'chat_id': chat_id,
         'text': text,
         'parse_mode': 'Markdown'
     }
+    try:
+        response = session.post(url, json=payload, timeout=REQUEST_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        raise TelegramDeliveryError(f"Netzwerkfehler: {e}")
+
+    if response.status_code == 429 or response.status_code >= 500:
+        retry_after = None
+        try:
+            retry_after = response.json().get('parameters', {}).get('retry_after')
+        except ValueError:
+            pass
+        raise TelegramDeliveryError(f"HTTP {response.status_code}", retry_after=retry_after)
+    # Andere 4xx-Fehler (z.B. ungültiges Markdown) werden durch Wiederholen nicht besser
+    response.raise_for_status()
+
+
+def send_message(bot_token, chat_id, text):
+    """ Sendet eine Nachricht synchron über einen Telegram-Bot. """
     if not bot_token or not chat_id:
         print("Telegram-Token oder Chat-ID nicht konfiguriert. Nachricht wird nicht gesendet.")
         print(f"Nachricht: {text}")
         return
 
     try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
+        with requests.Session() as session:
+            _post_message(session, TELEGRAM_API_URL, bot_token, chat_id, text)
+    except (TelegramDeliveryError, requests.exceptions.RequestException) as e:
         print(f"Fehler beim Senden der Telegram-Nachricht: {e}")
+
+
+def _build_digest(texts):
+    """ Fasst mehrere Nachrichten zu möglichst wenigen Digest-Nachrichten zusammen. """
+    header = f"📬 *L-Bot Sammelmeldung* ({len(texts)} Nachrichten)\n\n"
+    separator = "\n\n———\n\n"
+    digests, current = [], header
+    for text in texts:
+        text = text[:MAX_MESSAGE_LENGTH - len(header)]
+        candidate = current + text if current == header else current + separator + text
+        if len(candidate) > MAX_MESSAGE_LENGTH:
+            digests.append(current)
+            current = header + text
+        else:
+            current = candidate
+    digests.append(current)
+    return digests
+
+
+class NotificationQueue:
+    """
+    Asynchroner Telegram-Versand: Nachrichten landen in einer begrenzten Queue und
+    werden von einem Hintergrund-Thread über eine gepoolte HTTP-Session gesendet.
+    Gleichzeitig eintreffende Nachrichten werden zu einem Digest zusammengefasst,
+    nicht zustellbare Nachrichten werden auf die Festplatte gespoolt und beim
+    nächsten Start erneut versucht.
+    """
+    def __init__(self, api_url=TELEGRAM_API_URL, spool_file=SPOOL_FILE, maxsize=QUEUE_MAXSIZE,
+                 coalesce_window=COALESCE_WINDOW, digest_threshold=DIGEST_THRESHOLD,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE):
+        self.api_url = api_url
+        self.spool_file = spool_file
+        self.coalesce_window = coalesce_window
+        self.digest_threshold = digest_threshold
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._spool_lock = threading.Lock()
+        self._session = requests.Session()
+        self._session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._requeue_spool()
+            self._thread = threading.Thread(target=self._worker, name="TelegramSender", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, bot_token, chat_id, text):
+        """ Legt eine Nachricht in die Queue, ohne auf den Versand zu warten. """
+        if not bot_token or not chat_id:
+            print("Telegram-Token oder Chat-ID nicht konfiguriert. Nachricht wird nicht gesendet.")
+            print(f"Nachricht: {text}")
+            return False
+        self.start()
+        item = {'bot_token': bot_token, 'chat_id': chat_id, 'text': text, 'created': time.time()}
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            print("Telegram-Queue ist voll. Nachricht wird gespoolt.")
+            self._spool([item])
+            return False
+
+    def flush(self, timeout=SHUTDOWN_FLUSH_TIMEOUT):
+        """ Wartet, bis alle eingereihten Nachrichten verarbeitet sind. Gibt True zurück, wenn die Queue leer ist. """
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout=SHUTDOWN_FLUSH_TIMEOUT):
+        """ Versucht die Queue zu leeren und spoolt alles, was danach noch übrig ist. """
+        if self._thread is None:
+            return
+        self.flush(timeout)
+        self._stop.set()
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(self._queue.get_nowait())
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        if leftovers:
+            self._spool(leftovers)
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            # Coalescing: sammle alles, was innerhalb des Fensters zusätzlich eintrifft
+            deadline = time.monotonic() + self.coalesce_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            outgoing = None
+            try:
+                outgoing = self._coalesce(batch)
+                self._deliver_batch(outgoing)
+            except Exception as e:
+                print(f"Unerwarteter Fehler im Telegram-Sender: {e}")
+                # Nur spoolen, was weder zugestellt noch bereits gespoolt wurde
+                self._spool(batch if outgoing is None else outgoing)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _coalesce(self, batch):
+        """ Gruppiert nach Bot und Chat; ab digest_threshold Nachrichten wird ein Digest gebildet. """
+        groups = {}
+        for item in batch:
+            groups.setdefault((item['bot_token'], item['chat_id']), []).append(item)
+
+        outgoing = []
+        for (bot_token, chat_id), items in groups.items():
+            if len(items) >= self.digest_threshold:
+                outgoing.extend({'bot_token': bot_token, 'chat_id': chat_id, 'text': text, 'created': time.time()}
+                                for text in _build_digest([item['text'] for item in items]))
+            else:
+                outgoing.extend(items)
+        return outgoing
+
+    def _deliver_batch(self, outgoing):
+        """ Arbeitet outgoing von vorne ab und entfernt jeden Eintrag, sobald er zugestellt oder gespoolt ist. """
+        while outgoing:
+            entry = outgoing[0]
+            if not self._send_with_retry(entry['bot_token'], entry['chat_id'], entry['text']):
+                self._spool([entry])
+            outgoing.pop(0)
+
+    def _send_with_retry(self, bot_token, chat_id, text):
+        start = time.perf_counter()
+        result = self._attempt_delivery(bot_token, chat_id, text)
+        TELEGRAM_SEND.observe(time.perf_counter() - start)
+        TELEGRAM_MESSAGES.inc(result=result)
+        return result != 'spooled'
+
+    def _attempt_delivery(self, bot_token, chat_id, text):
+        """ Ergebnis: 'sent', 'rejected' (verworfen) oder 'spooled' (später erneut versuchen). """
+        for attempt in range(self.max_retries):
+            try:
+                _post_message(self._session, self.api_url, bot_token, chat_id, text)
+                return 'sent'
+            except TelegramDeliveryError as e:
+                wait = e.retry_after if e.retry_after else self.backoff_base * (2 ** attempt)
+                print(f"Telegram-Versand fehlgeschlagen ({e}). Versuch {attempt + 1}/{self.max_retries}, warte {wait:.1f}s...")
+                if self._stop.wait(wait):
+                    return 'spooled'
+            except requests.exceptions.RequestException as e:
+                print(f"Telegram hat die Nachricht abgelehnt: {e}. Nachricht wird verworfen.")
+                return 'rejected'
+        return 'spooled'
+
+    def _spool(self, items):
+        with self._spool_lock:
+            os.makedirs(os.path.dirname(self.spool_file), exist_ok=True)
+            with open(self.spool_file, 'a') as f:
+                for item in items:
+                    f.write(json.dumps(item) + "\n")
+
+    def _requeue_spool(self):
+        """ Lädt gespoolte Nachrichten aus einem früheren Lauf zurück in die Queue. """
+        with self._spool_lock:
+            if not os.path.exists(self.spool_file):
+                return
+            with open(self.spool_file, 'r') as f:
+                lines = f.readlines()
+            os.remove(self.spool_file)
+        items = []
+        for line in lines:
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        overflow = []
+        for item in items:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                overflow.append(item)
+        if overflow:
+            self._spool(overflow)
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+def get_notification_queue():
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = NotificationQueue()
+            atexit.register(_default_queue.close)
+        return _default_queue
+
+def flush_notifications(timeout=SHUTDOWN_FLUSH_TIMEOUT):
+    """ Wartet auf den Versand bereits eingereihter Nachrichten, ohne eine Queue neu anzulegen. """
+    if _default_queue is None:
+        return True
+    return _default_queue.flush(timeout)
+
+def queue_message(bot_token, chat_id, text):
+    """ Nicht-blockierende Variante von send_message für den Trading-Pfad. """
+    return get_notification_queue().enqueue(bot_token, chat_id, text)
@@ -1,10 +1,16 @@
 # src/lbot/utils/trade_manager.py
-import numpy as np
 import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from .lstm_model import create_ann_features
-from .telegram import send_message
+from .telegram import queue_message
 # NEU: Import der MC-Dropout-Funktion
 from .mc_dropout_predictor import make_mc_prediction
+from .order_executor import OrderExecutor, OrderExecutionError
+from .profiling import span
+from .gap_index import timeframe_to_ms
+from .metrics import CYCLE_STAGE, CYCLES, CANDLE_TO_ACK, BABYSIT, BABYSIT_RESULTS
 
 def get_rounded_price(price, market):
     # ... (unverändert) ...
@@ -12,15 +18,73 @@ def get_rounded_price(price, market):
         return float(market['precision']['price'] * round(price / market['precision']['price']))
     return round(price, 8)
 
+@contextmanager
+def _stage(name):
+    """ Profiling-Span und Latenz-Histogramm (lbot_trade_cycle_stage_seconds) für eine Stufe des Zyklus. """
+    with span(name), CYCLE_STAGE.time(stage=name):
+        yield
+
+def _seconds_since_candle_close(timeframe):
+    """ Sekunden seit dem Schluss der letzten Kerze (= Beginn der laufenden) im gegebenen Timeframe. """
+    now_ms = time.time() * 1000
+    return (now_ms % timeframe_to_ms(timeframe)) / 1000
+
 def full_trade_cycle(exchange, model, scaler, params, settings, current_balance, get_state, set_state, telegram_config, logger):
-    account_name = exchange.account.get('name', 'Standard')
+    """ Ein Handelszyklus für ein einzelnes Konto (siehe fan_out_trade_cycle). Gibt das Ergebnis als String zurück. """
+    return fan_out_trade_cycle([(exchange, current_balance)], model, scaler, params, settings, get_state, set_state, telegram_config, logger)[0]
+
+def fan_out_trade_cycle(accounts, model, scaler, params, settings, get_state, set_state, telegram_config, logger):
+    """
+    Ein Handelszyklus für alle Konten einer Strategie: Marktdaten, Features und MC-Inferenz hängen nur
+    vom Markt ab und werden einmal berechnet; die Orders gehen danach parallel an alle Konten ohne
+    offene Position (Größe und State pro Konto). accounts: Liste von (Exchange, Kontostand).
+    Gibt pro Konto das Ergebnis zurück; Dauer und Ergebnisse landen in lbot_trade_cycle_stage_seconds{stage="total"}
+    und lbot_trade_cycles_total.
+    """
+    results = ['error'] * len(accounts)
+    try:
+        with CYCLE_STAGE.time(stage='total'):
+            symbol, timeframe = params['market']['symbol'], params['market']['timeframe']
+            flat = []
+            for i, (exchange, _) in enumerate(accounts):
+                if get_state(_account_name(exchange), symbol, timeframe, 'position_status', 'closed') == 'open':
+                    logger.info(f"[{_account_name(exchange)}] Position ist bereits offen. Überspringe Trade-Eröffnung.")
+                    results[i] = 'position_open'
+                else:
+                    flat.append(i)
+            if not flat:
+                return results
+
+            signal = compute_signal(accounts[flat[0]][0], model, scaler, params, settings, logger)
+            if signal['result'] != 'entry':
+                for i in flat:
+                    results[i] = signal['result']
+                return results
+
+            def open_for(i):
+                exchange, balance = accounts[i]
+                return open_long_position(exchange, signal, params, settings, balance, set_state, telegram_config, logger)
+            if len(flat) == 1:
+                results[flat[0]] = open_for(flat[0])
+            else:
+                with ThreadPoolExecutor(max_workers=len(flat), thread_name_prefix="OrderFanOut") as pool:
+                    for i, result in zip(flat, pool.map(open_for, flat)):
+                        results[i] = result
+            return results
+    finally:
+        for result in results:
+            CYCLES.inc(result=result)
+
+def _account_name(exchange):
+    return exchange.account.get('name', 'Standard')
+
+def compute_signal(exchange, model, scaler, params, settings, logger):
+    """
+    Marktdaten, Features, Filter und MC-Vorhersage – unabhängig vom Konto. Gibt ein Dict mit
+    'result' zurück ('entry' oder der Grund, warum nicht) und bei 'entry' zusätzlich 'price'.
+    """
     symbol = params['market']['symbol']
     timeframe = params['market']['timeframe']
-    
-    position_status = get_state(account_name, symbol, timeframe, 'position_status', 'closed')
-    if position_status == 'open':
-        logger.info("Position ist bereits offen. Überspringe Trade-Eröffnung.")
-        return
 
     try:
         model_conf = settings.get('model_settings', {})
@@ -34,29 +98,33 @@ def full_trade_cycle(exchange, model, scaler, params, settings, current_balance,
         atr_period = optimized_filters.get('atr_period', filter_conf.get('atr_period', 14))
         
         history_limit = sequence_length + ema_period + 50
-        ohlcv = exchange.fetch_recent_ohlcv(symbol, timeframe, limit=history_limit)
-        ticker = exchange.fetch_ticker(symbol)
+        with span('market_data'):
+            with _stage('ohlcv'):
+                ohlcv = exchange.fetch_recent_ohlcv(symbol, timeframe, limit=history_limit)
+            with _stage('ticker'):
+                ticker = exchange.fetch_ticker(symbol)
         
         if ohlcv.empty or ticker is None or 'last' not in ticker:
             logger.warning("Konnte keine vollständigen OHLCV-Daten oder Ticker-Infos abrufen.")
-            return
+            return {'result': 'no_market_data'}
         current_price = ticker['last']
     except Exception as e:
         logger.error(f"Fehler beim Abrufen der Marktdaten: {e}")
-        return
+        return {'result': 'market_data_error'}
 
-    data_with_features = create_ann_features(ohlcv, ema_period=ema_period, atr_period=atr_period)
+    with _stage('features'):
+        data_with_features = create_ann_features(ohlcv, ema_period=ema_period, atr_period=atr_period)
     
     if data_with_features.empty:
         logger.warning("Nicht genügend Daten nach Feature-Erstellung vorhanden. Überspringe.")
-        return
+        return {'result': 'not_enough_data'}
 
     # --- ANWENDUNG DER FILTER ---
     if filter_conf.get('use_trend_filter', False):
         latest_ema = data_with_features[f'ema_{ema_period}'].iloc[-1]
         if current_price < latest_ema:
             logger.info(f"TRADE VERHINDERT (Trend): Preis ({current_price}) < EMA-{ema_period} ({latest_ema:.4f}).")
-            return
+            return {'result': 'filtered'}
             
     if filter_conf.get('use_volatility_filter', False):
         natr_col = f'natr_{atr_period}'
@@ -65,22 +133,24 @@ def full_trade_cycle(exchange, model, scaler, params, settings, current_balance,
         current_natr = data_with_features[natr_col].iloc[-1]
         if not (min_natr <= current_natr <= max_natr):
             logger.info(f"TRADE VERHINDERT (Vola): Aktueller nATR ({current_natr:.2f}) außerhalb des Fensters ({min_natr:.2f} - {max_natr:.2f}).")
-            return
+            return {'result': 'filtered'}
 
     # --- VORHERSAGE TREFFEN (mit Monte Carlo Dropout) ---
     latest_sequence_unscaled = data_with_features.iloc[-sequence_length:]
     feature_columns_to_scale = scaler.get_feature_names_out()
     
     try:
-        scaled_values = scaler.transform(latest_sequence_unscaled[feature_columns_to_scale])
+        with _stage('scaling'):
+            scaled_values = scaler.transform(latest_sequence_unscaled[feature_columns_to_scale])
     except Exception as e:
         logger.error(f"Fehler beim Skalieren der Live-Daten: {e}.")
-        return
+        return {'result': 'scaling_error'}
 
     input_data = np.expand_dims(scaled_values, axis=0)
     
     mc_samples = settings.get('model_settings', {}).get('mc_dropout_samples', 30)
-    mean_pred, std_pred = make_mc_prediction(model, input_data, n_samples=mc_samples)
+    with _stage('inference'):
+        mean_pred, std_pred = make_mc_prediction(model, input_data, n_samples=mc_samples)
     
     logger.info(f"MC-Vorhersage: {mean_pred*100:.2f}%, Unsicherheit: {std_pred:.4f}")
 
@@ -92,65 +162,99 @@ def full_trade_cycle(exchange, model, scaler, params, settings, current_balance,
     if (predicted_pct_gain >= entry_threshold_pct and 
         std_pred <= uncertainty_threshold and
         params['behavior'].get('use_longs', False)):
-        
-        # ... (Rest der Funktion: Trade-Ausführung, bleibt unverändert) ...
         logger.info(f"Einstiegssignal! Vorhersage ({predicted_pct_gain:.2f}%) > Schwelle ({entry_threshold_pct}%) UND Unsicherheit ({std_pred:.4f}) < Schwelle ({uncertainty_threshold:.4f})")
-        risk = params['risk']
-        leverage = risk['leverage']
-        risk_per_trade_pct = risk['risk_per_trade_pct'] / 100
-        rr_ratio = risk['risk_reward_ratio']
-        position_size_usd = current_balance * risk_per_trade_pct * leverage
-        amount = position_size_usd / current_price
-        sl_pct = risk_per_trade_pct / leverage
-        market = exchange.exchange.market(symbol)
-        stop_loss_price = get_rounded_price(current_price * (1 - sl_pct), market)
-        take_profit_price = get_rounded_price(current_price * (1 + (sl_pct * rr_ratio)), market)
-        try:
+        return {'result': 'entry', 'price': current_price}
+    logger.info("Kein Einstiegssignal oder Filter nicht erfüllt.")
+    return {'result': 'no_signal'}
+
+def open_long_position(exchange, signal, params, settings, current_balance, set_state, telegram_config, logger):
+    """ Setzt ein Einstiegssignal für ein Konto um: Größe aus dessen Kontostand, Orders, State und Telegram. """
+    account_name = _account_name(exchange)
+    symbol = params['market']['symbol']
+    timeframe = params['market']['timeframe']
+    current_price = signal['price']
+    risk = params['risk']
+    leverage = risk['leverage']
+    risk_per_trade_pct = risk['risk_per_trade_pct'] / 100
+    rr_ratio = risk['risk_reward_ratio']
+    position_size_usd = current_balance * risk_per_trade_pct * leverage
+    amount = position_size_usd / current_price
+    sl_pct = risk_per_trade_pct / leverage
+    market = exchange.exchange.market(symbol)
+    stop_loss_price = get_rounded_price(current_price * (1 - sl_pct), market)
+    take_profit_price = get_rounded_price(current_price * (1 + (sl_pct * rr_ratio)), market)
+    try:
+        with span('exchange_setup'):
             exchange.set_leverage(symbol, leverage)
             exchange.set_margin_mode(symbol, risk.get('margin_mode', 'isolated'))
-            logger.info(f"Öffne LONG-Position: {amount:.4f} {market['base']} im Wert von {position_size_usd:.2f} USD.")
-            order = exchange.create_market_order(symbol, 'buy', amount)
-            time.sleep(5)
-            logger.info(f"Platziere Stop-Loss bei {stop_loss_price} und Take-Profit bei {take_profit_price}.")
-            sl_order = exchange.place_trigger_market_order(symbol, 'sell', amount, stop_loss_price, {'reduceOnly': True})
-            tp_order = exchange.place_trigger_market_order(symbol, 'sell', amount, take_profit_price, {'reduceOnly': True})
-            if not sl_order or not tp_order or 'id' not in sl_order or 'id' not in tp_order:
-                raise Exception("Fehler beim Platzieren der SL/TP-Orders.")
-            set_state(account_name, symbol, timeframe, 'position_status', 'open')
-            set_state(account_name, symbol, timeframe, 'sl_order_id', sl_order['id'])
-            set_state(account_name, symbol, timeframe, 'tp_order_id', tp_order['id'])
-            msg = (f"✅ *L-Bot Trade Eröffnet*\n\n"
-                   f"*{symbol} ({timeframe})*\n"
-                   f"Seite: LONG\n"
-                   f"Größe: {position_size_usd:.2f} USDT\n"
-                   f"Einstiegspreis: ~{current_price:.4f}\n"
-                   f"Take Profit: {take_profit_price}\n"
-                   f"Stop Loss: {stop_loss_price}")
-            send_message(telegram_config.get('bot_token'), telegram_config.get('chat_id'), msg)
-        except Exception as e:
-            logger.critical(f"FEHLER BEI TRADE-AUSFÜHRUNG: {e}", exc_info=True)
-            msg = f"🚨 *L-Bot Kritischer Fehler*\n\nTrade für {symbol} konnte nicht ausgeführt werden:\n_{e}_"
-            send_message(telegram_config.get('bot_token'), telegram_config.get('chat_id'), msg)
-    else:
-        logger.info("Kein Einstiegssignal oder Filter nicht erfüllt.")
+        logger.info(f"[{account_name}] Öffne LONG-Position: {amount:.4f} {market['base']} im Wert von {position_size_usd:.2f} USD.")
+        logger.info(f"Platziere Stop-Loss bei {stop_loss_price} und Take-Profit bei {take_profit_price}.")
+        executor = OrderExecutor.from_settings(exchange, logger, settings)
+        # Sobald die Entry-Order raus ist, gilt die Position als offen: der Babysitter gleicht ab,
+        # und der nächste Zyklus eröffnet keine zweite, auch wenn danach etwas scheitert
+        entry_sent = lambda order: set_state(account_name, symbol, timeframe, 'position_status', 'open')
+        with span('order_execution'):
+            execution = executor.open_long(symbol, amount, stop_loss_price, take_profit_price, on_entry_sent=entry_sent)
+        # Die Stufen der Order-Ausführung misst der OrderExecutor selbst (Millisekunden)
+        timings = execution.get('timings', {})
+        for stage, ms in timings.items():
+            CYCLE_STAGE.observe(ms / 1000, stage=stage)
+        # Bestätigung der Entry-Order: was nach ihr kam (Fill-Abfrage, SL/TP) wird herausgerechnet
+        after_ack_ms = timings.get('fill_confirmation', 0) + timings.get('sl_tp_placement', 0) + timings.get('sl_tp_lookup', 0)
+        CANDLE_TO_ACK.observe(max(0.0, _seconds_since_candle_close(timeframe) - after_ack_ms / 1000))
+        with _stage('state_write'):
+            set_state(account_name, symbol, timeframe, 'sl_order_id', execution['sl_order_id'] or '0')
+            set_state(account_name, symbol, timeframe, 'tp_order_id', execution['tp_order_id'] or '0')
+        msg = (f"✅ *L-Bot Trade Eröffnet*\n\n"
+               f"*{symbol} ({timeframe})*\n"
+               f"Seite: LONG\n"
+               f"Größe: {position_size_usd:.2f} USDT\n"
+               f"Einstiegspreis: ~{current_price:.4f}\n"
+               f"Take Profit: {take_profit_price}\n"
+               f"Stop Loss: {stop_loss_price}")
+        with _stage('telegram'):
+            queue_message(telegram_config.get('bot_token'), telegram_config.get('chat_id'), msg)
+        return 'entry'
+    except Exception as e:
+        logger.critical(f"[{account_name}] FEHLER BEI TRADE-AUSFÜHRUNG: {e}", exc_info=True)
+        if isinstance(e, OrderExecutionError) and e.entry_sent:
+            # Status bleibt 'open' (siehe entry_sent oben): der Babysitter setzt ihn zurück, sobald keine Position mehr existiert
+            set_state(account_name, symbol, timeframe, 'sl_order_id', '0')
+            set_state(account_name, symbol, timeframe, 'tp_order_id', '0')
+        msg = f"🚨 *L-Bot Kritischer Fehler*\n\nTrade für {symbol} ({account_name}) konnte nicht ausgeführt werden:\n_{e}_"
+        queue_message(telegram_config.get('bot_token'), telegram_config.get('chat_id'), msg)
+        return 'execution_error'
 
 def babysit_open_position(exchange, params, get_state, set_state, telegram_config, logger):
-    # ... (Diese Funktion bleibt unverändert) ...
+    """ Prüft eine offene Position; Dauer und Ergebnis landen in lbot_babysit_seconds und lbot_babysit_total. """
+    result = 'error'
+    try:
+        with BABYSIT.time():
+            result = _check_open_position(exchange, params, get_state, set_state, telegram_config, logger)
+    finally:
+        BABYSIT_RESULTS.inc(result=result)
+    return result
+
+def _check_open_position(exchange, params, get_state, set_state, telegram_config, logger):
     account_name = exchange.account.get('name', 'Standard')
     symbol = params['market']['symbol']
     timeframe = params['market']['timeframe']
     position_status = get_state(account_name, symbol, timeframe, 'position_status', 'closed')
-    if position_status == 'open':
-        try:
+    if position_status != 'open':
+        return 'no_position'
+    try:
+        with span('fetch_positions'):
             open_positions = exchange.fetch_open_positions(symbol)
-            if not open_positions:
-                logger.info(f"Position für {symbol} an der Börse geschlossen. Setze DB-Status zurück.")
-                set_state(account_name, symbol, timeframe, 'position_status', 'closed')
-                set_state(account_name, symbol, timeframe, 'sl_order_id', '0')
-                set_state(account_name, symbol, timeframe, 'tp_order_id', '0')
-                msg = f"ℹ️ *L-Bot Info*\n\nPosition für *{symbol}* wurde geschlossen (wahrscheinlich durch SL/TP)."
-                send_message(telegram_config.get('bot_token'), telegram_config.get('chat_id'), msg)
-            else:
-                logger.info(f"Offene Position für {symbol} wird weiterhin überwacht.")
-        except Exception as e:
-            logger.error(f"Fehler beim Babysitting für {symbol}: {e}")
+        if not open_positions:
+            logger.info(f"Position für {symbol} an der Börse geschlossen. Setze DB-Status zurück.")
+            set_state(account_name, symbol, timeframe, 'position_status', 'closed')
+            set_state(account_name, symbol, timeframe, 'sl_order_id', '0')
+            set_state(account_name, symbol, timeframe, 'tp_order_id', '0')
+            msg = f"ℹ️ *L-Bot Info*\n\nPosition für *{symbol}* wurde geschlossen (wahrscheinlich durch SL/TP)."
+            queue_message(telegram_config.get('bot_token'), telegram_config.get('chat_id'), msg)
+            return 'closed'
+        logger.info(f"Offene Position für {symbol} wird weiterhin überwacht.")
+        return 'still_open'
+    except Exception as e:
+        logger.error(f"Fehler beim Babysitting für {symbol}: {e}")
+        return 'error'
@@ -0,0 +1,45 @@
+# tests/test_backtester.py
+import json
+
+import numpy as np
+import pandas as pd
+
+from lbot.analysis import show_results
+from lbot.analysis.backtester import Backtester
+
+PARAMS = {'strategy': {'entry_threshold_pct': 0.1},
+          'risk': {'leverage': 1, 'risk_per_trade_pct': 1.0, 'risk_reward_ratio': 2.0},
+          'behavior': {'use_longs': True}}
+SETTINGS = {'model_settings': {'sequence_length': 24}}
+
+
+def winning_only_metrics():
+    # Stetig steigende Kurse: jeder Trade endet am Take-Profit, es gibt keinen Verlusttrade
+    n = 300
+    close = 100 * 1.002 ** np.arange(n)
+    df = pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close, 'volume': 1.0},
+                      index=pd.date_range('2024-01-01', periods=n, freq='h', tz='UTC'))
+    return Backtester(df, None, None, PARAMS, SETTINGS, 1000, predictions=np.full(n, 0.01)).run()
+
+
+def test_profit_factor_without_losing_trade_is_json_null():
+    metrics = winning_only_metrics()
+    assert metrics['num_trades'] > 0 and metrics['win_rate'] == 100.0
+    assert metrics['profit_factor'] is None
+    assert json.loads(json.dumps(metrics, allow_nan=False))['profit_factor'] is None
+
+
+def test_backtest_report_is_strict_json(tmp_path, monkeypatch):
+    monkeypatch.setattr(show_results, 'RESULTS_DIR', str(tmp_path))
+    config = {'market': {'symbol': 'BTC/USDT:USDT', 'timeframe': '1h'}}
+    losing = dict(winning_only_metrics(), profit_factor=0.8)
+    results_df = pd.DataFrame([show_results._summarize(config, winning_only_metrics(), 1000),
+                               show_results._summarize(config, losing, 1000)])
+    _, json_path = show_results.save_report(results_df, '2024-01-01', '2024-02-01', 1000)
+
+    def reject(constant):
+        raise ValueError(f"Ungültiges JSON: {constant}")
+
+    with open(json_path) as f:
+        report = json.load(f, parse_constant=reject)
+    assert [row['Profit-Faktor'] for row in report['results']] == [None, 0.8]
@@ -0,0 +1,147 @@
+# tests/test_downloader.py
+import os
+import json
+import time
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import ccxt
+import pandas as pd
+import pytest
+
+from lbot.utils import downloader
+from lbot.utils.downloader import HistoryDownloader
+from lbot.utils.exchange_simulator import synthetic_candles
+from lbot.utils.gap_index import index_to_ms
+
+HOUR_MS = 3_600_000
+PAGE_LIMIT = 100
+CANDLES = {'BTCUSDT': synthetic_candles(2550, '1h', seed=7), 'ETHUSDT': synthetic_candles(2550, '1h', start_price=50.0, seed=8)}
+SINCE = int(index_to_ms(CANDLES['BTCUSDT'].index)[0])
+# "Jetzt" liegt in der letzten Kerze: sie ist noch offen und darf nicht in den Checkpoint
+UNTIL = int(index_to_ms(CANDLES['BTCUSDT'].index)[-1]) + HOUR_MS // 2
+
+
+def _market(symbol, base):
+    return {'symbol': symbol, 'status': 'TRADING', 'baseAsset': base, 'quoteAsset': 'USDT', 'baseAssetPrecision': 8,
+            'quotePrecision': 8, 'quoteAssetPrecision': 8, 'orderTypes': ['LIMIT', 'MARKET'],
+            'isSpotTradingAllowed': True, 'isMarginTradingAllowed': False, 'permissions': ['SPOT'], 'filters': []}
+
+
+class ReplayServer:
+    """ Spielt /api/v3/klines aus den synthetischen Kerzen ab; zählt Requests und parallel laufende Anfragen. """
+    def __init__(self, latency=0.02):
+        self.requests, self.failures = [], set()
+        self.in_flight = self.max_in_flight = 0
+        self.lock = threading.Lock()
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path.endswith('/exchangeInfo'):
+                    return self.reply(200, {'timezone': 'UTC', 'serverTime': 0, 'rateLimits': [],
+                                            'symbols': [_market('BTCUSDT', 'BTC'), _market('ETHUSDT', 'ETH')]})
+                start = int(query['startTime'])
+                with replay.lock:
+                    replay.requests.append((time.monotonic(), query['symbol'], start))
+                    replay.in_flight += 1
+                    replay.max_in_flight = max(replay.max_in_flight, replay.in_flight)
+                    failing = (query['symbol'], start) in replay.failures
+                time.sleep(latency)
+                with replay.lock:
+                    replay.in_flight -= 1
+                if failing:
+                    return self.reply(503, {'code': -1, 'msg': 'Service unavailable'})
+                df = CANDLES[query['symbol']]
+                df = df[index_to_ms(df.index) >= start].iloc[:int(query['limit'])]
+                self.reply(200, [[int(ts), str(r.open), str(r.high), str(r.low), str(r.close), str(r.volume), int(ts) + HOUR_MS - 1]
+                                 for ts, r in zip(index_to_ms(df.index), df.itertuples())])
+
+            def reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def client(self):
+        """ Ein echter ccxt-Client, dessen API-URLs auf den Replay-Server zeigen. """
+        exchange = ccxt.binance({'enableRateLimit': False, 'options': {'fetchMarkets': {'types': ['spot']}}})
+        exchange.urls['api'] = {name: self.url + urlparse(url).path for name, url in exchange.urls['api'].items()}
+        return exchange
+
+    def pages(self, symbol='BTCUSDT'):
+        return sorted(start for _, requested, start in self.requests if requested == symbol)
+
+
+@pytest.fixture
+def replay():
+    server = ReplayServer()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+def make_downloader(replay, tmp_path, **kwargs):
+    options = dict(max_workers=4, requests_per_second=1000, page_limit=PAGE_LIMIT, checkpoint_dir=str(tmp_path), show_progress=False)
+    options.update(kwargs)
+    return HistoryDownloader(replay.client(), **options)
+
+
+def test_pages_cover_the_range_exactly_once(replay, tmp_path):
+    loader = make_downloader(replay, tmp_path)
+    planned = loader._plan_pages(SINCE, UNTIL, HOUR_MS)
+    assert planned == list(range(SINCE, UNTIL, PAGE_LIMIT * HOUR_MS)) and len(planned) == 26
+    df = loader.download_pair('BTC/USDT', '1h', SINCE, until=UNTIL)
+    assert replay.pages() == planned
+    pd.testing.assert_frame_equal(df, CANDLES['BTCUSDT'], check_freq=False, check_index_type=False)
+    assert os.listdir(tmp_path) == []
+
+
+def test_shared_client_keeps_pairs_apart_under_concurrency(replay, tmp_path, caplog):
+    # Ein ccxt-Client für alle Worker-Threads: jede Seite muss trotzdem bei ihrem Paar landen
+    loader = make_downloader(replay, tmp_path, max_workers=16)
+    with caplog.at_level(logging.WARNING, logger='urllib3.connectionpool'):
+        results = loader.download_many([('BTC/USDT', '1h', SINCE), ('ETH/USDT', '1h', SINCE)], until=UNTIL)
+    assert replay.max_in_flight > 10
+    assert not [record for record in caplog.records if 'pool is full' in record.getMessage()]
+    for symbol, market in (('BTC/USDT', 'BTCUSDT'), ('ETH/USDT', 'ETHUSDT')):
+        pd.testing.assert_frame_equal(results[(symbol, '1h')], CANDLES[market], check_freq=False, check_index_type=False)
+
+
+def test_token_bucket_limits_the_request_rate(replay, tmp_path):
+    rate, workers = 40, 4
+    make_downloader(replay, tmp_path, max_workers=workers, requests_per_second=rate).download_pair('BTC/USDT', '1h', SINCE, until=UNTIL)
+    times = sorted(t for t, _, _ in replay.requests)
+    # Nach dem Burst (capacity = max_workers) höchstens `rate` Requests pro Sekunde
+    assert times[-1] - times[0] >= (len(times) - workers) / rate * 0.9
+    assert 1 < replay.max_in_flight <= workers
+
+
+def test_interrupted_download_resumes_from_checkpoint(replay, tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader, 'MAX_PAGE_RETRIES', 1)
+    planned = list(range(SINCE, UNTIL, PAGE_LIMIT * HOUR_MS))
+    replay.failures = {('BTCUSDT', planned[10])}
+    assert make_downloader(replay, tmp_path).download_pair('BTC/USDT', '1h', SINCE, until=UNTIL) is None
+
+    with open(os.path.join(tmp_path, 'BTC_USDT_1h', 'checkpoint.json')) as f:
+        checkpoint = json.load(f)
+    # Erledigt: alles außer der gescheiterten Seite und der Seite mit der noch offenen Kerze
+    assert checkpoint['since'] == SINCE and checkpoint['done'] == planned[:10] + planned[11:-1]
+
+    replay.failures, replay.requests = set(), []
+    df = make_downloader(replay, tmp_path).download_pair('BTC/USDT', '1h', SINCE, until=UNTIL)
+    assert replay.pages() == [planned[10], planned[-1]]
+    pd.testing.assert_frame_equal(df, CANDLES['BTCUSDT'], check_freq=False, check_index_type=False)
@@ -0,0 +1,77 @@
+# tests/test_float32_parity.py
+"""
+Parität des float32-Pfads (FEATURE_DTYPE) gegen dieselbe Rechnung in float64 auf reproduzierbaren
+synthetischen Kerzen: Features, Sequenzen, Vorhersagen und Backtest-Kennzahlen.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from lbot.utils import lstm_model
+from lbot.utils.lstm_model import MODEL_FEATURE_COLUMNS, create_ann_features, create_sequences
+from lbot.utils.exchange_simulator import synthetic_candles
+from lbot.analysis.backtester import Backtester, batch_predict
+
+SEQUENCE_LENGTH, FUTURE_STEPS = 24, 5
+SETTINGS = {'model_settings': {'sequence_length': SEQUENCE_LENGTH},
+            'strategy_filters': {'use_trend_filter': True, 'use_volatility_filter': True}}
+PARAMS = {'strategy': {'entry_threshold_pct': 0.2, 'min_natr': 0.1, 'max_natr': 5.0},
+          'risk': {'leverage': 5, 'risk_per_trade_pct': 1.0, 'risk_reward_ratio': 2.0},
+          'behavior': {'use_longs': True}}
+
+
+@pytest.fixture(scope='module')
+def features():
+    raw = synthetic_candles(3000, '1h', seed=11)
+    reference = pytest.MonkeyPatch()
+    reference.setattr(lstm_model, 'FEATURE_DTYPE', np.float64)
+    try:
+        f64 = create_ann_features(raw)
+    finally:
+        reference.undo()
+    return create_ann_features(raw), f64
+
+
+def scaled(df, scaler):
+    frame = pd.DataFrame(scaler.transform(df[MODEL_FEATURE_COLUMNS]), index=df.index, columns=MODEL_FEATURE_COLUMNS)
+    frame['close'] = df['close']
+    return frame
+
+
+def test_features_match_float64_reference(features):
+    f32, f64 = features
+    assert (f32.dtypes == np.float32).all() and (f64.dtypes == np.float64).all()
+    assert f32.index.equals(f64.index) and list(f32.columns) == list(f64.columns)
+    # Indikatoren werden in float64 gerechnet, nur das Ergebnis wird gerundet: Abweichung = float32-Rundung
+    np.testing.assert_allclose(f32.to_numpy(np.float64), f64.to_numpy(), rtol=1e-6, atol=1e-9)
+
+
+def test_sequences_match_float64_reference(features, monkeypatch):
+    f32, f64 = features
+    scaler = StandardScaler().fit(f64[MODEL_FEATURE_COLUMNS])
+    X32, y32 = create_sequences(scaled(f32, scaler), SEQUENCE_LENGTH, FUTURE_STEPS)
+    monkeypatch.setattr(lstm_model, 'FEATURE_DTYPE', np.float64)
+    X64, y64 = create_sequences(scaled(f64, scaler), SEQUENCE_LENGTH, FUTURE_STEPS)
+    assert X32.dtype == np.float32 and X32.flags['C_CONTIGUOUS'] and X32.shape == X64.shape
+    np.testing.assert_allclose(X32, X64, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(y32, y64, rtol=1e-4, atol=1e-6)
+
+
+def test_batch_predict_and_backtest_match_float64_reference(features):
+    keras = pytest.importorskip('tensorflow').keras
+    f32, f64 = features
+    keras.utils.set_random_seed(0)
+    model = lstm_model.create_lstm_model(SEQUENCE_LENGTH, len(MODEL_FEATURE_COLUMNS))
+    scaler = StandardScaler().fit(f64[MODEL_FEATURE_COLUMNS])
+    p32, p64 = batch_predict(f32, model, scaler, SEQUENCE_LENGTH), batch_predict(f64, model, scaler, SEQUENCE_LENGTH)
+    np.testing.assert_allclose(p32, p64, rtol=1e-4, atol=1e-6)
+
+    # Gleiche Signale auf beiden Pfaden; zufällige Vorhersagen erzeugen genügend Trades
+    predictions = np.random.default_rng(5).normal(0, 0.004, len(f64))
+    m32 = Backtester(f32, None, None, PARAMS, SETTINGS, 1000, predictions=predictions).run()
+    m64 = Backtester(f64, None, None, PARAMS, SETTINGS, 1000, predictions=predictions).run()
+    assert m32['num_trades'] == m64['num_trades'] >= 20
+    assert m32['win_rate'] == m64['win_rate']
+    for key in ('total_pnl_pct', 'max_drawdown_pct', 'sharpe', 'sortino', 'profit_factor', 'exposure_pct'):
+        assert m32[key] == pytest.approx(m64[key], rel=1e-4, abs=1e-6), key
@@ -0,0 +1,81 @@
+# tests/test_guardian.py
+import json
+import logging
+import os
+import time
+
+import pytest
+
+from lbot.utils import guardian as guardian_module
+from lbot.utils.guardian import CheckCache, Guardian, CHECK_TTLS
+
+LOGGER = logging.getLogger('test_guardian')
+PARAMS = {'market': {'symbol': 'BTC/USDT:USDT', 'timeframe': '1h'}, 'strategy': {}, 'behavior': {},
+          'risk': {'leverage': 5, 'risk_per_trade_pct': 1.0}}
+
+
+class Exchange:
+    def seconds_since_last_successful_call(self):
+        return 1.0
+
+
+def make_guardian(tmp_path, version, cache):
+    version_dir = tmp_path / 'registry' / version
+    version_dir.mkdir(parents=True, exist_ok=True)
+    for name in ('model.h5', 'scaler.joblib'):
+        (version_dir / name).write_bytes(version.encode())
+    return Guardian(Exchange(), PARAMS, str(version_dir / 'model.h5'), str(version_dir / 'scaler.joblib'), LOGGER, cache)
+
+
+def test_artifact_check_is_cached_per_model_path(tmp_path):
+    cache = CheckCache(str(tmp_path / 'cache.json'))
+    guardian = make_guardian(tmp_path, 'v1', cache)
+    assert guardian._check_artifacts_exist() is False
+    assert guardian._check_artifacts_exist() is True
+    # Ein neu promotetes Modell hat einen neuen Pfad und wird erneut geprüft
+    assert make_guardian(tmp_path, 'v2', cache)._check_artifacts_exist() is False
+    missing = Guardian(Exchange(), PARAMS, str(tmp_path / 'fehlt.h5'), str(tmp_path / 'fehlt.joblib'), LOGGER, cache)
+    with pytest.raises(FileNotFoundError):
+        missing._check_artifacts_exist()
+
+
+def test_replaced_artifact_invalidates_cached_pass(tmp_path, monkeypatch):
+    cache = CheckCache(str(tmp_path / 'cache.json'))
+    guardian = make_guardian(tmp_path, 'legacy', cache)
+    assert guardian._check_artifacts_exist() is False
+
+    # Unveränderte Größe und mtime: der gespeicherte Hash wird wiederverwendet
+    def no_hashing(path):
+        raise AssertionError(f"{path} wurde erneut gehasht")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(guardian_module, '_hash_file', no_hashing)
+        assert guardian._check_artifacts_exist() is True
+
+    # Legacy-Pfad wird mit einem neuen Modell überschrieben: gleicher Schlüssel, anderer Inhalt
+    model_path = tmp_path / 'registry' / 'legacy' / 'model.h5'
+    model_path.write_bytes(b'neues modell')
+    os.utime(model_path, (time.time() + 5, time.time() + 5))
+    assert guardian._check_artifacts_exist() is False
+    assert guardian._check_artifacts_exist() is True
+    model_path.unlink()
+    with pytest.raises(FileNotFoundError):
+        guardian._check_artifacts_exist()
+
+
+def test_save_prunes_expired_keys(tmp_path):
+    cache_file = tmp_path / 'cache.json'
+    cache = CheckCache(str(cache_file))
+    for version in ('v1', 'v2', 'v3'):
+        make_guardian(tmp_path, version, cache).run_pre_flight_checks()
+    # v1 und v2 sind älter als die TTL der Artefakt-Prüfung, ebenso ein Eintrag eines entfernten Checks
+    for key in list(cache.entries):
+        if '/v1/' in key or '/v2/' in key:
+            cache.entries[key]['checked_at'] = time.time() - CHECK_TTLS['_check_artifacts_exist'] - 1
+    cache.put('_check_removed:abc')
+    cache.save()
+
+    with open(cache_file) as f:
+        keys = list(json.load(f))
+    assert sorted(key.split(':', 1)[0] for key in keys) == ['_check_artifacts_exist', '_check_config_sanity', '_check_risk_parameters']
+    assert any('/v3/' in key for key in keys)
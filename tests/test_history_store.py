@@ -0,0 +1,49 @@
+# tests/test_history_store.py
+import os
+import functools
+import subprocess
+import threading
+
+from lbot.utils import data_handler
+from lbot.utils.exchange_simulator import synthetic_candles
+from lbot.utils.history_store import HistoryStore
+
+SYMBOL = 'BTC/USDT'
+
+
+def test_get_history_store_does_not_derive_on_read(tmp_path, monkeypatch):
+    HistoryStore(SYMBOL, '1h', base_dir=str(tmp_path)).append(synthetic_candles(200, '1h', seed=2))
+    monkeypatch.setattr(data_handler, 'HistoryStore', functools.partial(HistoryStore, base_dir=str(tmp_path)))
+    monkeypatch.setattr(data_handler, 'get_base_timeframe', lambda: '1h')
+    store = data_handler.get_history_store(SYMBOL, '4h')
+    assert not store.exists() and not os.path.exists(store.dir)
+
+
+def test_orphan_cleanup_keeps_temp_files_of_running_writers(tmp_path):
+    store = HistoryStore(SYMBOL, '1h', base_dir=str(tmp_path))
+    store.append(synthetic_candles(48, '1h', seed=2))
+    other = subprocess.Popen(['sleep', '30'])
+    try:
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+        running_tmp = os.path.join(store.dir, f".2024-02_1.parquet.{other.pid}.tmp")
+        dead_tmp = os.path.join(store.dir, f".2024-02_2.parquet.{dead.pid}.tmp")
+        for path in (running_tmp, dead_tmp):
+            open(path, 'w').close()
+        store.append(synthetic_candles(48, '1h', start='2024-03-01', seed=2))
+        assert os.path.exists(running_tmp) and not os.path.exists(dead_tmp)
+    finally:
+        other.kill()
+        other.wait()
+
+
+def test_concurrent_writers_keep_all_partitions(tmp_path):
+    months = ['2024-01-01', '2024-02-01', '2024-03-01', '2024-04-01']
+    writers = [threading.Thread(target=lambda start=start: HistoryStore(SYMBOL, '1h', base_dir=str(tmp_path)).append(
+        synthetic_candles(24, '1h', start=start, seed=2))) for start in months]
+    for writer in writers: writer.start()
+    for writer in writers: writer.join()
+    store = HistoryStore(SYMBOL, '1h', base_dir=str(tmp_path))
+    assert sorted(store.manifest['partitions']) == ['2024-01', '2024-02', '2024-03', '2024-04']
+    assert store.num_rows() == 4 * 24
+    assert sorted(f for f in os.listdir(store.dir) if f.endswith('.parquet')) == sorted(p['file'] for p in store.manifest['partitions'].values())
@@ -0,0 +1,46 @@
+# tests/test_model_registry.py
+import os
+
+from lbot.utils.model_registry import ModelRegistry
+
+SYMBOL, TIMEFRAME = 'BTC/USDT:USDT', '1h'
+
+
+def register(registry, tmp_path, content):
+    model_path, scaler_path = tmp_path / 'model.h5', tmp_path / 'scaler.joblib'
+    model_path.write_text(f"modell {content}")
+    scaler_path.write_text(f"scaler {content}")
+    return registry.register(SYMBOL, TIMEFRAME, str(model_path), str(scaler_path))
+
+
+def version_dirs(registry):
+    pair_dir = registry.pair_dir(SYMBOL, TIMEFRAME)
+    return sorted(name for name in os.listdir(pair_dir) if os.path.isdir(os.path.join(pair_dir, name)))
+
+
+def test_promote_keeps_current_and_latest_versions(tmp_path):
+    registry = ModelRegistry(root=str(tmp_path / 'registry'), legacy_dir=str(tmp_path), keep_versions=2)
+    versions = []
+    for i in range(5):
+        versions.append(register(registry, tmp_path, i))
+        registry.promote(SYMBOL, TIMEFRAME, versions[-1])
+    assert version_dirs(registry) == sorted(versions[-3:])
+    assert registry.resolve(SYMBOL, TIMEFRAME)[0] == versions[-1]
+
+
+def test_rolled_back_version_survives_pruning(tmp_path):
+    registry = ModelRegistry(root=str(tmp_path / 'registry'), legacy_dir=str(tmp_path), keep_versions=1)
+    first = register(registry, tmp_path, 'a')
+    registry.promote(SYMBOL, TIMEFRAME, first)
+    newer = [register(registry, tmp_path, name) for name in 'bcd']
+    # Rollback auf die älteste Version: sie ist aktuell und bleibt, von den übrigen nur die neueste
+    registry.promote(SYMBOL, TIMEFRAME, first)
+    assert version_dirs(registry) == sorted([first, newer[-1]])
+    assert registry.current(SYMBOL, TIMEFRAME) == first
+
+
+def test_keep_versions_none_disables_pruning(tmp_path):
+    registry = ModelRegistry(root=str(tmp_path / 'registry'), legacy_dir=str(tmp_path), keep_versions=None)
+    versions = [register(registry, tmp_path, i) for i in range(4)]
+    registry.promote(SYMBOL, TIMEFRAME, versions[-1])
+    assert version_dirs(registry) == sorted(versions)
@@ -0,0 +1,71 @@
+# tests/test_order_executor.py
+import logging
+
+import pytest
+
+from lbot.utils.exchange import Exchange
+from lbot.utils.exchange_simulator import SimulatedMarket, SimulatedExchange, synthetic_candles
+from lbot.utils.order_executor import OrderExecutor, OrderExecutionError
+from lbot.utils.trade_manager import open_long_position
+
+SYMBOL = 'BTC/USDT:USDT'
+LOGGER = logging.getLogger('test_order_executor')
+
+
+def make_exchange(attached):
+    market = SimulatedMarket({SYMBOL: synthetic_candles(400, '1h', seed=1)}, '1h', start_bar=300)
+    client = SimulatedExchange(market, supports_attached_sl_tp=attached)
+    return Exchange({'name': 'test'}, client=client), client
+
+
+def levels(client):
+    price = client.sim_market.last_price(SYMBOL)
+    return round(price * 0.98, 2), round(price * 1.04, 2)
+
+
+def test_attached_protection_returns_child_order_ids():
+    exchange, client = make_exchange(attached=True)
+    sl, tp = levels(client)
+    result = OrderExecutor(exchange, LOGGER).open_long(SYMBOL, 0.5, sl, tp)
+    entry_id = result['order']['id']
+    assert result['sl_order_id'] not in (None, entry_id) and result['tp_order_id'] not in (None, entry_id)
+    assert client.orders[result['sl_order_id']]['triggerPrice'] == sl
+    assert client.orders[result['tp_order_id']]['triggerPrice'] == tp
+
+
+def test_failed_take_profit_cancels_stop_loss_and_flattens():
+    exchange, client = make_exchange(attached=False)
+    sl, tp = levels(client)
+    place = exchange.place_trigger_market_order
+
+    def failing_tp(symbol, side, amount, trigger_price, params={}):
+        if trigger_price == tp:
+            raise RuntimeError("TP abgelehnt")
+        return place(symbol, side, amount, trigger_price, params)
+
+    exchange.place_trigger_market_order = failing_tp
+    sent = []
+    with pytest.raises(OrderExecutionError) as error:
+        OrderExecutor(exchange, LOGGER).open_long(SYMBOL, 0.5, sl, tp, on_entry_sent=sent.append)
+    assert error.value.entry_sent and error.value.flattened and len(sent) == 1
+    assert exchange.fetch_open_positions(SYMBOL) == []
+    assert exchange.fetch_open_trigger_orders(SYMBOL) == []
+
+
+def test_execution_error_after_entry_keeps_position_recorded():
+    exchange, client = make_exchange(attached=False)
+    exchange.place_trigger_market_order = lambda *args, **kwargs: {}
+    # Glattstellen scheitert ebenfalls: die Position bleibt offen und muss im State stehen
+    create = exchange.create_market_order
+    exchange.create_market_order = lambda symbol, side, amount, params={}: create(symbol, side, amount, params) if side == 'buy' else None
+    state = {}
+    set_state = lambda account, symbol, timeframe, key, value: state.__setitem__(key, str(value))
+    params = {'market': {'symbol': SYMBOL, 'timeframe': '1h'},
+              'risk': {'leverage': 2, 'risk_per_trade_pct': 1.0, 'risk_reward_ratio': 2.0}}
+    signal = {'result': 'entry', 'price': client.sim_market.last_price(SYMBOL)}
+    settings = {'live_trading_settings': {'order_execution': {'fill_timeout_seconds': 0.1}}}
+    result = open_long_position(exchange, signal, params, settings, 1000.0, set_state, {}, LOGGER)
+    assert result == 'execution_error'
+    assert state['position_status'] == 'open'
+    assert state['sl_order_id'] == '0' and state['tp_order_id'] == '0'
+    assert exchange.fetch_open_positions(SYMBOL)
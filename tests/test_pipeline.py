@@ -0,0 +1,43 @@
+# tests/test_pipeline.py
+import functools
+
+from lbot.analysis import pipeline
+from lbot.analysis.backtester import IntrabarDrilldown
+from lbot.utils import data_handler
+from lbot.utils.artifact_cache import ArtifactCache
+from lbot.utils.exchange_simulator import synthetic_candles
+from lbot.utils.history_store import HistoryStore
+
+SYMBOL = 'BTC/USDT:USDT'
+SETTINGS = {'backtest_settings': {'exit_model': 'high_low', 'drilldown_timeframe': '15m'}}
+OPTIONS = {'mode': 'strict', 'force': set(), 'trials': 1, 'jobs': 1, 'workers': 1, 'offline': True, 'until': 'optimize'}
+
+
+def test_drilldown_is_loaded_in_parent_and_passed_to_workers(tmp_path, monkeypatch):
+    raw = synthetic_candles(500, '1h', seed=4)
+    HistoryStore('BTC/USDT', '15m', base_dir=str(tmp_path)).append(synthetic_candles(4 * 520, '15m', seed=5))
+    monkeypatch.setattr(data_handler, 'HistoryStore', functools.partial(HistoryStore, base_dir=str(tmp_path)))
+    monkeypatch.setattr(pipeline, 'load_pair_data', lambda symbol, timeframe, start_date, exchange: raw)
+    jobs = []
+    monkeypatch.setattr(pipeline, '_run_pair', lambda job: jobs.append(job) or {
+        'symbol': job[0], 'timeframe': job[1], 'result': None, 'error': None, 'status': {}, 'timings': {}})
+    pipeline.run_pipeline([SYMBOL], ['1h'], '2024-01-01', SETTINGS, dict(OPTIONS, cache_dir=str(tmp_path / 'cache')))
+    drilldown = jobs[0][-1]
+    assert isinstance(drilldown, IntrabarDrilldown) and len(drilldown.timestamps) == 4 * 500
+
+
+def test_optimize_key_depends_on_drilldown_sub_bars(tmp_path):
+    raw = synthetic_candles(500, '1h', seed=4)
+    cache = ArtifactCache(str(tmp_path))
+    sub_bars = synthetic_candles(4 * 500, '15m', seed=5)
+
+    def optimize_key(drilldown):
+        return pipeline.PairPipeline(SYMBOL, '1h', raw, SETTINGS, OPTIONS, cache, drilldown).key('optimize')
+
+    def make_drilldown(high):
+        return IntrabarDrilldown(sub_bars.index.as_unit('ms').asi8, high, sub_bars['low'].to_numpy(), 3_600_000)
+
+    base = make_drilldown(sub_bars['high'].to_numpy())
+    assert optimize_key(base) == optimize_key(make_drilldown(sub_bars['high'].to_numpy()))
+    assert optimize_key(base) != optimize_key(None)
+    assert optimize_key(base) != optimize_key(make_drilldown(sub_bars['high'].to_numpy() * 1.001))
@@ -0,0 +1,76 @@
+# tests/test_resampler.py
+import os
+
+import pandas as pd
+import pytest
+
+from lbot.utils.exchange_simulator import synthetic_candles
+from lbot.utils.history_store import HistoryStore
+from lbot.utils.resampler import resample_ohlcv, rederive_missing, update_derived_store, verify_parity
+
+SYMBOL = 'BTC/USDT:USDT'
+# BTC_USDT_1h.csv: Basis-Kerzen ab Mittwoch 2024-01-03. BTC_USDT_native.csv: die daraus gebildeten
+# 4h-/1d-/1w-Kerzen in Börsen-Einteilung (Wochen ab Montag), Volumen wie bei Binance auf 2 Stellen gerundet.
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def test_weekly_buckets_open_on_monday():
+    # 2024-01-04 ist ein Donnerstag: mit Epoch-Ursprung würden die Wochen dort beginnen
+    df_base = synthetic_candles(24 * 30, '1h', start='2024-01-04', seed=3)
+    df_week = resample_ohlcv(df_base, '1h', '1w')
+    assert len(df_week) == 3
+    assert (df_week.index.dayofweek == 0).all() and (df_week.index.hour == 0).all()
+    first = df_base.loc['2024-01-08':'2024-01-14']
+    assert df_week.iloc[0]['open'] == first['open'].iloc[0] and df_week.iloc[0]['close'] == first['close'].iloc[-1]
+    assert df_week.iloc[0]['volume'] == first['volume'].sum()
+
+
+def test_misaligned_weekly_store_is_rederived(tmp_path):
+    df_base = synthetic_candles(24 * 40, '1h', start='2024-01-04', seed=3)
+    HistoryStore(SYMBOL, '1h', base_dir=str(tmp_path)).append(df_base)
+    # Alter Stand: Wochen ab Donnerstag (Epoch-Ursprung)
+    legacy = df_base.resample(pd.Timedelta(days=7), origin='epoch', label='left', closed='left').agg(
+        {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}).iloc[:-1]
+    assert (legacy.index.dayofweek == 3).all()
+    stale = HistoryStore(SYMBOL, '1w', base_dir=str(tmp_path))
+    stale.append(legacy)
+    stale.update_meta(derived_from='1h')
+
+    derived = update_derived_store(SYMBOL, '1h', '1w', base_dir=str(tmp_path)).read()
+    assert not derived.empty and (derived.index.dayofweek == 0).all()
+    pd.testing.assert_frame_equal(derived, resample_ohlcv(df_base, '1h', '1w'), check_freq=False)
+
+
+def _read_fixture(name):
+    return pd.read_csv(os.path.join(FIXTURES, name), index_col='timestamp', parse_dates=['timestamp'])
+
+
+@pytest.mark.parametrize('timeframe', ['4h', '1d', '1w'])
+def test_derived_store_matches_native_fixture(tmp_path, timeframe):
+    HistoryStore(SYMBOL, '1h', base_dir=str(tmp_path)).append(_read_fixture('BTC_USDT_1h.csv'))
+    native = _read_fixture('BTC_USDT_native.csv')
+    native = native[native.pop('timeframe') == timeframe]
+
+    derived = update_derived_store(SYMBOL, '1h', timeframe, base_dir=str(tmp_path)).read()
+    assert derived.index.equals(native.index)
+    compared, mismatches = verify_parity(SYMBOL, '1h', timeframe, native, tolerance=1e-6, base_dir=str(tmp_path))
+    assert compared == len(native) and mismatches.empty
+
+
+def test_bucket_with_base_gap_is_missing_until_repaired(tmp_path):
+    df_base = synthetic_candles(24 * 3, '1h', start='2024-01-01', seed=5)
+    # Zwei fehlende Stunden mitten im 4h-Bucket 2024-01-02 08:00
+    hole = df_base.loc['2024-01-02 09:00':'2024-01-02 10:00']
+    HistoryStore(SYMBOL, '1h', base_dir=str(tmp_path)).append(df_base.drop(hole.index))
+
+    derived_store = update_derived_store(SYMBOL, '1h', '4h', base_dir=str(tmp_path))
+    bucket = pd.Timestamp('2024-01-02 08:00', tz='UTC')
+    assert bucket not in derived_store.read().index and len(derived_store.read()) == 17
+    assert derived_store.missing_ranges() == [(bucket, bucket)]
+
+    # Basis repariert: rederive_missing füllt genau den fehlenden Bucket
+    HistoryStore(SYMBOL, '1h', base_dir=str(tmp_path)).append(hole)
+    assert rederive_missing(SYMBOL, '1h', '4h', base_dir=str(tmp_path)) == 1
+    derived_store = HistoryStore(SYMBOL, '4h', base_dir=str(tmp_path))
+    assert derived_store.missing_ranges() == []
+    pd.testing.assert_frame_equal(derived_store.read(), resample_ohlcv(df_base, '1h', '4h'), check_freq=False)
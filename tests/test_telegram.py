@@ -0,0 +1,126 @@
+# tests/test_telegram.py
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from lbot.utils import telegram
+from lbot.utils.telegram import NotificationQueue
+
+TOKEN, CHAT_ID = 'test-token', 42
+
+
+class StubTelegram:
+    """ Lokaler Ersatz für die Bot-API: beantwortet sendMessage der Reihe nach mit den vorgegebenen Antworten. """
+    def __init__(self):
+        self.requests, self.responses = [], []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests.append((time.monotonic(), self.path, body))
+                    status, payload = stub.responses.pop(0) if stub.responses else (200, {'ok': True})
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def texts(self):
+        return [body['text'] for _, _, body in self.requests]
+
+
+@pytest.fixture
+def stub():
+    server = StubTelegram()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+def make_queue(stub, tmp_path, **kwargs):
+    options = dict(coalesce_window=0.3, digest_threshold=3, max_retries=3, backoff_base=0.05)
+    options.update(kwargs)
+    return NotificationQueue(api_url=stub.url, spool_file=str(tmp_path / 'spool.jsonl'), **options)
+
+
+def test_simultaneous_messages_are_coalesced_into_one_digest(stub, tmp_path):
+    notifications = make_queue(stub, tmp_path)
+    for i in range(5):
+        notifications.enqueue(TOKEN, CHAT_ID, f"Meldung {i}")
+    assert notifications.flush(5)
+    notifications.close(1)
+    assert len(stub.requests) == 1
+    _, path, body = stub.requests[0]
+    assert path == f"/bot{TOKEN}/sendMessage" and body['chat_id'] == CHAT_ID
+    assert "(5 Nachrichten)" in body['text'] and all(f"Meldung {i}" in body['text'] for i in range(5))
+
+
+def test_rate_limit_waits_for_retry_after(stub, tmp_path):
+    stub.responses = [(429, {'ok': False, 'parameters': {'retry_after': 0.4}})]
+    notifications = make_queue(stub, tmp_path, coalesce_window=0.0)
+    notifications.enqueue(TOKEN, CHAT_ID, "Trade eröffnet")
+    assert notifications.flush(5)
+    notifications.close(1)
+    assert stub.texts() == ["Trade eröffnet", "Trade eröffnet"]
+    # retry_after (0.4s) hat Vorrang vor dem exponentiellen Backoff (0.05s)
+    assert stub.requests[1][0] - stub.requests[0][0] >= 0.35
+    assert not (tmp_path / 'spool.jsonl').exists()
+
+
+def test_undeliverable_messages_are_spooled_and_replayed(stub, tmp_path):
+    stub.responses = [(502, {'ok': False})] * 2
+    notifications = make_queue(stub, tmp_path, coalesce_window=0.0, max_retries=2, backoff_base=0.01)
+    notifications.enqueue(TOKEN, CHAT_ID, "SL platziert")
+    assert notifications.flush(5)
+    notifications.close(1)
+    spooled = [json.loads(line) for line in (tmp_path / 'spool.jsonl').read_text().splitlines()]
+    assert [item['text'] for item in spooled] == ["SL platziert"] and len(stub.requests) == 2
+
+    # Nächster Start: die gespoolte Nachricht wird erneut eingereiht und zugestellt
+    replay = make_queue(stub, tmp_path, coalesce_window=0.0)
+    replay.start()
+    assert replay.flush(5)
+    replay.close(1)
+    assert stub.texts() == ["SL platziert"] * 3
+    assert not (tmp_path / 'spool.jsonl').exists()
+
+
+def test_send_message_posts_through_a_session(stub, monkeypatch):
+    monkeypatch.setattr(telegram, 'TELEGRAM_API_URL', stub.url)
+    telegram.send_message(TOKEN, CHAT_ID, "Bot gestartet")
+    assert stub.texts() == ["Bot gestartet"]
+
+
+def test_unexpected_error_spools_only_undelivered_messages(stub, tmp_path):
+    notifications = make_queue(stub, tmp_path, coalesce_window=0.3, digest_threshold=5)
+    send_with_retry, calls = notifications._send_with_retry, []
+
+    def fail_on_second(bot_token, chat_id, text):
+        calls.append(text)
+        if len(calls) == 2:
+            raise RuntimeError("Absturz beim Senden")
+        return send_with_retry(bot_token, chat_id, text)
+
+    notifications._send_with_retry = fail_on_second
+    for i in range(3):
+        notifications.enqueue(TOKEN, CHAT_ID, f"Meldung {i}")
+    assert notifications.flush(5)
+    notifications.close(1)
+    # Meldung 0 ist zugestellt und darf beim nächsten Start nicht doppelt verschickt werden
+    assert stub.texts() == ["Meldung 0"]
+    spooled = [json.loads(line) for line in (tmp_path / 'spool.jsonl').read_text().splitlines()]
+    assert [item['text'] for item in spooled] == ["Meldung 1", "Meldung 2"]
@@ -0,0 +1,68 @@
+# tests/test_walk_forward.py
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from lbot.analysis import backtester, optimizer, walk_forward
+from lbot.analysis.walk_forward import make_folds
+from lbot.utils import lstm_model
+
+SETTINGS = {'model_settings': {'sequence_length': 24}}
+BEST_PARAMS = {'entry_threshold_pct': 0.1, 'min_natr': 0.1, 'max_natr': 5.0,
+               'risk_per_trade_pct': 1.0, 'risk_reward_ratio': 2.0, 'leverage': 1}
+
+
+def test_folds_optimize_and_test_after_the_training_window():
+    index = pd.date_range('2024-01-01', '2024-03-01', freq='h', tz='UTC')
+    folds = make_folds(index, train_days=20, optimize_days=10, test_days=10)
+    assert len(folds) == 3
+    for fold in folds:
+        assert fold['train_end'] - fold['train_start'] == pd.Timedelta(days=20)
+        assert fold['optimize_end'] - fold['train_end'] == pd.Timedelta(days=10)
+        assert fold['test_end'] - fold['optimize_end'] == pd.Timedelta(days=10)
+    # Die Folds rollen um die Testlänge weiter: die Testfenster schließen lückenlos aneinander an
+    assert [f['optimize_end'] for f in folds[1:]] == [f['test_end'] for f in folds[:-1]]
+    assert folds[-1]['test_end'] <= index[-1] + pd.Timedelta(hours=1)
+
+
+def test_fold_with_only_winning_trades_keeps_profit_factor_null(tmp_path, monkeypatch, capsys):
+    # Stetig steigende Kurse wie in test_backtester: jeder Trade endet am Take-Profit
+    n = 24 * 9
+    close = 100 * 1.002 ** np.arange(n)
+    features = pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close, 'volume': 1.0},
+                            index=pd.date_range('2024-01-01', periods=n, freq='h', tz='UTC'))
+    model_files = [tmp_path / 'model.h5', tmp_path / 'scaler.joblib']
+    for path in model_files:
+        path.write_bytes(b'veroeffentlicht')
+
+    class Registry:
+        def resolve(self, symbol, timeframe):
+            return ('v1', *map(str, model_files))
+
+    def constant_predictions(data, model, scaler, sequence_length):
+        return np.full(len(data), 0.01)
+
+    def fixed_study(data, model, scaler, predictions, trials, jobs, drilldown=None):
+        trial = SimpleNamespace(params=BEST_PARAMS, value=1.0)
+        return SimpleNamespace(best_trial=trial, best_value=1.0)
+
+    monkeypatch.setattr(walk_forward, 'ModelRegistry', Registry)
+    monkeypatch.setattr(lstm_model, 'load_model_and_scaler', lambda *paths: (None, None))
+    monkeypatch.setattr(backtester, 'batch_predict', constant_predictions)
+    monkeypatch.setattr(optimizer, 'run_study', fixed_study)
+
+    fold = make_folds(features.index, train_days=2, optimize_days=3, test_days=3)[0]
+    options = {'cache_dir': str(tmp_path / 'cache'), 'mode': 'strict', 'retrain': False, 'trials': 1, 'jobs': 1}
+    result = walk_forward.run_fold(('BTC/USDT:USDT', '1h', features, 'features', fold, SETTINGS, options, None))
+    assert result['error'] is None
+    for window in ('in_sample', 'out_of_sample'):
+        assert result[window]['num_trades'] > 0 and result[window]['win_rate'] == 100.0
+        assert result[window]['profit_factor'] is None
+
+    report = {'symbol': 'BTC/USDT:USDT', 'timeframe': '1h', 'out_of_sample': False, 'folds': [result],
+              'summary': walk_forward.aggregate([result], 3, 3)}
+    walk_forward.print_report(report)
+    assert 'kein Verlusttrade' in capsys.readouterr().out
+    assert json.loads(json.dumps(report, allow_nan=False))['folds'][0]['out_of_sample']['profit_factor'] is None